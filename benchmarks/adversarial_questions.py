@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Compares ``refo.match`` against ``quepy.matcher.match`` on long, noun heavy
+questions like the ones users paste into a search box.
+
+Usage:
+    python benchmarks/adversarial_questions.py
+"""
+
+import timeit
+
+import refo
+from refo import Plus, Question, Literal
+
+from quepy import matcher
+from quepy.tagger import Word
+from quepy.parsing import Pos, Lemma, Particle
+
+nouns = Pos("NN") | Pos("NNS") | Pos("NNP") | Pos("NNPS")
+
+
+class Thing(Particle):
+    regex = Plus(nouns)
+
+
+# Shapes taken from the example applications.
+REGEXES = [
+    ("Plus(nouns) + Question(Pos('.'))",
+     Plus(nouns) + Question(Pos("."))),
+    ("Plus(nouns | Lemma('.'))",
+     Plus(nouns | Lemma("."))),
+    ("Thing() + Lemma('of') + Thing()",
+     Thing() + Lemma("of") + Thing()),
+    ("Plus(Thing()) + Plus(nouns) + Question(Pos('.'))",
+     Plus(Thing()) + Plus(nouns) + Question(Pos("."))),
+]
+
+
+def question(length, last_tag):
+    words = [Word(u"Aaaa", u"aaaa", u"NNP") for _ in xrange(length - 1)]
+    words.append(Word(u"?", u"?", last_tag))
+    return words
+
+
+def refo_match(regex, words):
+    return refo.match(regex + Literal(None), words + [None])
+
+
+def main():
+    print "{:55} {:>6} {:>10} {:>10} {:>7}".format(
+        "regex", "words", "refo (ms)", "quepy (ms)", "speedup")
+    for name, regex in REGEXES:
+        for length in (50, 100, 200):
+            # A question that matches and one that fails on the last word.
+            for last_tag in (u".", u"DT"):
+                words = question(length, last_tag)
+                expected = refo_match(regex, words)
+                result = matcher.match(regex, words)
+                assert (expected and expected.state) == \
+                    (result and result.state)
+
+                n = 3
+                old = timeit.timeit(lambda: refo_match(regex, words),
+                                    number=n) / n * 1000
+                new = timeit.timeit(lambda: matcher.match(regex, words),
+                                    number=n) / n * 1000
+                label = "{} [{}]".format(name, last_tag)
+                print "{:55} {:>6} {:>10.2f} {:>10.2f} {:>6.1f}x".format(
+                    label, length, old, new, old / new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Translation time of a log of questions with a loop over `get_query` and
+with `get_query_batch`.
+The log is made of the examples in the docstrings of the rules, each one
+repeated `<repeat>` times and shuffled. The tagger cache is disabled, so
+both ways tag every question they don't dedupe. It needs the nltk data.
+
+Usage:
+    python benchmarks/batch_translation.py [<app_path> <app_name> [<repeat>]]
+
+By default it uses the DBpedia example and 5 repetitions.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+
+import quepy
+from quepy import settings
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def example_questions(app):
+    questions = []
+    for rule in app.rules:
+        questions.extend(re.findall('"(.*?)"', rule.__doc__ or ""))
+    return [encoding_flexible_conversion(x) for x in questions]
+
+
+def main(app_path, app_name, repeat):
+    sys.path.insert(0, app_path)
+    settings.TAGGER_CACHE_SIZE = 0
+    app = quepy.install(app_name)
+    questions = example_questions(app)
+    log = questions * repeat
+    random.seed(0)
+    random.shuffle(log)
+
+    print "{} questions, {} different".format(len(log), len(questions))
+    print "{:8} {:>10} {:>14}".format("", "seconds", "ms/question")
+
+    start = time.time()
+    expected = [app.get_query(x) for x in log]
+    loop = time.time() - start
+    print "{:8} {:>10.3f} {:>14.3f}".format("loop", loop,
+                                            loop / len(log) * 1000)
+
+    start = time.time()
+    result = app.get_query_batch(log)
+    batch = time.time() - start
+    print "{:8} {:>10.3f} {:>14.3f}".format("batch", batch,
+                                            batch / len(log) * 1000)
+
+    assert result == expected
+    print "speedup: {:.1f}x".format(loop / batch)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3:
+        repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+        main(sys.argv[1], sys.argv[2], repeat)
+    else:
+        main(os.path.join(HERE, "..", "examples", "dbpedia"), "dbpedia", 5)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Matching time of the rules of an example application with and without
+collapsing the alternations of predicates into sets.
+The questions used are the examples in the docstrings of the rules, it needs
+the nltk data to tag them.
+
+Usage:
+    python benchmarks/disjunction_sets.py [<app_path> <app_name>]
+
+By default it uses the DBpedia example.
+"""
+
+import os
+import re
+import sys
+import timeit
+
+import quepy
+from quepy.matcher import RuleMatcher, _SPLIT
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def example_questions(app):
+    questions = []
+    for rule in app.rules:
+        questions.extend(re.findall('"(.*?)"', rule.__doc__ or ""))
+    return [encoding_flexible_conversion(x) for x in questions]
+
+
+def main(app_path, app_name):
+    sys.path.insert(0, app_path)
+    app = quepy.install(app_name)
+    questions = [app.tagger(x) for x in example_questions(app)]
+
+    print "{} rules, {} questions".format(len(app.rules), len(questions))
+    header = ("", "instructions", "splits", "ms/question")
+    print "{:12} {:>13} {:>8} {:>14}".format(*header)
+    for name, optimize in [("before", False), ("after", True)]:
+        matcher = RuleMatcher(app.rules, optimize)
+        program = matcher._program
+        splits = program.ops.count(_SPLIT)
+
+        def run():
+            for words in questions:
+                matcher.match(words)
+
+        n = 20
+        seconds = min(timeit.repeat(run, number=n, repeat=3))
+        per_question = seconds / n / len(questions) * 1000
+        print "{:12} {:>13} {:>8} {:>14.3f}".format(name, len(program),
+                                                    splits, per_question)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        main(sys.argv[1], sys.argv[2])
+    else:
+        main(os.path.join(HERE, "..", "examples", "dbpedia"), "dbpedia")
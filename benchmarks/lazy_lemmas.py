@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Words lemmatized and time to tag and match a question with the NLTK tagger
+lemmatizing every word when tagging, as it used to, and lazily, when the
+rules look at the lemmas.
+The questions are the examples in the docstrings of the rules of the
+DBpedia application and the same examples with their words reversed, that
+most rules reject. The lemma cache is disabled so every question pays for
+its lemmas. Questions are lemmatized anyway when the pos tags and tokens
+leave some rule that can only be ruled out by its lemmas. It needs the
+nltk data.
+
+Usage:
+    python benchmarks/lazy_lemmas.py [<repeat>]
+
+By default every question is translated 20 times.
+"""
+
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "examples", "dbpedia"))
+
+import quepy
+from quepy.nltktagger import Tagger
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+
+def example_questions(app):
+    questions = []
+    for rule in app.rules:
+        questions.extend(re.findall('"(.*?)"', rule.__doc__ or ""))
+    return [encoding_flexible_conversion(x) for x in questions]
+
+
+def measure(app, tagger, questions, eager, repeat):
+    calls = [0]
+    lemmatize = tagger.lemmatize
+
+    def counted(token, mtag):
+        calls[0] += 1
+        return lemmatize(token, mtag)
+
+    tagger.lemmatize = counted
+    try:
+        start = time.time()
+        for _ in xrange(repeat):
+            for question in questions:
+                words = tagger.tag(question)
+                if eager:
+                    words.lemmas
+                for _ in app._iter_compiled_forms(question, words):
+                    pass
+        seconds = time.time() - start
+    finally:
+        del tagger.lemmatize
+    count = float(repeat * len(questions))
+    return calls[0] / count, seconds / count
+
+
+def main(repeat):
+    app = quepy.install("dbpedia")
+    tagger = Tagger(app.settings.NLTK_DATA_PATH)
+    tagger.load()
+    examples = example_questions(app)
+    reversed_examples = [u" ".join(reversed(x.split())) for x in examples]
+
+    print "{:>10} {:>8} {:>14} {:>14}".format("questions", "lemmas",
+                                              "lemmatized", "us/question")
+    for name, questions in [("examples", examples),
+                            ("reversed", reversed_examples)]:
+        for mode, eager in [("eager", True), ("lazy", False)]:
+            lemmas, seconds = measure(app, tagger, questions, eager, repeat)
+            print "{:>10} {:>8} {:>14.2f} {:>14.1f}".format(
+                name, mode, lemmas, seconds * 1e6)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
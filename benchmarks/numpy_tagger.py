@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tags of `quepy.numpytagger` against `nltk.pos_tag`, and the time both take
+to tag batches of questions.
+The regression corpus are the examples in the docstrings of the rules of
+the DBpedia and Freebase examples and, if the nltk data has it, the
+sentences of the "treebank" corpus. The batches are the corpus repeated
+`<repeat>` times. It needs the nltk data and NumPy.
+
+Usage:
+    python benchmarks/numpy_tagger.py [<repeat>]
+
+By default the corpus is repeated 5 times.
+"""
+
+import os
+import re
+import sys
+import time
+
+import nltk
+import quepy
+from quepy.numpytagger import NumpyTagger
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APPS = ["dbpedia", "freebase"]
+
+
+def corpus():
+    sentences = []
+    for name in APPS:
+        sys.path.insert(0, os.path.join(HERE, "..", "examples", name))
+        app = quepy.install(name)
+        for rule in app.rules:
+            for question in re.findall('"(.*?)"', rule.__doc__ or ""):
+                question = encoding_flexible_conversion(question)
+                sentences.append(nltk.wordpunct_tokenize(question))
+    try:
+        sentences.extend(nltk.corpus.treebank.sents())
+    except LookupError:
+        print "No treebank corpus, using only the example questions"
+    return sentences
+
+
+def main(repeat):
+    sentences = corpus()
+    tagger = NumpyTagger()
+    tagger.load()
+    perceptron = tagger._load_perceptron()
+
+    expected = [nltk.pos_tag(x) for x in sentences]
+    tagged = tagger._tag_sentences(sentences)
+    different = sum(x != y for x, y in zip(tagged, expected))
+    print "{} sentences, {} tagged differently".format(len(sentences),
+                                                       different)
+
+    batch = sentences * repeat
+    start = time.time()
+    for sentence in batch:
+        perceptron.tag(sentence)
+    nltk_seconds = time.time() - start
+    start = time.time()
+    tagger._tag_sentences(batch)
+    numpy_seconds = time.time() - start
+
+    print "{:>8} {:>10} {:>16}".format("tagger", "seconds", "sentences/s")
+    for name, seconds in [("nltk", nltk_seconds), ("numpy", numpy_seconds)]:
+        print "{:>8} {:>10.3f} {:>16.1f}".format(name, seconds,
+                                                 len(batch) / seconds)
+    sys.exit(different != 0)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Memory and matching time of the tagged words of a question kept as a list
+of `Word` objects and as a `quepy.tagger.TaggedSentence`.
+The questions are the examples in the docstrings of the rules of the
+DBpedia application, tagged with the lookup tagger so the nltk data isn't
+needed. The memory counts the objects allocated to hold the tags of a
+question and their size, the strings are shared by both so they aren't
+counted.
+
+Usage:
+    python benchmarks/tagged_sentence.py [<repeat>]
+
+By default every question is matched 20 times.
+"""
+
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "examples", "dbpedia"))
+
+import quepy
+from quepy import settings
+from quepy.tagger import Word, TaggedSentence
+from quepy.lookuptagger import LookupTagger
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+
+def example_questions(app):
+    questions = []
+    for rule in app.rules:
+        questions.extend(re.findall('"(.*?)"', rule.__doc__ or ""))
+    return [encoding_flexible_conversion(x) for x in questions]
+
+
+def footprint(words):
+    # Amount of objects and bytes that hold the tags of `words`
+    if isinstance(words, TaggedSentence):
+        objects = [words, words.tokens, words.lemmas, words.tags, words.probs]
+    else:
+        objects = [words] + list(words)
+    unique = dict((id(x), x) for x in objects).values()
+    return len(unique), sum(sys.getsizeof(x) for x in unique)
+
+
+def match_seconds(app, questions, sentences, repeat):
+    start = time.time()
+    for _ in xrange(repeat):
+        for question, words in zip(questions, sentences):
+            for _ in app._iter_compiled_forms(question, words):
+                pass
+    return (time.time() - start) / (repeat * len(questions))
+
+
+def main(repeat):
+    settings.TAGGER = u"lookup"
+    app = quepy.install("dbpedia")
+    questions = example_questions(app)
+    tagger = LookupTagger()
+    columnar = [tagger.tag(x) for x in questions]
+    objects = [[Word(*x) for x in words.fields()] for words in columnar]
+
+    print "{} questions, {:.1f} words per question".format(
+        len(questions), sum(len(x) for x in columnar) / float(len(questions)))
+    print "{:>16} {:>10} {:>10} {:>14}".format("words", "objects", "bytes",
+                                               "us/question")
+    for name, sentences in [("list of Word", objects),
+                            ("TaggedSentence", columnar)]:
+        sizes = [footprint(x) for x in sentences]
+        count = sum(x for x, _ in sizes) / float(len(sizes))
+        size = sum(x for _, x in sizes) / float(len(sizes))
+        seconds = match_seconds(app, questions, sentences, repeat)
+        print "{:>16} {:>10.1f} {:>10.0f} {:>14.1f}".format(
+            name, count, size, seconds * 1e6)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Accuracy and latency of the lookup tagger against the NLTK tagger.
+The questions are the examples in the docstrings of the rules of the
+DBpedia and Freebase examples, the NLTK tags are taken as the reference.
+The lookup tagger is measured with quepy's lexicon and with the lexicons
+built for each application, as ``quepy lexicon`` does. It needs the nltk
+data.
+
+Usage:
+    python benchmarks/tagger_backends.py [<repeat>]
+
+By default every question is tagged 20 times.
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+
+import quepy
+from quepy.nltktagger import Tagger
+from quepy.lookuptagger import LookupTagger, write_lexicon
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APPS = ["dbpedia", "freebase"]
+
+
+def example_questions(app):
+    questions = []
+    for rule in app.rules:
+        questions.extend(re.findall('"(.*?)"', rule.__doc__ or ""))
+    return [encoding_flexible_conversion(x) for x in questions]
+
+
+def measure(name, tag, questions, expected, repeat):
+    start = time.time()
+    for _ in xrange(repeat):
+        for question in questions:
+            tag(question)
+    seconds = (time.time() - start) / (repeat * len(questions))
+
+    words = same_pos = same_lemma = same_sentences = 0
+    for question, reference in zip(questions, expected):
+        tagged = [(x.token, x.pos, x.lemma) for x in tag(question)]
+        same_sentences += tagged == reference
+        for word, other in zip(tagged, reference):
+            words += 1
+            same_pos += word[1] == other[1]
+            same_lemma += word[2] == other[2]
+    print "{:<28} {:>10.1f} {:>8.1%} {:>8.1%} {:>10.1%}".format(
+        name, seconds * 1e6, same_pos / float(words),
+        same_lemma / float(words), same_sentences / float(len(questions)))
+
+
+def main(repeat):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in APPS:
+            sys.path.insert(0, os.path.join(HERE, "..", "examples", name))
+            app = quepy.install(name)
+            questions = example_questions(app)
+            nltk_tagger = Tagger(app.settings.NLTK_DATA_PATH,
+                                 app.settings.LEMMA_CACHE_SIZE)
+            expected = [[(x.token, x.pos, x.lemma) for x in words]
+                        for words in nltk_tagger.tag_batch(questions)]
+            path = os.path.join(tmpdir, name + ".tsv")
+            write_lexicon(path, nltk_tagger.tag_batch(questions))
+
+            print "{}: {} questions".format(name, len(questions))
+            print "{:<28} {:>10} {:>8} {:>8} {:>10}".format(
+                "tagger", "us/quest.", "pos", "lemma", "sentences")
+            measure("nltk", nltk_tagger.tag, questions, expected, repeat)
+            measure("lookup", LookupTagger().tag, questions, expected, repeat)
+            measure("lookup (app lexicon)", LookupTagger(path).tag,
+                    questions, expected, repeat)
+            print
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
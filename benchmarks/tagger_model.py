@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Startup time, memory and tagging speed of the NLTK tagger with its pickled
+model and with the model converted to a `quepy.taggermodel.TaggerModel`.
+Each one is measured in a new process, the memory is the growth of its
+private memory (the pages of the mapped model are shared, so they aren't
+counted). It needs the nltk data and Linux.
+
+Usage:
+    python benchmarks/tagger_model.py [<repeat>]
+
+The examples of the DBpedia application are tagged `<repeat>` times, 20 by
+default.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def private_memory():
+    # Kilobytes of private memory of this process
+    total = 0
+    with open("/proc/self/smaps") as smaps:
+        for line in smaps:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def measure(model_path, repeat):
+    sys.path.insert(0, os.path.join(HERE, "..", "examples", "dbpedia"))
+    import nltk
+    import quepy
+    from quepy.nltktagger import Tagger
+
+    app = quepy.install("dbpedia")
+    questions = []
+    for rule in app.rules:
+        questions.extend(x.decode("utf-8")
+                         for x in re.findall('"(.*?)"', rule.__doc__ or ""))
+    tagger = Tagger(app.settings.NLTK_DATA_PATH,
+                    tagger_model_path=model_path)
+    sentences = [nltk.wordpunct_tokenize(x) for x in questions]
+
+    memory = private_memory()
+    start = time.time()
+    perceptron = tagger._load_perceptron()
+    load_seconds = time.time() - start
+    memory = private_memory() - memory
+
+    start = time.time()
+    for _ in xrange(repeat):
+        tags = [perceptron.tag(x) for x in sentences]
+    tag_seconds = time.time() - start
+    return {"load": load_seconds, "memory": memory,
+            "tag": tag_seconds / (repeat * len(sentences)), "tags": tags}
+
+
+def run(model_path, repeat):
+    command = [sys.executable, __file__, "--measure", str(repeat)]
+    if model_path is not None:
+        command.append(model_path)
+    return json.loads(subprocess.check_output(command))
+
+
+def main(repeat):
+    from quepy.nltktagger import Tagger
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "model")
+        start = time.time()
+        Tagger().build_tagger_model(path)
+        print "Converted in {:.2f} s, {:.1f} MB".format(
+            time.time() - start, os.path.getsize(path) / 1e6)
+
+        pickled = run(None, repeat)
+        mapped = run(path, repeat)
+        print "{:>8} {:>10} {:>12} {:>14}".format("model", "load (s)",
+                                                  "private KB", "us/sentence")
+        for name, result in [("pickle", pickled), ("mmap", mapped)]:
+            print "{:>8} {:>10.3f} {:>12} {:>14.1f}".format(
+                name, result["load"], result["memory"], result["tag"] * 1e6)
+        print "Same tags: {}".format(pickled["tags"] == mapped["tags"])
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--measure":
+        model_path = sys.argv[3] if len(sys.argv) > 3 else None
+        print json.dumps(measure(model_path, int(sys.argv[2])))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tagging throughput of one shared `quepy.nltktagger.Tagger` against the
+amount of threads using it.
+The questions are the examples in the docstrings of the rules, repeated
+`<repeat>` times. It needs the nltk data.
+
+Usage:
+    python benchmarks/tagger_threads.py [<app_path> <app_name> [<repeat>]]
+
+By default it uses the DBpedia example and 20 repetitions.
+"""
+
+import os
+import re
+import sys
+import time
+from threading import Thread
+
+import quepy
+from quepy.nltktagger import get_nltk_tagger
+from quepy.encodingpolicy import encoding_flexible_conversion
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def example_questions(app):
+    questions = []
+    for rule in app.rules:
+        questions.extend(re.findall('"(.*?)"', rule.__doc__ or ""))
+    return [encoding_flexible_conversion(x) for x in questions]
+
+
+def main(app_path, app_name, repeat):
+    sys.path.insert(0, app_path)
+    app = quepy.install(app_name)
+    tagger = get_nltk_tagger(app.settings.NLTK_DATA_PATH)
+    questions = example_questions(app) * repeat
+    expected = [[unicode(x) for x in tagger.tag(q)] for q in questions]
+
+    print "{} questions".format(len(questions))
+    print "{:>8} {:>10} {:>16}".format("threads", "seconds", "questions/s")
+    for n in [1, 2, 4, 8, 16]:
+        results = [None] * len(questions)
+
+        def run(start):
+            for i in xrange(start, len(questions), n):
+                results[i] = [unicode(x) for x in tagger.tag(questions[i])]
+
+        threads = [Thread(target=run, args=(i,)) for i in xrange(n)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - start
+        assert results == expected
+        print "{:>8} {:>10.3f} {:>16.1f}".format(n, seconds,
+                                                 len(questions) / seconds)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        main(sys.argv[1], sys.argv[2], repeat)
+    else:
+        main(os.path.join(HERE, "..", "examples", "dbpedia"), "dbpedia", 20)
@@ -0,0 +1,231 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Support for the asyncio API of `QuepyApp`.
+
+The questions are translated in an executor, so the event loop isn't
+blocked while tagging. It uses `asyncio`, or its backport `trollius` on
+Python 2, and only futures and callbacks, so it works with both.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+try:
+    StopAsyncIteration = StopAsyncIteration
+except NameError:
+    class StopAsyncIteration(Exception):
+        """
+        Raised by `AsyncQueries` when there are no more queries.
+        """
+        pass
+
+EXECUTORS = {
+    u"thread": ThreadPoolExecutor,
+    u"process": ProcessPoolExecutor,
+}
+
+# The applications installed in each process of a process executor
+_apps = {}
+
+
+class AsyncRunner(object):
+    """
+    Translates the questions of `app` in an executor of `kind` ("thread" or
+    "process") that translates at most `max_workers` questions at the same
+    time.
+
+    Identical questions in flight in the same event loop are translated
+    once. Cancelling the future of a question cancels its translation when
+    no one else is waiting for it, unless it already started.
+    """
+
+    def __init__(self, app, kind=u"thread", max_workers=4):
+        if kind not in EXECUTORS:
+            raise ValueError(u"Unknown executor {0!r}".format(kind))
+        self.app = app
+        self.kind = kind
+        self.max_workers = max_workers
+        self.executor = None
+        self._inflight = {}
+
+    def submit(self, key, question, loop=None):
+        """
+        Returns an asyncio future with the tuple of queries of `question`,
+        that can be cached with `key`.
+        """
+
+        loop = loop or asyncio.get_event_loop()
+        waiter = asyncio.Future(loop=loop)
+        if self.app.cache is not None:
+            queries = self.app.cache.get(key)
+            if queries is not None:
+                waiter.set_result(queries)
+                return waiter
+
+        entry = self._inflight.get((loop, key))
+        if entry is None:
+            entry = self._start(key, question, loop)
+        entry[u"waiters"] += 1
+
+        def copy_result(shared):
+            if waiter.done():
+                return
+            if shared.cancelled():
+                waiter.cancel()
+            elif shared.exception() is not None:
+                waiter.set_exception(shared.exception())
+            else:
+                waiter.set_result(shared.result())
+
+        def release(waiter):
+            entry[u"waiters"] -= 1
+            if waiter.cancelled() and not entry[u"waiters"]:
+                entry[u"work"].cancel()
+                entry[u"shared"].cancel()
+
+        entry[u"shared"].add_done_callback(copy_result)
+        waiter.add_done_callback(release)
+        return waiter
+
+    def shutdown(self, wait=True):
+        """
+        Shuts the executor down, a new one is created if needed.
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown(wait)
+            self.executor = None
+
+    def _start(self, key, question, loop):
+        if self.executor is None:
+            self.executor = EXECUTORS[self.kind](self.max_workers)
+        if self.kind == u"process":
+            app_name = self.app._parsing_module.__name__
+            work = self.executor.submit(_process_queries, app_name, question)
+        else:
+            work = self.executor.submit(_thread_queries, self.app, question)
+
+        entry = {
+            u"work": work,
+            u"shared": asyncio.wrap_future(work, loop=loop),
+            u"waiters": 0,
+        }
+        self._inflight[loop, key] = entry
+
+        def finish(shared):
+            if self._inflight.get((loop, key)) is entry:
+                del self._inflight[loop, key]
+            if self.kind == u"process" and self.app.cache is not None and \
+                    not shared.cancelled() and shared.exception() is None:
+                self.app.cache[key] = shared.result()
+
+        entry[u"shared"].add_done_callback(finish)
+        return entry
+
+
+class AsyncQueries(object):
+    """
+    Asynchronous iterator over the queries given by `future`.
+
+    With Python 3 it's used with ``async for``. Otherwise every call to
+    `__anext__` returns a future with the next query, that fails with
+    `StopAsyncIteration` after the last one.
+    Cancelling a pending future or calling `aclose` cancels the
+    translation.
+    """
+
+    def __init__(self, future, loop):
+        self._future = future
+        self._loop = loop
+        self._index = 0
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        result = asyncio.Future(loop=self._loop)
+
+        def next_query(future):
+            if result.done():
+                return
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            elif self._index < len(future.result()):
+                result.set_result(future.result()[self._index])
+                self._index += 1
+            else:
+                result.set_exception(StopAsyncIteration())
+
+        def cancel(result):
+            if result.cancelled():
+                self._future.cancel()
+
+        self._future.add_done_callback(next_query)
+        result.add_done_callback(cancel)
+        return result
+
+    def aclose(self):
+        """
+        Cancels the translation if it's not finished. Returns a future
+        like the ``aclose`` of asynchronous generators.
+        """
+
+        self._future.cancel()
+        result = asyncio.Future(loop=self._loop)
+        result.set_result(None)
+        return result
+
+
+def first_query(future, loop):
+    """
+    Returns a future with the first query of the queries given by `future`,
+    or ``(None, None, None)`` if there is none.
+    """
+
+    result = asyncio.Future(loop=loop)
+
+    def copy_first(future):
+        if result.done():
+            return
+        if future.cancelled():
+            result.cancel()
+        elif future.exception() is not None:
+            result.set_exception(future.exception())
+        elif future.result():
+            result.set_result(future.result()[0])
+        else:
+            result.set_result((None, None, None))
+
+    def cancel(result):
+        if result.cancelled():
+            future.cancel()
+
+    future.add_done_callback(copy_first)
+    result.add_done_callback(cancel)
+    return result
+
+
+def _thread_queries(app, question):
+    return tuple(app.get_queries(question))
+
+
+def _process_queries(app_name, question):
+    from quepy.quepyapp import install
+
+    if app_name not in _apps:
+        _apps[app_name] = install(app_name)
+    return tuple(_apps[app_name].get_queries(question))
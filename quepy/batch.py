@@ -0,0 +1,163 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Translation of large amounts of questions with a pool of processes.
+
+The questions are sent to the workers in chunks and the results are given
+back in input order. Only a bounded amount of chunks is in flight at any
+time, so the memory used doesn't depend on the amount of questions.
+"""
+
+import time
+from itertools import islice
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+from quepy import generation
+from quepy.quepyapp import install, question_sanitize
+from quepy.tagger import TaggingError
+from quepy.encodingpolicy import encoding_flexible_conversion, error_message
+
+# Waiting with a timeout makes the wait interruptible by Ctrl-C
+_WAIT = 365 * 24 * 3600
+
+# The application of each worker process
+_app = None
+_install_error = None
+
+
+def translate(app, question):
+    """
+    Translates `question` with `app` and returns a dict with the question,
+    the rule used, the first query generated (with its target and user
+    data) and the time in milliseconds spent on each stage.
+    If the translation fails the dict has the ``error`` instead, so the
+    other questions are still translated. Blank questions aren't
+    translated, they give an empty result.
+    """
+
+    encoding = app.settings.DEFAULT_ENCODING
+    question = encoding_flexible_conversion(question_sanitize(question),
+                                            encoding=encoding)
+    result = {
+        u"question": question,
+        u"rule_used": None,
+        u"target": None,
+        u"query": None,
+        u"userdata": None,
+    }
+    timings = {}
+    if not question.strip():
+        result[u"timings"] = timings
+        return result
+
+    start = time.time()
+    try:
+        _translate(app, question, result, timings)
+    except Exception, error:
+        result[u"error"] = u"{0}: {1}".format(type(error).__name__,
+                                              error_message(error))
+
+    timings[u"total"] = time.time() - start
+    result[u"timings"] = dict((key, round(value * 1000, 3))
+                              for key, value in timings.iteritems())
+    return result
+
+
+def _translate(app, question, result, timings):
+    # Fills `result` and `timings` with the translation of `question`
+    start = time.time()
+    try:
+        words = app.tagger(question)
+    except TaggingError:
+        words = None
+    timings[u"tagging"] = time.time() - start
+
+    expression = None
+    if words is not None:
+        step = time.time()
+        for expression, userdata in app._iter_compiled_forms(question,
+                                                             words):
+            result[u"rule_used"] = expression.rule_used
+            result[u"userdata"] = userdata
+            break
+        timings[u"matching"] = time.time() - step
+
+    if expression is not None:
+        step = time.time()
+        target, query = generation.get_code(expression, app.language,
+                                            app.settings)
+        result[u"target"] = target
+        result[u"query"] = query
+        timings[u"generation"] = time.time() - step
+
+
+def iter_results(app_name, questions, workers=None, chunk_size=64,
+                 max_in_flight=None):
+    """
+    Translates the `questions` (an iterable) with the application
+    `app_name` and generates the result of `translate` for each one, in
+    the same order.
+
+    The questions are split in chunks of `chunk_size` and translated by
+    `workers` processes (all the CPUs by default), keeping at most
+    `max_in_flight` chunks pending (twice the workers by default).
+    With a single worker everything runs in the current process.
+    """
+
+    chunks = _iter_chunks(questions, chunk_size)
+    if workers == 1:
+        app = install(app_name)
+        for chunk in chunks:
+            for question in chunk:
+                yield translate(app, question)
+        return
+
+    workers = workers or cpu_count()
+    max_in_flight = max_in_flight or 2 * workers
+    pool = Pool(workers, _init_worker, (app_name,))
+    try:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= max_in_flight:
+                for result in pending.popleft().get(_WAIT):
+                    yield result
+            pending.append(pool.apply_async(_translate_chunk, (chunk,)))
+        while pending:
+            for result in pending.popleft().get(_WAIT):
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(app_name):
+    global _app, _install_error
+    try:
+        _app = install(app_name)
+    except Exception, error:
+        # Raising here would make the pool start workers forever
+        _install_error = error
+
+
+def _translate_chunk(questions):
+    if _install_error is not None:
+        raise _install_error
+    return [translate(_app, question) for question in questions]
@@ -0,0 +1,624 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Bounded caches with usage counters.
+
+Both `LRUCache` and `LFUCache` behave like a dict limited to `max_entries`
+items and (approximately) `max_bytes` bytes. When a limit is exceeded they
+evict the least recently used or the least frequently used entries. Every
+operation is thread safe.
+
+`SqliteStore` is an unbounded persistent store, to keep cached values across
+restarts or share them between processes, and `TieredCache` puts a bounded
+cache in front of one.
+
+`SingleFlight` avoids computing the same value, or iterating the same
+sequence, in many threads at once.
+"""
+
+import os
+import sys
+import logging
+import sqlite3
+import cPickle as pickle
+from threading import Lock, Event
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger("quepy.cache")
+_missing = object()
+
+
+def sizeof(value):
+    """
+    Returns an estimate of the memory used by `value`, following the
+    contents of tuples, lists, sets and dicts.
+    """
+
+    size = 0
+    pending = [value]
+    seen = set()
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            pending.extend(value.iterkeys())
+            pending.extend(value.itervalues())
+        elif isinstance(value, (tuple, list, set, frozenset)):
+            pending.extend(value)
+    return size
+
+
+class Cache(object):
+    """
+    Base class for the bounded caches. Subclasses implement the eviction
+    policy by defining `_touch`, `_add`, `_remove` and `_victim`.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """
+        Creates an empty cache. A limit of ``None`` means no limit.
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._data = {}
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value of `key` or `default` if it's not cached.
+        """
+
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            self._touch(key)
+            return value
+
+    def __setitem__(self, key, value):
+        size = sizeof(key) + sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._discard(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            while self._data and self._full(size):
+                self._discard(self._victim())
+                self.evictions += 1
+            self._data[key] = value, size
+            self.bytes += size
+            self._add(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key not in self._data:
+                raise KeyError(key)
+            self._discard(key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """
+        Removes all the entries. The counters are kept.
+        """
+
+        with self._lock:
+            for key in self._data.keys():
+                self._discard(key)
+
+    def items(self):
+        """
+        Returns a list with the ``(key, value)`` pairs of the entries.
+        """
+
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._data.items()]
+
+    def stats(self):
+        """
+        Returns a dict with the counters and the current size of the cache.
+        """
+
+        return {
+            u"hits": self.hits,
+            u"misses": self.misses,
+            u"evictions": self.evictions,
+            u"entries": len(self._data),
+            u"bytes": self.bytes,
+        }
+
+    def _full(self, size):
+        """
+        Returns True if there's no room for an entry of `size` bytes.
+        """
+
+        if self.max_entries is not None and \
+                len(self._data) >= self.max_entries:
+            return True
+        return self.max_bytes is not None and \
+            self.bytes + size > self.max_bytes
+
+    def _discard(self, key):
+        _, size = self._data.pop(key)
+        self.bytes -= size
+        self._remove(key)
+
+    def _touch(self, key):
+        raise NotImplementedError()
+
+    def _add(self, key):
+        raise NotImplementedError()
+
+    def _remove(self, key):
+        raise NotImplementedError()
+
+    def _victim(self):
+        raise NotImplementedError()
+
+
+class LRUCache(Cache):
+    """
+    Cache that evicts the least recently used entries first.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        super(LRUCache, self).__init__(max_entries, max_bytes)
+        self._order = OrderedDict()
+
+    def _touch(self, key):
+        del self._order[key]
+        self._order[key] = None
+
+    def _add(self, key):
+        self._order[key] = None
+
+    def _remove(self, key):
+        del self._order[key]
+
+    def _victim(self):
+        return next(iter(self._order))
+
+
+class LFUCache(Cache):
+    """
+    Cache that evicts the least frequently used entries first, and the
+    least recently used among those.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        super(LFUCache, self).__init__(max_entries, max_bytes)
+        self._counts = {}
+        # Keys grouped by use count, in least recently used order
+        self._buckets = {}
+        self._min_count = 0
+
+    def _touch(self, key):
+        count = self._counts[key]
+        self._remove(key)
+        self._insert(key, count + 1)
+
+    def _add(self, key):
+        self._insert(key, 1)
+        self._min_count = 1
+
+    def _insert(self, key, count):
+        self._counts[key] = count
+        self._buckets.setdefault(count, OrderedDict())[key] = None
+
+    def _remove(self, key):
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min_count:
+                self._min_count += 1
+
+    def _victim(self):
+        if self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+        return next(iter(self._buckets[self._min_count]))
+
+
+class SqliteStore(object):
+    """
+    Persistent store of picklable values on a sqlite database in `path`.
+    Entries are separated by `namespace`, so values stored by other
+    versions of the producer are never returned. Every entry has a hit
+    count, used to find the most popular ones.
+    It's safe to use from many threads and processes.
+    """
+
+    def __init__(self, path, namespace):
+        self.path = path
+        self.namespace = namespace
+        self._lock = Lock()
+        self._pid = None
+        self._connection = None
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for `key` or `default`.
+        """
+
+        with self._lock:
+            cursor = self._connect().execute(
+                u"SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key))
+            row = cursor.fetchone()
+        if row is None:
+            return default
+        return pickle.loads(str(row[0]))
+
+    def put(self, key, value):
+        """
+        Stores `value` for `key`.
+        """
+
+        value = sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    u"INSERT OR REPLACE INTO entries VALUES (?, ?, ?, "
+                    u"COALESCE((SELECT hits FROM entries WHERE namespace = ? "
+                    u"AND key = ?), 0))",
+                    (self.namespace, key, value, self.namespace, key))
+
+    def add_hits(self, hits):
+        """
+        Adds the amount of hits in the dict `hits` to the hit count of
+        each of its keys.
+        """
+
+        params = [(count, self.namespace, key)
+                  for key, count in hits.iteritems()]
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    u"UPDATE entries SET hits = hits + ? "
+                    u"WHERE namespace = ? AND key = ?", params)
+
+    def top(self, n):
+        """
+        Returns the `n` entries with more hits as ``(key, value)`` pairs.
+        """
+
+        with self._lock:
+            cursor = self._connect().execute(
+                u"SELECT key, value FROM entries WHERE namespace = ? "
+                u"ORDER BY hits DESC LIMIT ?", (self.namespace, n))
+            rows = cursor.fetchall()
+        return [(key, pickle.loads(str(value))) for key, value in rows]
+
+    def keys(self):
+        """
+        Returns the keys stored in the namespace.
+        """
+
+        with self._lock:
+            cursor = self._connect().execute(
+                u"SELECT key FROM entries WHERE namespace = ?",
+                (self.namespace,))
+            return [row[0] for row in cursor]
+
+    def _connect(self):
+        # Connections can't be shared with forked processes
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30,
+                                               check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    u"CREATE TABLE IF NOT EXISTS entries (namespace TEXT, "
+                    u"key TEXT, value BLOB, hits INTEGER, "
+                    u"PRIMARY KEY (namespace, key))")
+            self._pid = os.getpid()
+        return self._connection
+
+
+class TieredCache(object):
+    """
+    A bounded in-memory `Cache` (the `memory` tier) in front of a
+    `SqliteStore`. Values are written to both tiers and looked up in the
+    store only when they are not in memory.
+    The hits are counted in memory and added to the store every
+    `flush_every` hits, or when calling `flush`.
+    """
+
+    def __init__(self, memory, store, flush_every=100):
+        self.memory = memory
+        self.store = store
+        self.flush_every = flush_every
+        self.store_hits = 0
+        self.store_misses = 0
+        self._hits = defaultdict(int)
+        self._pending = 0
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value of `key` or `default` if it's not cached.
+        """
+
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        try:
+            value = self.memory[key]
+        except KeyError:
+            value = self.store.get(key, _missing)
+            if value is _missing:
+                self.store_misses += 1
+                raise KeyError(key)
+            self.store_hits += 1
+            self.memory[key] = value
+        self._count(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.memory[key] = value
+        try:
+            self.store.put(key, value)
+        except (pickle.PicklingError, TypeError), error:
+            logger.warning(u"Can't store {0!r}: {1}".format(key, error))
+
+    def __contains__(self, key):
+        return key in self.memory
+
+    def __len__(self):
+        return len(self.memory)
+
+    def warm(self, n):
+        """
+        Loads the `n` most popular entries of the store into memory.
+        Returns the amount of entries loaded.
+        """
+
+        entries = self.store.top(n)
+        for key, value in entries:
+            self.memory[key] = value
+        return len(entries)
+
+    def flush(self):
+        """
+        Adds the pending hit counts to the store.
+        """
+
+        with self._lock:
+            hits, self._hits = self._hits, defaultdict(int)
+            self._pending = 0
+        if hits:
+            self.store.add_hits(hits)
+
+    def stats(self):
+        """
+        Returns a dict with the counters of both tiers.
+        """
+
+        result = self.memory.stats()
+        result[u"store_hits"] = self.store_hits
+        result[u"store_misses"] = self.store_misses
+        return result
+
+    def _count(self, key):
+        with self._lock:
+            self._hits[key] += 1
+            self._pending += 1
+            pending = self._pending
+        if pending >= self.flush_every:
+            self.flush()
+
+
+class SingleFlight(object):
+    """
+    Runs a function once for all the threads that ask for the same key at
+    the same time: the first one runs it and the others wait for its
+    result (or exception).
+    Nothing is kept once the function returns, or once the iteration of a
+    shared sequence is over.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self._flights = {}
+        self._sequences = {}
+        self._lock = Lock()
+
+    def do(self, key, function, *args):
+        """
+        Returns ``function(*args)``, or the result of the call in flight
+        for `key`.
+        """
+
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+        else:
+            try:
+                flight.result = function(*args)
+            except BaseException, error:
+                flight.error = error
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def share(self, key, function, *args):
+        """
+        Returns an iterator over the items of ``function(*args)``, or over
+        the ones of the sequence in flight for `key`.
+        The items are generated once, as the iterators ask for them, so a
+        call alone is as lazy as the sequence. The flight is over when the
+        sequence is exhausted or every iterator is closed.
+        """
+
+        with self._lock:
+            self.calls += 1
+            sequence = self._sequences.get(key)
+            if sequence is None:
+                sequence = _SharedSequence(self, key)
+                self._sequences[key] = sequence
+                self.executions += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+            sequence.iterators += 1
+
+        if leader:
+            try:
+                sequence.start(function(*args))
+            except BaseException, error:
+                sequence.fail(error)
+                raise
+        return _SharedIterator(sequence)
+
+    def _land(self, key, sequence):
+        with self._lock:
+            if self._sequences.get(key) is sequence:
+                del self._sequences[key]
+
+    def stats(self):
+        """
+        Returns a dict with the amount of calls, of executions of the
+        functions and of calls that shared the result of another one.
+        """
+
+        return {
+            u"calls": self.calls,
+            u"executions": self.executions,
+            u"shared": self.shared,
+            u"in_flight": len(self._flights) + len(self._sequences),
+        }
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedSequence(object):
+    def __init__(self, flight, key):
+        self.flight = flight
+        self.key = key
+        self.iterators = 0
+        self.items = []
+        self.error = None
+        self._iterator = None
+        self._started = Event()
+        self._lock = Lock()
+
+    def start(self, iterable):
+        self._iterator = iter(iterable)
+        self._started.set()
+
+    def fail(self, error):
+        self.error = error
+        self._started.set()
+        self.flight._land(self.key, self)
+
+    def get(self, index):
+        # Returns the item at `index`, generating it if needed
+        self._started.wait()
+        with self._lock:
+            if index == len(self.items) and self.error is None and \
+                    self._iterator is not None:
+                try:
+                    self.items.append(next(self._iterator))
+                except StopIteration:
+                    self._iterator = None
+                    self.flight._land(self.key, self)
+                except BaseException, error:
+                    self.error = error
+                    self.flight._land(self.key, self)
+            if index < len(self.items):
+                return self.items[index]
+            if self.error is not None:
+                raise self.error
+            raise StopIteration
+
+    def release(self):
+        with self.flight._lock:
+            self.iterators -= 1
+            last = self.iterators == 0
+        if last:
+            self.flight._land(self.key, self)
+
+
+class _SharedIterator(object):
+    def __init__(self, sequence):
+        self._sequence = sequence
+        self._index = 0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self._sequence is None:
+            raise StopIteration
+        try:
+            item = self._sequence.get(self._index)
+        except BaseException:
+            self.close()
+            raise
+        self._index += 1
+        return item
+
+    def close(self):
+        if self._sequence is not None:
+            self._sequence.release()
+            self._sequence = None
+
+    def __del__(self):
+        self.close()
@@ -16,10 +16,12 @@ from quepy import settings
 logger = logging.getLogger("quepy.encodingpolicy")
 
 
-def encoding_flexible_conversion(string, complain=False):
+def encoding_flexible_conversion(string, complain=False, encoding=None):
     """
     Converts string to the proper encoding if it's possible
     and if it's not raises a ValueError exception.
+    Strings that aren't unicode are decoded with `encoding`, the
+    DEFAULT_ENCODING of the settings if not given.
 
     If complain it's True, it will emit a logging warning about
     converting a string that had to be on the right encoding.
@@ -27,11 +29,12 @@ def encoding_flexible_conversion(string, complain=False):
 
     if isinstance(string, unicode):
         return string
+    encoding = encoding or settings.DEFAULT_ENCODING
     try:
-        ustring = string.decode(settings.DEFAULT_ENCODING)
+        ustring = string.decode(encoding)
     except UnicodeError:
         message = u"Argument must be unicode or {}"
-        raise ValueError(message.format(settings.DEFAULT_ENCODING))
+        raise ValueError(message.format(encoding))
     if complain:
         logger.warning(u"Forced to guess the encoding of {!r}, please "
                        u"provide a unicode string instead".format(string))
@@ -46,3 +49,15 @@ def assert_valid_encoding(string):
 
     if not isinstance(string, unicode):
         raise ValueError(u"Argument must be unicode")
+
+
+def error_message(error):
+    """
+    Returns the message of the exception `error` as unicode, or its repr
+    if the message can't be decoded.
+    """
+
+    try:
+        return unicode(error)
+    except UnicodeError:
+        return repr(error).decode("ascii")
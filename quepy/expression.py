@@ -186,6 +186,17 @@ class Expression(object):
         """
         return iter(self.nodes[node])
 
+    def __copy__(self):
+        """
+        Returns a copy of the Expression with its own adjacency lists,
+        so it can be modified without changing ``self``.
+        Edges and data values are shared.
+        """
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new.nodes = [list(edges) for edges in self.nodes]
+        return new
+
     def __add__(self, other):
         """
         Merges ``self`` and ``other`` in a new Expression instance.
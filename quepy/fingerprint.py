@@ -0,0 +1,220 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Fingerprint of the rule set of an application.
+
+The fingerprint changes whenever something that affects the queries
+generated by the application changes: the regexes, weights and
+interpretation code of the rules and particles, the constants of the DSL
+classes, the functions of the modules of the application and the
+settings that change the translation (the ones that only tune caches or
+workers aren't hashed). It's used to namespace persistent caches.
+"""
+
+import re
+import sys
+import hashlib
+from types import CodeType, FunctionType, MethodType
+
+from refo import Predicate, Literal, Any, Disjunction, Concatenation, Star, \
+    Plus, Question, Group, Repetition
+
+import quepy
+from quepy.expression import Expression
+from quepy.parsing import Particle
+
+_CONSTANT_TYPES = (basestring, int, long, float, bool, type(None), tuple)
+_SCALAR_TYPES = (basestring, int, long, float, bool, type(None))
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+# Settings that change how questions are translated, not their queries
+_RUNTIME_SETTINGS = frozenset([
+    "TAGGER_CACHE_SIZE", "TAGGER_CACHE_PATH",
+    "LEMMA_CACHE_SIZE", "LEMMA_CACHE_PATH",
+    "QUERY_CACHE_SIZE", "QUERY_CACHE_PATH", "QUERY_CACHE_WARMUP",
+    "ASYNC_EXECUTOR", "ASYNC_MAX_WORKERS",
+])
+
+
+def app_fingerprint(parsing, settings, rules):
+    """
+    Returns the fingerprint (an hex string) of an application given its
+    `parsing` and `settings` modules and its `rules`.
+    """
+
+    digest = hashlib.sha1()
+    digest.update(repr(quepy.VERSION))
+    modules = set()
+
+    for rule in rules:
+        cls = rule.__class__
+        modules.add(cls.__module__)
+        digest.update(repr((cls.__module__, cls.__name__, rule.weight,
+                            serialize_regex(rule.regex), _class_code(cls))))
+
+    package = parsing.__name__.split(".")[0]
+    for cls in _dsl_classes(package):
+        modules.add(cls.__module__)
+        digest.update(repr((cls.__module__, cls.__name__,
+                            _class_constants(cls), _class_code(cls))))
+
+    # Helper functions called by `interpret` can be anywhere in the package
+    modules.update(x for x in sys.modules
+                   if x == package or x.startswith(package + u"."))
+    digest.update(repr(_module_functions(modules)))
+
+    for key in sorted(dir(settings)):
+        if key.upper() != key or key in _RUNTIME_SETTINGS:
+            continue
+        value = _stable_repr(getattr(settings, key))
+        if value is not None:
+            digest.update(repr((key, value)))
+
+    return digest.hexdigest()
+
+
+def serialize_regex(regex):
+    """
+    Returns a representation of `regex` that only depends on its structure,
+    the values checked by its predicates and the code of its particles.
+    """
+
+    if isinstance(regex, Particle):
+        cls = regex.__class__
+        return (u"particle", cls.__module__, cls.__name__, regex.name,
+                serialize_regex(regex.x), _class_code(cls))
+    if isinstance(regex, Group):
+        return u"group", repr(regex.key), serialize_regex(regex.x)
+    if type(regex) is Literal:
+        return u"literal", repr(regex.x)
+    if type(regex) is Any:
+        return u"any"
+    if isinstance(regex, Predicate):
+        cls = regex.__class__
+        return (cls.__module__, cls.__name__, _class_constants(regex),
+                _class_code(cls), _serialize_code(regex.f))
+    if isinstance(regex, Concatenation):
+        return (u"concatenation",) + \
+            tuple(serialize_regex(x) for x in regex.xs)
+    if isinstance(regex, Disjunction):
+        return (u"disjunction", serialize_regex(regex.a),
+                serialize_regex(regex.b))
+    if isinstance(regex, (Star, Plus, Question)):
+        return (regex.__class__.__name__, regex.greedy,
+                serialize_regex(regex.x))
+    if isinstance(regex, Repetition):
+        return (u"repetition", regex.mn, regex.mx, regex.greedy,
+                serialize_regex(regex.x))
+    return repr(regex)
+
+
+def _stable_repr(value):
+    """
+    Returns a representation of the setting `value` that is the same in
+    every run, or None if there's none (it has an object address).
+    """
+
+    if isinstance(value, _SCALAR_TYPES):
+        return repr(value)
+    if isinstance(value, dict):
+        value = sorted(value.iteritems())
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value)
+    if isinstance(value, (list, tuple)):
+        items = [_stable_repr(x) for x in value]
+        if None in items:
+            return None
+        return "[{0}]".format(", ".join(items))
+    if isinstance(value, (type, FunctionType)):
+        return repr((value.__module__, value.__name__))
+    result = repr(value)
+    if _ADDRESS.search(result):
+        return None
+    return result
+
+
+def _serialize_code(function):
+    if isinstance(function, MethodType):
+        function = function.im_func
+    if isinstance(function, FunctionType):
+        return _serialize_code(function.func_code)
+    if isinstance(function, CodeType):
+        consts = tuple(_serialize_code(x) if isinstance(x, CodeType)
+                       else repr(x) for x in function.co_consts)
+        return function.co_code, consts, function.co_names
+    return repr(function)
+
+
+def _class_code(cls):
+    """
+    Returns the code of the methods of `cls` and its bases.
+    """
+
+    result = []
+    for base in cls.__mro__:
+        if base is object:
+            continue
+        for key, value in sorted(base.__dict__.iteritems()):
+            if isinstance(value, (FunctionType, staticmethod, classmethod)):
+                value = getattr(value, "__func__", value)
+                result.append((base.__name__, key, _serialize_code(value)))
+    return tuple(result)
+
+
+def _class_constants(obj):
+    """
+    Returns the constant attributes of `obj` (and its classes) sorted
+    by name.
+    """
+
+    cls = obj if isinstance(obj, type) else obj.__class__
+    attrs = {}
+    for base in reversed(cls.__mro__):
+        attrs.update(base.__dict__)
+    if cls is not obj:
+        attrs.update(vars(obj))
+    return tuple(sorted((key, repr(value)) for key, value in attrs.iteritems()
+                        if not key.startswith(u"__") and
+                        isinstance(value, _CONSTANT_TYPES)))
+
+
+def _module_functions(names):
+    """
+    Returns the code of the functions defined at the top level of the
+    modules called `names`.
+    """
+
+    result = []
+    for name in sorted(names):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        for key, value in sorted(vars(module).iteritems()):
+            if isinstance(value, FunctionType) and value.__module__ == name:
+                result.append((name, key, _serialize_code(value)))
+    return tuple(result)
+
+
+def _dsl_classes(package):
+    """
+    Returns the `Expression` subclasses defined by quepy or `package`.
+    """
+
+    result = []
+    pending = [Expression]
+    while pending:
+        cls = pending.pop()
+        for subclass in cls.__subclasses__():
+            pending.append(subclass)
+            module = subclass.__module__.split(".")[0]
+            if module in (u"quepy", package):
+                result.append(subclass)
+    result.sort(key=lambda x: (x.__module__, x.__name__))
+    return result
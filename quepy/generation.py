@@ -21,14 +21,17 @@ from quepy.dot_generation import expression_to_dot
 from quepy.sparql_generation import expression_to_sparql
 
 
-def get_code(expression, language):
+def get_code(expression, language, settings=None):
     """
     Given an expression and a supported language, it
     returns the query for that expression on that language.
+    `settings` are the settings of the app, by default the ones of
+    `quepy.settings` are used.
     """
 
     if language == "sparql":
-        return expression_to_sparql(expression)
+        preamble = getattr(settings, "SPARQL_PREAMBLE", None)
+        return expression_to_sparql(expression, preamble=preamble)
     elif language == "dot":
         return expression_to_dot(expression)
     elif language == "mql":
@@ -0,0 +1,111 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Compact table of precomputed lemmas, read with mmap.
+
+The file has a header with a magic string and the amount of entries, the
+offsets of the entries and the entries themselves, sorted. Each entry is
+``token NUL morphy-tag NUL lemma`` encoded in utf-8, so a lemma is found
+with a binary search, without loading the table in memory. Processes that
+map the same table share its pages.
+"""
+
+import os
+import mmap
+import struct
+from array import array
+
+MAGIC = "QUEPYLT1"
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<I")
+
+
+class LemmaTable(object):
+    """
+    Lemma table in the file `path`, written with `write_lemma_table`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as table_file:
+            self._data = mmap.mmap(table_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        if len(self._data) < _HEADER.size:
+            raise ValueError(u"{0!r} is not a lemma table".format(path))
+        magic, self._count = _HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError(u"{0!r} is not a lemma table".format(path))
+        self._start = _HEADER.size + _OFFSET.size * (self._count + 1)
+
+    def __len__(self):
+        return self._count
+
+    def get(self, token, mtag):
+        """
+        Returns the lemma of `token` with the morphy tag `mtag` or ``None``
+        if it's not in the table.
+        """
+
+        if u"\0" in token:
+            return None
+        key = _key(token, mtag)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            entry_key, _, lemma = entry.rpartition("\0")
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                return lemma.decode("utf-8")
+        return None
+
+    def close(self):
+        self._data.close()
+
+    def _entry(self, i):
+        offset = _HEADER.size + _OFFSET.size * i
+        start, = _OFFSET.unpack_from(self._data, offset)
+        end, = _OFFSET.unpack_from(self._data, offset + _OFFSET.size)
+        return self._data[self._start + start:self._start + end]
+
+
+def write_lemma_table(path, entries):
+    """
+    Writes the lemma table with `entries`, ``(token, mtag, lemma)``
+    triples, to the file `path`. Returns the amount of entries written.
+    """
+
+    records = {}
+    for token, mtag, lemma in entries:
+        if u"\0" not in token:
+            records[_key(token, mtag)] = lemma.encode("utf-8")
+    records = [key + "\0" + lemma for key, lemma in sorted(records.items())]
+
+    offsets = array("I", [0])
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    # Written beside the table and renamed, so readers never see it partial
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as table_file:
+        table_file.write(_HEADER.pack(MAGIC, len(records)))
+        for offset in offsets:
+            table_file.write(_OFFSET.pack(offset))
+        for record in records:
+            table_file.write(record)
+    os.rename(tmp_path, path)
+    return len(records)
+
+
+def _key(token, mtag):
+    return token.encode("utf-8") + "\0" + (mtag or u"").encode("utf-8")
@@ -0,0 +1,176 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Lightweight tagging with a lexicon and suffix rules, without NLTK.
+
+The data file is utf-8 text with one entry per line, tab separated:
+
+- ``token POS lemma``: a word of the lexicon.
+- ``*suffix POS replacement``: a suffix rule. Words not in the lexicon that
+  end with `suffix` get `POS`, and their lemma is the lowercase word with
+  the suffix replaced by `replacement`, or the lowercase word as is if the
+  replacement is ``=``.
+
+Empty lines and lines starting with ``#`` are ignored. Rules are tried from
+the longest suffix to the shortest. It's meant for applications with short
+and formulaic questions, `write_lexicon` builds a lexicon from the words
+tagged by another tagger.
+"""
+
+import os
+import re
+import codecs
+import hashlib
+from threading import Lock
+from collections import Counter
+
+from quepy.tagger import TaggedSentence
+from quepy.encodingpolicy import assert_valid_encoding
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            u"data", u"lexicon.tsv")
+# The same tokenization of nltk.wordpunct_tokenize
+_tokenize = re.compile(ur"\w+|[^\w\s]+",
+                       re.UNICODE | re.MULTILINE | re.DOTALL).findall
+_PUNCTUATION = {
+    u".": u".", u"?": u".", u"!": u".", u",": u",", u":": u":", u";": u":",
+    u"(": u"(", u")": u")", u"$": u"$", u"\"": u"``", u"'": u"''",
+    u"``": u"``", u"''": u"''", u"--": u":",
+}
+# Shortest stem left by a suffix rule
+_MIN_STEM = 3
+_taggers = {}
+_taggers_lock = Lock()
+
+
+class LookupTagger(object):
+    """
+    Tagger that uses the lexicon and suffix rules of the file `path` (the
+    lexicon shipped with quepy by default).
+    It's never modified after it's created, so it can be shared by many
+    threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_PATH
+        self.lexicon = {}
+        self.rules = []
+
+        with open(self.path, "rb") as lexicon_file:
+            content = lexicon_file.read()
+        self.version = hashlib.md5(content).hexdigest().decode("ascii")
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip() or line.startswith(u"#"):
+                continue
+            fields = line.split(u"\t")
+            if len(fields) != 3:
+                message = u"Invalid line in {0}: {1!r}"
+                raise ValueError(message.format(self.path, line))
+            token, pos, lemma = fields
+            if token.startswith(u"*") and len(token) > 1:
+                self.rules.append((token[1:], pos, lemma))
+            else:
+                self.lexicon[token] = pos, lemma
+        self.rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+
+    def tag(self, string):
+        """
+        Returns the :class:`quepy.tagger.TaggedSentence` of `string`.
+        """
+
+        assert_valid_encoding(string)
+        tagged = list(self._tag(string))
+        if not tagged:
+            return TaggedSentence([])
+        tokens, tags, lemmas = [list(x) for x in zip(*tagged)]
+        return TaggedSentence(tokens, lemmas, tags)
+
+    def tag_batch(self, strings):
+        """
+        Returns a list with the :class:`quepy.tagger.TaggedSentence` of each
+        one of `strings`.
+        """
+
+        return [self.tag(string) for string in strings]
+
+    def _tag(self, string):
+        for token in _tokenize(string):
+            lower = token.lower()
+            entry = self.lexicon.get(token) or self.lexicon.get(lower)
+            if entry is not None:
+                pos, lemma = entry
+            elif token in _PUNCTUATION:
+                pos, lemma = _PUNCTUATION[token], lower
+            elif not token[0].isalnum():
+                pos, lemma = u"SYM", lower
+            elif token.replace(u",", u"").replace(u".", u"").isdigit():
+                pos, lemma = u"CD", lower
+            elif token[0].isupper():
+                pos, lemma = u"NNP", lower
+            else:
+                pos, lemma = self._apply_rules(lower)
+            yield token, pos, lemma
+
+    def _apply_rules(self, word):
+        for suffix, pos, replacement in self.rules:
+            if word.endswith(suffix) and \
+                    len(word) - len(suffix) >= _MIN_STEM:
+                if replacement == u"=":
+                    return pos, word
+                return pos, word[:-len(suffix)] + replacement
+        return u"NN", word
+
+
+def get_lookup_tagger(path=None):
+    """
+    Returns the `LookupTagger` of the lexicon in `path`, shared by all its
+    users.
+    """
+
+    with _taggers_lock:
+        if path not in _taggers:
+            _taggers[path] = LookupTagger(path)
+        return _taggers[path]
+
+
+def make_batch_tagger(app_settings):
+    """
+    Tagger backend factory, see `quepy.tagger.register_tagger`.
+    """
+
+    tagger = get_lookup_tagger(app_settings.LOOKUP_TAGGER_PATH)
+    return tagger.tag_batch, tagger.version
+
+
+def write_lexicon(path, sentences, rules_path=None):
+    """
+    Writes to `path` a lexicon with the words of `sentences` (lists of
+    :class:`quepy.tagger.Word`), with the tag and lemma they have most
+    often, followed by the suffix rules of the lexicon in `rules_path`
+    (the default lexicon if not given).
+    Returns the amount of words written.
+    """
+
+    counts = {}
+    for words in sentences:
+        for word in words:
+            counts.setdefault(word.token, Counter())[word.pos, word.lemma] += 1
+
+    rules = LookupTagger(rules_path).rules
+    with codecs.open(path, "w", encoding="utf-8") as lexicon_file:
+        lexicon_file.write(u"# Words\n")
+        for token in sorted(counts):
+            (pos, lemma), _ = counts[token].most_common(1)[0]
+            lexicon_file.write(u"{0}\t{1}\t{2}\n".format(token, pos, lemma))
+        lexicon_file.write(u"# Suffix rules\n")
+        for suffix, pos, replacement in rules:
+            lexicon_file.write(u"*{0}\t{1}\t{2}\n".format(suffix, pos,
+                                                          replacement))
+    return len(counts)
@@ -0,0 +1,721 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Matching of several rules at once over a tagged question.
+
+The regex of every rule is compiled with refo and the resulting instruction
+graphs are flattened into a single program, where each rule has its own
+entry point and its own accepting instruction. The program is run as a
+Thompson (Pike) virtual machine: every word is fed once to all the live
+threads of all the rules, so a question is scanned a single time no matter
+how many rules the application has.
+
+Threads keep refo's priority order, which makes the captured groups of each
+rule exactly the ones ``refo.match`` would give for that rule alone.
+The amount of live threads is bounded by the size of the program, so matching
+takes linear time on the length of the question.
+
+Predicates are hash-consed when compiled: every ``Lemma("list")`` of every
+rule is the same predicate of the program. Before running, the program
+evaluates its predicates over the question into a ``PredicateTable``, one
+bitset per predicate, and the threads just read bits from it.
+
+The strings checked by ``Pos``, ``Lemma`` and ``Token`` predicates are
+numbered in a ``SymbolTable`` when the program is compiled. The lemmas,
+tokens and tags of a question are encoded into arrays of those numbers, so
+these predicates are evaluated comparing integers.
+
+Also, before compiling, alternations of single word predicates such as
+``Pos("NN") | Pos("NNS") | PosPrefix("VB")`` are collapsed into a single set
+membership predicate, so matching them doesn't need to split threads, and
+ambiguous repetitions like ``Star(Plus(x))`` or ``Plus(x) + Star(x)`` are
+replaced by unambiguous equivalents.
+"""
+
+from array import array
+from weakref import WeakKeyDictionary
+
+from refo import Predicate, Literal, Any, Disjunction, Concatenation, \
+    Star, Plus, Question, Group, Repetition
+from refo.match import Match as RefoMatch
+from refo.instructions import Atom, Accept, Split, Save
+
+from quepy.tagger import TaggedSentence
+from quepy.parsing import _EOL, PosPrefix
+from quepy.ruleindex import predicate_feature
+
+_ATOM, _SPLIT, _SAVE, _ACCEPT = range(4)
+_programs = WeakKeyDictionary()
+# Symbol of the strings that are not in a symbol table.
+UNKNOWN = 0
+# Max amount of strings remembered when checking prefixes.
+_PREFIX_MEMO_SIZE = 10000
+
+
+class SymbolTable(object):
+    """
+    Numbers the strings used by the predicates of a program.
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids) + 1
+
+    def add(self, string):
+        """
+        Returns the symbol of `string`, adding it if it's new.
+        """
+
+        return self._ids.setdefault(string, len(self._ids) + 1)
+
+    def encode(self, strings):
+        """
+        Returns an ``array`` with the symbol of each one of `strings`.
+        Unknown strings are encoded as ``UNKNOWN``.
+        """
+
+        get = self._ids.get
+        return array("i", [get(x, UNKNOWN) for x in strings])
+
+
+class Program(object):
+    """
+    A flat representation of compiled refo patterns.
+    Instruction `i` is described by ``ops[i]``, ``args[i]``, ``succ[i]`` and
+    ``split[i]``. The argument of an atom is the id of its predicate.
+    If `optimize` is true, patterns are simplified before being compiled.
+    """
+
+    def __init__(self, optimize=True):
+        self.optimize = optimize
+        self.ops = []
+        self.args = []
+        self.succ = []
+        self.split = []
+        # Predicate id -> comparison function
+        self.predicates = []
+        self.symbols = SymbolTable()
+        # Canonical key -> predicate id
+        self._predicate_ids = {}
+        # Word attribute -> list from symbol to the predicate ids checking
+        # for it, ids of the predicates checking for prefixes, and ids of
+        # the other kinds of predicates.
+        self._features = {}
+        self._prefixes = {}
+        self._prefix_memo = {}
+        self._feature_ids = {}
+        self._literals = []
+        self._anys = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def add(self, pattern, accept):
+        """
+        Compiles `pattern` into the program and returns the index of its
+        first instruction. The accepting instruction of the pattern will
+        carry `accept` as argument.
+        """
+
+        if self.optimize:
+            pattern = optimize(pattern)
+        nodes = dict((x.f, x) for x in _iter_predicates(pattern))
+        code = pattern.compile()
+        index = {}
+        pending = [code]
+        while pending:
+            instruction = pending.pop()
+            if instruction in index:
+                continue
+            index[instruction] = len(self.ops)
+            if isinstance(instruction, Atom):
+                function = instruction.comparison_function
+                node = nodes.get(function)
+                self._append(_ATOM, self._intern(function, node))
+            elif isinstance(instruction, Split):
+                self._append(_SPLIT, None)
+                pending.append(instruction.split)
+            elif isinstance(instruction, Save):
+                self._append(_SAVE, instruction.record)
+            else:
+                assert isinstance(instruction, Accept), "Unknown instruction"
+                self._append(_ACCEPT, accept)
+            if not isinstance(instruction, Accept):
+                pending.append(instruction.succ)
+
+        for instruction, i in index.iteritems():
+            if not isinstance(instruction, Accept):
+                self.succ[i] = index[instruction.succ]
+            if isinstance(instruction, Split):
+                self.split[i] = index[instruction.split]
+        return index[code]
+
+    def table(self, words):
+        """
+        Returns the ``PredicateTable`` of this program for `words`.
+        """
+
+        return PredicateTable(self, words)
+
+    def _append(self, op, arg):
+        self.ops.append(op)
+        self.args.append(arg)
+        self.succ.append(None)
+        self.split.append(None)
+
+    def prefixed(self, attr, value):
+        """
+        Returns the ids of the predicates that hold for a word because its
+        `attr` starts with one of their prefixes.
+        """
+
+        key = attr, value
+        try:
+            return self._prefix_memo[key]
+        except KeyError:
+            pass
+        result = tuple(i for prefixes, i in self._prefixes.get(attr, ())
+                       if value is not None and value.startswith(prefixes))
+        if len(self._prefix_memo) >= _PREFIX_MEMO_SIZE:
+            self._prefix_memo.clear()
+        self._prefix_memo[key] = result
+        return result
+
+    def feature_ids(self, attr):
+        """
+        Returns the set of ids of the predicates on the word attribute
+        `attr`.
+        """
+
+        try:
+            return self._feature_ids[attr]
+        except KeyError:
+            pass
+        ids = set(i for ids in self._features.get(attr, ()) for i in ids)
+        ids.update(i for _, i in self._prefixes.get(attr, ()))
+        self._feature_ids[attr] = frozenset(ids)
+        return self._feature_ids[attr]
+
+    def _intern(self, function, node):
+        """
+        Returns the predicate id of the atom `function`, that was compiled
+        from the pattern `node` (if known).
+        Equivalent predicates get the same id.
+        """
+
+        feature = _word_set(node)
+        if feature is not None:
+            key = feature
+        elif type(node) is Literal:
+            key = (Literal, node.x)
+        elif type(node) is Any:
+            key = Any
+        else:
+            key = function
+
+        try:
+            return self._predicate_ids[key]
+        except KeyError:
+            pass
+        except TypeError:  # Literal of something unhashable
+            key = function
+            if key in self._predicate_ids:
+                return self._predicate_ids[key]
+
+        i = len(self.predicates)
+        self.predicates.append(function)
+        self._predicate_ids[key] = i
+        if feature is not None:
+            attr, values, prefixes = feature
+            by_symbol = self._features.setdefault(attr, [])
+            self._feature_ids.pop(attr, None)
+            for value in values:
+                symbol = self.symbols.add(value)
+                by_symbol.extend([()] * (symbol + 1 - len(by_symbol)))
+                by_symbol[symbol] += (i,)
+            if prefixes:
+                self._prefixes.setdefault(attr, []).append((prefixes, i))
+                self._prefix_memo.clear()
+        elif key is Any:
+            self._anys.append(i)
+        elif key is not function:
+            self._literals.append(i)
+        return i
+
+
+class PredicateTable(object):
+    """
+    The value of every predicate of a program on every word of a question,
+    plus the end of line mark at the last position.
+    ``rows[i]`` is a bitset (an int) with the positions where predicate `i`
+    holds, or ``None`` if it was not evaluated yet.
+    ``codes`` has the encoded question: the symbols of each word attribute
+    used by the program.
+    The words aren't copied, the attributes of a `TaggedSentence` are read
+    from its columns. If its lemmas are found lazily, the predicates on
+    lemmas are left in `lazy` and only evaluated on the words asked for
+    with `holds`, so the other words are never lemmatized.
+    """
+
+    def __init__(self, program, words):
+        self.program = program
+        self.words = words
+        # The words and the end of line mark
+        self.size = len(words) + 1
+        self.predicates = program.predicates
+        self.rows = [None] * len(self.predicates)
+        self.codes = {}
+        self.lazy = frozenset()
+        # Positions where the lazy predicates were evaluated, and the bits
+        # set on them
+        self._known = 0
+        self._partial = {}
+
+        everything = (1 << self.size) - 1
+        for i in program._anys:
+            self.rows[i] = everything
+        for attr, by_symbol in program._features.iteritems():
+            if attr == u"lemma" and isinstance(words, TaggedSentence) and \
+                    not words.lemmatized():
+                self.lazy = program.feature_ids(attr)
+                continue
+            for ids in by_symbol:
+                for i in ids:
+                    self.rows[i] = 0
+            for _, i in program._prefixes.get(attr, ()):
+                self.rows[i] = 0
+            if isinstance(words, TaggedSentence):
+                values = words.column(attr)
+            else:
+                values = [getattr(word, attr) for word in words]
+            codes = program.symbols.encode(values)
+            self.codes[attr] = codes
+            size = len(by_symbol)
+            for position, code in enumerate(codes):
+                if code < size:
+                    for i in by_symbol[code]:
+                        self.rows[i] |= 1 << position
+            if attr in program._prefixes:
+                for position, value in enumerate(values):
+                    for i in program.prefixed(attr, value):
+                        self.rows[i] |= 1 << position
+        for i in program._literals:
+            self.row(i)
+
+    def row(self, i):
+        """
+        Returns the bitset of predicate `i`, evaluating it if needed.
+        """
+
+        row = self.rows[i]
+        if row is None:
+            row = 0
+            predicate = self.predicates[i]
+            for position, word in enumerate(self.words):
+                if predicate(word):
+                    row |= 1 << position
+            if predicate(_EOL):
+                row |= 1 << (self.size - 1)
+            self.rows[i] = row
+        return row
+
+    def holds(self, i, position):
+        """
+        Returns whether predicate `i` holds at `position`.
+        """
+
+        if i in self.lazy:
+            if not self._known >> position & 1:
+                self._evaluate_lemma(position)
+            return self._partial.get(i, 0) >> position & 1
+        return self.row(i) >> position & 1
+
+    def _evaluate_lemma(self, position):
+        # Sets the bits of the lazy predicates at `position`
+        self._known |= 1 << position
+        if position == self.size - 1:
+            return
+        lemma = self.words.lemma(position)
+        by_symbol = self.program._features[u"lemma"]
+        code = self.program.symbols.encode([lemma])[0]
+        ids = by_symbol[code] if code < len(by_symbol) else ()
+        partial = self._partial
+        for i in ids + self.program.prefixed(u"lemma", lemma):
+            partial[i] = partial.get(i, 0) | 1 << position
+
+
+class RuleMatcher(object):
+    """
+    Matches the regexes of many rules in a single pass over the words.
+    """
+
+    def __init__(self, rules, optimize=True):
+        """
+        Compiles `rules`, which is expected to be sorted in weight order.
+        """
+
+        self.rules = list(rules)
+        self._program = Program(optimize)
+        self._starts = {}
+        for i, rule in enumerate(self.rules):
+            pattern = Group(rule.regex + Literal(_EOL), None)
+            self._starts[rule] = self._program.add(pattern, i)
+
+    def match(self, words, rules=None):
+        """
+        Returns a list of ``(rule, match)`` pairs, one for each rule
+        (of `rules`, or all of them if it's ``None``) whose regex matches
+        `words`, in the order given by `rules`.
+        `match` is a ``refo`` match object.
+        """
+
+        if rules is None:
+            rules = self.rules
+        starts = [self._starts[rule] for rule in rules]
+        accepted = run(self._program, starts, words)
+        return [(self.rules[i], RefoMatch(state)) for i, state in accepted]
+
+
+def match(regex, words):
+    """
+    Matches `regex` against the whole list of `words`. It's a drop-in
+    replacement for ``refo.match(regex + Literal(_EOL), words + [_EOL])``
+    that keeps the compiled regex for the next time.
+    Returns a ``refo`` match object or ``None``.
+    """
+
+    try:
+        program, start = _programs[regex]
+    except KeyError:
+        program = Program()
+        start = program.add(Group(regex + Literal(_EOL), None), None)
+        _programs[regex] = program, start
+
+    for _, state in run(program, [start], words):
+        return RefoMatch(state)
+    return None
+
+
+def run(program, starts, words):
+    """
+    Runs `program` from the instructions `starts` over `words` followed by
+    the end of line mark.
+    Returns a list of ``(accept, state)`` for every accepting instruction
+    reached, ordered by thread priority. `state` is a dictionary of saved
+    positions like the one of a ``refo`` match.
+    """
+
+    ops, args, succ = program.ops, program.args, program.succ
+    marks = [-1] * len(ops)
+    threads = _closure(program, marks, [(pc, None) for pc in starts], 0)
+    table = program.table(words)
+    rows = table.rows
+
+    for position in xrange(table.size):
+        if not threads:
+            break
+        alive = []
+        for pc, captures in threads:
+            if ops[pc] != _ATOM:
+                continue
+            row = rows[args[pc]]
+            if row is None:
+                matched = table.holds(args[pc], position)
+            else:
+                matched = row >> position & 1
+            if matched:
+                alive.append((succ[pc], captures))
+        threads = _closure(program, marks, alive, position + 1)
+
+    result = []
+    seen = set()
+    for pc, captures in threads:
+        if ops[pc] == _ACCEPT and args[pc] not in seen:
+            seen.add(args[pc])
+            result.append((args[pc], _state(captures)))
+    return result
+
+
+def _closure(program, marks, threads, position):
+    """
+    Follows the epsilon transitions of `threads` (a list of
+    ``(pc, captures)`` in priority order) at `position` and returns the
+    resulting threads, all of them waiting on an atom or accepting.
+    Instructions already visited at `position` are not visited again, this
+    keeps the amount of threads bounded by the size of the program.
+    """
+
+    ops, args, succ, split = program.ops, program.args, program.succ, \
+        program.split
+    result = []
+    stack = list(reversed(threads))
+    while stack:
+        pc, captures = stack.pop()
+        if marks[pc] == position:
+            continue
+        marks[pc] = position
+        op = ops[pc]
+        if op == _SPLIT:
+            stack.append((split[pc], captures))
+            stack.append((succ[pc], captures))
+        elif op == _SAVE:
+            stack.append((succ[pc], (args[pc], position, captures)))
+        else:
+            result.append((pc, captures))
+    return result
+
+
+def _state(captures):
+    state = {}
+    while captures is not None:
+        record, position, captures = captures
+        state.setdefault(record, position)
+    return state
+
+
+class WordSet(Predicate):
+    """
+    Predicate to check if the attribute `attr` of a word is one of `values`
+    or starts with one of `prefixes`.
+    """
+
+    def __init__(self, attr, values=(), prefixes=()):
+        self.attr = attr
+        self.values = frozenset(values)
+        self.prefixes = tuple(sorted(set(prefixes)))
+        super(WordSet, self).__init__(self._predicate)
+        self.arg = (attr, sorted(self.values), self.prefixes)
+
+    def _predicate(self, word):
+        if word is _EOL:
+            return False
+        value = getattr(word, self.attr)
+        return value in self.values or \
+            (value is not None and value.startswith(self.prefixes))
+
+
+def _word_set(predicate):
+    """
+    Returns the ``(attr, values, prefixes)`` that `predicate` checks for or
+    ``None`` if it's not a predicate on a word attribute.
+    """
+
+    feature = predicate_feature(predicate)
+    if feature is not None:
+        attr, value = feature
+        return attr, frozenset([value]), ()
+    if type(predicate) is PosPrefix:
+        return u"pos", frozenset(), (predicate.tag,)
+    if type(predicate) is WordSet:
+        return predicate.attr, predicate.values, predicate.prefixes
+    return None
+
+
+def collapse_disjunctions(pattern):
+    """
+    Returns a pattern equivalent to `pattern` where alternations of single
+    word predicates on the same word attribute are replaced by a single
+    ``WordSet`` predicate.
+    `pattern` is not modified.
+    """
+
+    if isinstance(pattern, Disjunction):
+        alternatives = _iter_alternatives(pattern)
+        if all(isinstance(x, Predicate) for x in alternatives):
+            # All the alternatives consume exactly one word and capture
+            # nothing, so their order doesn't change the match.
+            return _merge_predicates(alternatives)
+        a = collapse_disjunctions(pattern.a)
+        b = collapse_disjunctions(pattern.b)
+        if a is pattern.a and b is pattern.b:
+            return pattern
+        return Disjunction(a, b)
+    if isinstance(pattern, Concatenation):
+        xs = [collapse_disjunctions(x) for x in pattern.xs]
+        if all(x is y for x, y in zip(xs, pattern.xs)):
+            return pattern
+        return Concatenation(*xs)
+    if not isinstance(pattern, (Star, Plus, Question, Group, Repetition)):
+        return pattern
+    x = collapse_disjunctions(pattern.x)
+    if x is pattern.x:
+        return pattern
+    if isinstance(pattern, Group):
+        return Group(x, pattern.key)
+    if isinstance(pattern, Repetition):
+        return Repetition(x, pattern.mn, pattern.mx, pattern.greedy)
+    return type(pattern)(x, pattern.greedy)
+
+
+def _iter_alternatives(pattern):
+    if isinstance(pattern, Disjunction):
+        return _iter_alternatives(pattern.a) + _iter_alternatives(pattern.b)
+    return [pattern]
+
+
+def _merge_predicates(predicates):
+    merged = []
+    positions = {}
+    for predicate in predicates:
+        word_set = _word_set(predicate)
+        if word_set is None:
+            merged.append(predicate)
+            continue
+        attr, values, prefixes = word_set
+        if attr not in positions:
+            positions[attr] = len(merged)
+            merged.append((attr, set(), set()))
+        merged[positions[attr]][1].update(values)
+        merged[positions[attr]][2].update(prefixes)
+
+    result = None
+    for x in merged:
+        if isinstance(x, tuple):
+            x = WordSet(*x)
+        result = x if result is None else Disjunction(result, x)
+    return result
+
+
+def simplify_repetitions(pattern):
+    """
+    Returns a pattern equivalent to `pattern` where nested repetitions, like
+    ``Star(Plus(x))``, and adjacent repetitions of the same pattern, like
+    ``Plus(x) + Star(x)``, are replaced by a single repetition.
+    Repetitions are only simplified if they capture no groups and have the
+    same greediness.
+    `pattern` is not modified.
+    """
+
+    if isinstance(pattern, Concatenation):
+        xs = _merge_adjacent([simplify_repetitions(x) for x in pattern.xs])
+        if len(xs) == len(pattern.xs) and \
+                all(x is y for x, y in zip(xs, pattern.xs)):
+            return pattern
+        if len(xs) == 1:
+            return xs[0]
+        return Concatenation(*xs)
+    if isinstance(pattern, Disjunction):
+        a = simplify_repetitions(pattern.a)
+        b = simplify_repetitions(pattern.b)
+        if a is pattern.a and b is pattern.b:
+            return pattern
+        return Disjunction(a, b)
+    if not isinstance(pattern, (Star, Plus, Question, Group, Repetition)):
+        return pattern
+
+    x = simplify_repetitions(pattern.x)
+    if isinstance(pattern, (Star, Plus, Question)) and \
+            isinstance(x, (Star, Plus, Question)) and \
+            x.greedy == pattern.greedy and not has_groups(x.x):
+        kinds = type(pattern), type(x)
+        if kinds == (Plus, Plus):
+            return Plus(x.x, pattern.greedy)
+        if kinds == (Question, Question):
+            return Question(x.x, pattern.greedy)
+        return Star(x.x, pattern.greedy)
+    if x is pattern.x:
+        return pattern
+    if isinstance(pattern, Group):
+        return Group(x, pattern.key)
+    if isinstance(pattern, Repetition):
+        return Repetition(x, pattern.mn, pattern.mx, pattern.greedy)
+    return type(pattern)(x, pattern.greedy)
+
+
+def optimize(pattern):
+    """
+    Returns `pattern` simplified by all the rewrites of this module.
+    """
+
+    return simplify_repetitions(collapse_disjunctions(pattern))
+
+
+def has_groups(pattern):
+    """
+    Returns True if `pattern` captures some group.
+    """
+
+    pending = [pattern]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, Group):
+            return True
+        pending.extend(_children(node))
+    return False
+
+
+def _merge_adjacent(xs):
+    result = []
+    for x in xs:
+        last = result[-1] if result else None
+        if not isinstance(last, (Star, Plus)) or \
+                not isinstance(x, (Star, Plus)) or \
+                last.greedy != x.greedy or has_groups(x.x) or \
+                _key(last.x) != _key(x.x):
+            result.append(x)
+            continue
+        result.pop()
+        if isinstance(last, Star) and isinstance(x, Star):
+            result.append(last)
+        elif isinstance(last, Plus) and isinstance(x, Plus):
+            result.append(last.x)
+            result.append(last)
+        else:
+            result.append(Plus(last.x, last.greedy))
+    return result
+
+
+def _key(pattern):
+    """
+    Returns a value that is equal for structurally equal patterns.
+    """
+
+    word_set = _word_set(pattern)
+    if word_set is not None:
+        return word_set
+    if type(pattern) is Literal:
+        return Literal, pattern.x
+    if type(pattern) is Any:
+        return Any
+    if isinstance(pattern, Predicate):
+        return pattern.f
+    if isinstance(pattern, (Star, Plus, Question)):
+        return type(pattern), pattern.greedy, _key(pattern.x)
+    if isinstance(pattern, Repetition):
+        return Repetition, pattern.mn, pattern.mx, pattern.greedy, \
+            _key(pattern.x)
+    if isinstance(pattern, (Concatenation, Disjunction)):
+        return (type(pattern),) + tuple(_key(x) for x in _children(pattern))
+    return pattern
+
+
+def _children(pattern):
+    if isinstance(pattern, Concatenation):
+        return pattern.xs
+    if isinstance(pattern, Disjunction):
+        return [pattern.a, pattern.b]
+    if isinstance(pattern, (Star, Plus, Question, Group, Repetition)):
+        return [pattern.x]
+    return []
+
+
+def _iter_predicates(pattern):
+    """
+    Iterates over the ``Predicate`` nodes of `pattern`.
+    """
+
+    pending = [pattern]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, Predicate):
+            yield node
+        pending.extend(_children(node))
@@ -15,67 +15,395 @@ Tagging using NLTK.
 #   - "averaged_perceptron_tagger" in Models
 #   - "wordnet" in Corpora
 
+import os
+import re
+import json
+import codecs
+import hashlib
+import cPickle as pickle
+from threading import Lock
+
 import nltk
-from quepy.tagger import Word
+from nltk.corpus.reader.wordnet import WordNetCorpusReader, NOUN, ADJ, \
+    VERB, ADV
+from nltk.tag.perceptron import PerceptronTagger, PICKLE
+from refo.patterns import Pattern
+from quepy.tagger import TaggedSentence
+from quepy.cache import LRUCache
+from quepy.parsing import Lemma, Token
+from quepy.lemmatable import LemmaTable, write_lemma_table
+from quepy.taggermodel import TaggerModel, write_tagger_model
 from quepy.encodingpolicy import assert_valid_encoding
 
-_penn_to_morphy_tag = {}
+_penn_to_morphy_tag = (
+    (u"NN", NOUN),
+    (u"JJ", ADJ),
+    (u"VB", VERB),
+    (u"RB", ADV),
+)
+_perceptron_resource = u"taggers/averaged_perceptron_tagger/" + PICKLE
+_data_resources = [u"taggers/averaged_perceptron_tagger", u"corpora/wordnet"]
+_taggers = {}
+_taggers_lock = Lock()
 
 
 def penn_to_morphy_tag(tag):
     assert_valid_encoding(tag)
 
-    for penn, morphy in _penn_to_morphy_tag.iteritems():
+    for penn, morphy in _penn_to_morphy_tag:
         if tag.startswith(penn):
             return morphy
     return None
 
 
-def run_nltktagger(string, nltk_data_path=None):
+def data_version(nltk_data_path=None, tagger_model_path=None):
     """
-    Runs nltk tagger on `string` and returns a list of
-    :class:`quepy.tagger.Word` objects.
+    Returns a string that identifies the NLTK version and the data files
+    used by the tagger, found in `nltk_data_path` or NLTK's default paths,
+    and the model in `tagger_model_path`, if given.
     """
-    assert_valid_encoding(string)
-    global _penn_to_morphy_tag
-
-    if nltk_data_path:
-        nltk.data.path = nltk_data_path
-
-    from nltk.corpus import wordnet
-
-    if not _penn_to_morphy_tag:
-        _penn_to_morphy_tag = {
-            u'NN': wordnet.NOUN,
-            u'JJ': wordnet.ADJ,
-            u'VB': wordnet.VERB,
-            u'RB': wordnet.ADV,
-        }
-
-    # Recommended tokenizer doesn't handle non-ascii characters very well
-    #tokens = nltk.word_tokenize(string)
-    tokens = nltk.wordpunct_tokenize(string)
-    tags = nltk.pos_tag(tokens)
-
-    words = []
-    for token, pos in tags:
-        word = Word(token)
-        # Eliminates stuff like JJ|CC
-        # decode ascii because they are the penn-like POS tags (are ascii).
-        word.pos = pos.split("|")[0].decode("ascii")
-
-        mtag = penn_to_morphy_tag(word.pos)
+
+    digest = hashlib.md5(nltk.__version__)
+    for resource in _data_resources:
+        try:
+            pointer = nltk.data.find(resource, paths=nltk_data_path or None)
+        except LookupError:
+            digest.update("missing")
+            continue
+        path = getattr(pointer, "path", None)
+        if path is None:
+            path = pointer.zipfile.filename
+        for filename in _iter_files(path):
+            stat = os.stat(filename)
+            digest.update(repr((filename, stat.st_size, stat.st_mtime)))
+    if tagger_model_path is not None:
+        stat = os.stat(tagger_model_path)
+        digest.update(repr((tagger_model_path, stat.st_size, stat.st_mtime)))
+
+    return u"{0}-{1}".format(nltk.__version__, digest.hexdigest())
+
+
+def _iter_files(path):
+    if not os.path.isdir(path):
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            yield os.path.join(dirpath, filename)
+
+
+class Tagger(object):
+    """
+    NLTK tagger that uses the data files in `nltk_data_path` (or NLTK's
+    default paths).
+
+    The perceptron model and WordNet are loaded once, the first time they
+    are needed, and never modified after that, so a tagger can be shared
+    by many threads. It doesn't change NLTK's global configuration.
+
+    The lemmas of the last `lemma_cache_size` different words are kept in
+    the `lemmas` cache (``None`` if the size is 0). The cache can be saved
+    with `dump_lemmas` and filled with `load_lemmas`, WordNet isn't loaded
+    while the lemmas are found there.
+    The lemmas are also looked up in the `lemma_table` in the file
+    `lemma_table_path` (see `build_lemma_table`), if given.
+    The perceptron model is read from the file `tagger_model_path` (see
+    `build_tagger_model`), if given, instead of unpickling NLTK's.
+    """
+
+    def __init__(self, nltk_data_path=None, lemma_cache_size=0,
+                 lemma_table_path=None, tagger_model_path=None):
+        self.nltk_data_path = list(nltk_data_path or [])
+        self.lemmas = None
+        if lemma_cache_size:
+            self.lemmas = LRUCache(lemma_cache_size)
+        self.lemma_table = None
+        if lemma_table_path is not None:
+            self.lemma_table = LemmaTable(lemma_table_path)
+        self.tagger_model_path = tagger_model_path
+        self._perceptron = None
+        self._wordnet = None
+        self._lock = Lock()
+
+    def tag(self, string):
+        """
+        Returns the :class:`quepy.tagger.TaggedSentence` of `string`.
+        """
+
+        assert_valid_encoding(string)
+        return self.tag_batch([string])[0]
+
+    def tag_batch(self, strings):
+        """
+        Returns a list with the :class:`quepy.tagger.TaggedSentence` of each
+        one of `strings`. Words are lemmatized lazily, the first time their
+        lemma is asked for, and every different word is lemmatized once.
+        """
+
+        for string in strings:
+            assert_valid_encoding(string)
+
+        # Recommended tokenizer doesn't handle non-ascii characters very well
+        #tokens = nltk.word_tokenize(string)
+        sentences = [nltk.wordpunct_tokenize(string) for string in strings]
+
+        lemmatize = self.lemmatize
+        if self.lemmas is None:
+            # Lemmatize every different word once anyway
+            lemmatize = _memoize(self.lemmatize)
+
+        def lemmatize_pos(token, pos):
+            return lemmatize(token, penn_to_morphy_tag(pos))
+
+        result = []
+        for tagged in self._tag_sentences(sentences):
+            tokens, tags = [], []
+            for token, pos in tagged:
+                # Eliminates stuff like JJ|CC
+                # decode ascii because they are the penn-like POS tags
+                # (are ascii).
+                tokens.append(token)
+                tags.append(pos.split("|")[0].decode("ascii"))
+            result.append(TaggedSentence(tokens, tags=tags,
+                                         lemmatize=lemmatize_pos))
+
+        return result
+
+    def _tag_sentences(self, sentences):
+        # Lists of (token, tag) of each list of tokens in `sentences`
+        perceptron = self._load_perceptron()
+        return [perceptron.tag(sentence) for sentence in sentences]
+
+    def lemmatize(self, token, mtag):
+        """
+        Returns the lemma of `token` as a word of the morphy tag `mtag`.
+        """
+
+        # Morphy is case sensitive, so the key is the token as is
+        key = token, mtag
+        if self.lemmas is not None:
+            lemma = self.lemmas.get(key)
+            if lemma is not None:
+                return lemma
+
+        lemma = None
+        if self.lemma_table is not None:
+            lemma = self.lemma_table.get(token, mtag)
+        if lemma is None:
+            lemma = self._morphy(token, mtag)
+        if self.lemmas is not None:
+            self.lemmas[key] = lemma
+        return lemma
+
+    def build_lemma_table(self, path, words=()):
+        """
+        Writes to `path` a lemma table with the lemmas of the words in
+        WordNet's exception lists and the lemmas of `words`, and their
+        lowercase forms, with every morphy tag used.
+        Returns the amount of lemmas written.
+        """
+
+        mtags = [None] + [morphy for _, morphy in _penn_to_morphy_tag]
+        keys = set()
+        for mtag, exceptions in self._load_wordnet()._exception_map.items():
+            if mtag in mtags:
+                keys.update((form, mtag) for form in exceptions)
+        for word in words:
+            for token in set([word, word.lower()]):
+                keys.update((token, mtag) for mtag in mtags)
+
+        entries = ((token, mtag, self._morphy(token, mtag))
+                   for token, mtag in keys)
+        return write_lemma_table(path, entries)
+
+    def build_tagger_model(self, path):
+        """
+        Writes NLTK's perceptron model to `path` as a `TaggerModel`.
+        """
+
+        write_tagger_model(path, *self._unpickle_perceptron())
+
+    def _morphy(self, token, mtag):
         # Nice shooting, son. What's your name?
-        lemma = wordnet.morphy(word.token, pos=mtag)
+        lemma = self._load_wordnet().morphy(token, pos=mtag)
         if isinstance(lemma, str):
-            # In this case lemma is example-based, because if it's rule based
-            # the result should be unicode (input was unicode).
+            # In this case lemma is example-based, because if it's rule
+            # based the result should be unicode (input was unicode).
             # Since english is ascii the decoding is ok.
             lemma = lemma.decode("ascii")
-        word.lemma = lemma
-        if word.lemma is None:
-            word.lemma = word.token.lower()
+        if lemma is None:
+            lemma = token.lower()
+        return lemma
+
+    def lemma_stats(self):
+        """
+        Returns the counters of the lemma cache, with its hit rate.
+        """
+
+        if self.lemmas is None:
+            return {}
+        stats = self.lemmas.stats()
+        lookups = stats[u"hits"] + stats[u"misses"]
+        stats[u"hit_rate"] = float(stats[u"hits"]) / lookups if lookups else 0
+        return stats
+
+    def load_lemmas(self, path):
+        """
+        Adds the lemmas saved with `dump_lemmas` in the file `path` to the
+        lemma cache. Returns the amount of lemmas loaded.
+        """
 
-        words.append(word)
+        if self.lemmas is None:
+            return 0
+        with codecs.open(path, encoding="utf-8") as lemmas_file:
+            entries = json.load(lemmas_file)
+        for token, mtag, lemma in entries:
+            self.lemmas[token, mtag] = lemma
+        return len(entries)
 
+    def dump_lemmas(self, path):
+        """
+        Saves the lemmas of the lemma cache in the file `path`.
+        """
+
+        entries = []
+        if self.lemmas is not None:
+            entries = [(token, mtag, lemma)
+                       for (token, mtag), lemma in self.lemmas.items()]
+        with codecs.open(path, "w", encoding="utf-8") as lemmas_file:
+            json.dump(entries, lemmas_file, ensure_ascii=False)
+
+    def load(self):
+        """
+        Loads the perceptron model and WordNet, if not loaded yet.
+        """
+
+        self._load_perceptron()
+        self._load_wordnet()
+
+    def _load_perceptron(self):
+        if self._perceptron is None:
+            with self._lock:
+                if self._perceptron is None:
+                    perceptron = PerceptronTagger(load=False)
+                    if self.tagger_model_path is None:
+                        weights, tagdict, classes = self._unpickle_perceptron()
+                        perceptron.model.weights = weights
+                    else:
+                        perceptron.model = TaggerModel(self.tagger_model_path)
+                        tagdict = perceptron.model.tagdict
+                        classes = set(perceptron.model.classes)
+                    perceptron.model.classes = perceptron.classes = classes
+                    perceptron.tagdict = tagdict
+                    self._perceptron = perceptron
+        return self._perceptron
+
+    def _unpickle_perceptron(self):
+        pointer = nltk.data.find(_perceptron_resource,
+                                 paths=self.nltk_data_path or None)
+        with pointer.open() as model_file:
+            return pickle.load(model_file)
+
+    def _load_wordnet(self):
+        if self._wordnet is None:
+            with self._lock:
+                if self._wordnet is None:
+                    pointer = nltk.data.find(u"corpora/wordnet",
+                                             paths=self.nltk_data_path or None)
+                    self._wordnet = WordNetCorpusReader(pointer, None)
+        return self._wordnet
+
+
+def app_words(rules):
+    """
+    Returns the set of words relevant to an application with `rules`: the
+    ones checked by their `Lemma` and `Token` predicates and the words of
+    the example questions (quoted) in their docstrings.
+    """
+
+    words = set()
+    for rule in rules:
+        pending = [rule.regex]
+        while pending:
+            regex = pending.pop()
+            if type(regex) in (Lemma, Token):
+                words.add(regex.tag)
+            children = [getattr(regex, attr, None)
+                        for attr in (u"x", u"a", u"b")]
+            children.extend(getattr(regex, u"xs", ()))
+            pending.extend(x for x in children if isinstance(x, Pattern))
+
+        for example in re.findall('"(.*?)"', rule.__doc__ or ""):
+            if isinstance(example, str):
+                example = example.decode("utf-8")
+            words.update(nltk.wordpunct_tokenize(example))
     return words
+
+
+def _memoize(function):
+    results = {}
+
+    def wrapper(*args):
+        if args not in results:
+            results[args] = function(*args)
+        return results[args]
+    return wrapper
+
+
+def get_nltk_tagger(nltk_data_path=None, lemma_cache_size=0,
+                    lemma_cache_path=None, lemma_table_path=None,
+                    tagger_model_path=None):
+    """
+    Returns the `Tagger` for `nltk_data_path` with a lemma cache of
+    `lemma_cache_size` entries, the lemma table in `lemma_table_path` and
+    the model in `tagger_model_path`, shared by all its users.
+    When it's created its lemma cache is filled from the file
+    `lemma_cache_path`, if given and it exists.
+    """
+
+    key = (tuple(nltk_data_path or []), lemma_cache_size, lemma_cache_path,
+           lemma_table_path, tagger_model_path)
+    with _taggers_lock:
+        if key not in _taggers:
+            tagger = Tagger(key[0], lemma_cache_size, lemma_table_path,
+                            tagger_model_path)
+            if lemma_cache_path is not None and \
+                    os.path.exists(lemma_cache_path):
+                tagger.load_lemmas(lemma_cache_path)
+            _taggers[key] = tagger
+        return _taggers[key]
+
+
+def make_batch_tagger(app_settings):
+    """
+    Tagger backend factory, see `quepy.tagger.register_tagger`.
+    """
+
+    nltk_data_path = app_settings.NLTK_DATA_PATH
+    model_path = app_settings.TAGGER_MODEL_PATH
+    tagger = get_nltk_tagger(nltk_data_path,
+                             app_settings.LEMMA_CACHE_SIZE,
+                             app_settings.LEMMA_CACHE_PATH,
+                             app_settings.LEMMA_TABLE_PATH, model_path)
+    return tagger.tag_batch, data_version(nltk_data_path, model_path)
+
+
+def run_nltktagger(string, nltk_data_path=None):
+    """
+    Runs nltk tagger on `string` and returns a
+    :class:`quepy.tagger.TaggedSentence`, a sequence of
+    :class:`quepy.tagger.Word` objects.
+    """
+    assert_valid_encoding(string)
+    return get_nltk_tagger(nltk_data_path).tag(string)
+
+
+def run_nltktagger_batch(strings, nltk_data_path=None):
+    """
+    Runs nltk tagger on every string of `strings` at once and returns a list
+    with the :class:`quepy.tagger.TaggedSentence` of each one.
+    It's faster than tagging them one by one, because every different word
+    is lemmatized once.
+    """
+    return get_nltk_tagger(nltk_data_path).tag_batch(strings)
@@ -0,0 +1,221 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+NLTK's averaged perceptron tagger scored with NumPy, for large batches.
+
+The weights of the perceptron are loaded in a matrix with a row for each
+feature. The features that depend only on the words are scored for every
+word of the batch at once, and the ones that depend on the previous tags
+position by position, for all the sentences at the same time.
+The tags are the same ones of `nltk.pos_tag`: when the two best scores are
+too close to be sure floating point rounding didn't change the winner, the
+word is scored by NLTK.
+It needs NumPy (``pip install quepy[numpy]``).
+"""
+
+import os
+from threading import Lock
+
+import numpy
+
+from quepy.nltktagger import Tagger, data_version
+
+# Smallest difference between the two best scores that's decided here
+_TIE = 1e-6
+_taggers = {}
+_taggers_lock = Lock()
+
+
+class PerceptronMatrix(object):
+    """
+    The weights of the NLTK `perceptron` (a ``PerceptronTagger``) as a
+    matrix.
+    """
+
+    def __init__(self, perceptron):
+        self.perceptron = perceptron
+        self.tagdict = perceptron.tagdict
+        # In reverse order, so the first best score is the best label of
+        # NLTK's alphabetic tie break
+        self.classes = sorted(perceptron.classes, reverse=True)
+        columns = dict((label, i) for i, label in enumerate(self.classes))
+
+        weights = perceptron.model.weights
+        self.features = {}
+        # The last row is for the features without weights
+        self.weights = numpy.zeros((len(weights) + 1, len(self.classes)))
+        for row, (feature, label_weights) in enumerate(weights.iteritems()):
+            self.features[feature] = row
+            for label, weight in label_weights.iteritems():
+                self.weights[row, columns[label]] = weight
+
+    def tag(self, sentences):
+        """
+        Returns the lists of (token, tag) of each list of tokens in
+        `sentences`.
+        """
+
+        normalize = self.perceptron.normalize
+        contexts = []
+        tags = []
+        pending = []
+        for k, sentence in enumerate(sentences):
+            contexts.append(self.perceptron.START +
+                            [normalize(x) for x in sentence] +
+                            self.perceptron.END)
+            tags.append([self.tagdict.get(x) for x in sentence])
+            pending.extend((i, k) for i, tag in enumerate(tags[k])
+                           if not tag)
+
+        if pending:
+            # Sorted by position, the tags of a position are needed by the
+            # next ones
+            pending.sort()
+            rows = [self._word_features(sentences[k][i], contexts[k], i)
+                    for i, k in pending]
+            word_scores = self._scores(rows)
+
+            start = 0
+            while start < len(pending):
+                i = pending[start][0]
+                end = start
+                while end < len(pending) and pending[end][0] == i:
+                    end += 1
+                self._tag_position(pending[start:end],
+                                   word_scores[start:end], sentences,
+                                   contexts, tags)
+                start = end
+
+        return [zip(sentence, tags[k]) for k, sentence in enumerate(sentences)]
+
+    def _tag_position(self, pending, word_scores, sentences, contexts, tags):
+        previous = []
+        rows = []
+        for i, k in pending:
+            # The previous tags, as NLTK starts with prev, prev2 = START
+            history = self.perceptron.START[::-1] + tags[k][:i]
+            prev, prev2 = history[i + 1], history[i]
+            previous.append((prev, prev2))
+            rows.append(self._tag_features(prev, prev2, contexts[k], i))
+
+        scores = word_scores + self._scores(rows)
+        best = scores.argmax(axis=1)
+        if scores.shape[1] > 1:
+            top = numpy.partition(scores, -2, axis=1)
+            gaps = top[:, -1] - top[:, -2]
+        else:
+            gaps = numpy.ones(len(pending))
+
+        for n, (i, k) in enumerate(pending):
+            if gaps[n] >= _TIE:
+                tags[k][i] = self.classes[best[n]]
+            else:
+                prev, prev2 = previous[n]
+                features = self.perceptron._get_features(
+                    i, sentences[k][i], contexts[k], prev, prev2)
+                tags[k][i] = self.perceptron.model.predict(features)[0]
+
+    def _word_features(self, word, context, i):
+        # The features of nltk.tag.perceptron that don't depend on tags
+        i += len(self.perceptron.START)
+        return self._rows([
+            u"bias",
+            u"i suffix " + word[-3:],
+            u"i pref1 " + word[0],
+            u"i word " + context[i],
+            u"i-1 word " + context[i - 1],
+            u"i-1 suffix " + context[i - 1][-3:],
+            u"i-2 word " + context[i - 2],
+            u"i+1 word " + context[i + 1],
+            u"i+1 suffix " + context[i + 1][-3:],
+            u"i+2 word " + context[i + 2],
+        ])
+
+    def _tag_features(self, prev, prev2, context, i):
+        i += len(self.perceptron.START)
+        return self._rows([
+            u"i-1 tag " + prev,
+            u"i-2 tag " + prev2,
+            u"i tag+i-2 tag " + prev + u" " + prev2,
+            u"i-1 tag+i word " + prev + u" " + context[i],
+        ])
+
+    def _scores(self, rows):
+        # Sums the weights of the features in each list of `rows`, a column
+        # at a time to not make a copy of the weights of every feature
+        rows = numpy.array(rows)
+        scores = self.weights[rows[:, 0]]
+        for column in xrange(1, rows.shape[1]):
+            scores += self.weights[rows[:, column]]
+        return scores
+
+    def _rows(self, features):
+        missing = len(self.features)
+        return [self.features.get(x, missing) for x in features]
+
+
+class NumpyTagger(Tagger):
+    """
+    `quepy.nltktagger.Tagger` that tags with a `PerceptronMatrix`, loaded
+    the first time it's needed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(NumpyTagger, self).__init__(*args, **kwargs)
+        self._matrix = None
+
+    def load(self):
+        super(NumpyTagger, self).load()
+        self._load_matrix()
+
+    def _tag_sentences(self, sentences):
+        return self._load_matrix().tag(sentences)
+
+    def _load_matrix(self):
+        if self._matrix is None:
+            perceptron = self._load_perceptron()
+            with self._lock:
+                if self._matrix is None:
+                    self._matrix = PerceptronMatrix(perceptron)
+        return self._matrix
+
+
+def get_numpy_tagger(nltk_data_path=None, lemma_cache_size=0,
+                     lemma_cache_path=None, lemma_table_path=None,
+                     tagger_model_path=None):
+    """
+    Like `quepy.nltktagger.get_nltk_tagger`, for a `NumpyTagger`.
+    """
+
+    key = (tuple(nltk_data_path or []), lemma_cache_size, lemma_cache_path,
+           lemma_table_path, tagger_model_path)
+    with _taggers_lock:
+        if key not in _taggers:
+            tagger = NumpyTagger(key[0], lemma_cache_size, lemma_table_path,
+                                 tagger_model_path)
+            if lemma_cache_path is not None and \
+                    os.path.exists(lemma_cache_path):
+                tagger.load_lemmas(lemma_cache_path)
+            _taggers[key] = tagger
+        return _taggers[key]
+
+
+def make_batch_tagger(app_settings):
+    """
+    Tagger backend factory, see `quepy.tagger.register_tagger`.
+    """
+
+    nltk_data_path = app_settings.NLTK_DATA_PATH
+    model_path = app_settings.TAGGER_MODEL_PATH
+    tagger = get_numpy_tagger(nltk_data_path,
+                              app_settings.LEMMA_CACHE_SIZE,
+                              app_settings.LEMMA_CACHE_PATH,
+                              app_settings.LEMMA_TABLE_PATH, model_path)
+    return tagger.tag_batch, data_version(nltk_data_path, model_path)
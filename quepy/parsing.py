@@ -7,10 +7,13 @@
 # Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
 #          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
 
-import refo
 import logging
-from refo import Predicate, Literal, Star, Any, Group
+from copy import copy
+from collections import Sequence
+from refo import Predicate, Star, Any, Group
 
+from quepy.tagger import TaggedSentence
+from quepy.expression import Expression
 from quepy.encodingpolicy import encoding_flexible_conversion
 
 _EOL = None
@@ -23,31 +26,87 @@ class BadSemantic(Exception):
     """
 
 
-class WordList(list):
+class WordList(Sequence):
     """
     A list of words with some utils for the user.
+    It's a view of the words of `words` from `start` to `end`, they are not
+    copied. Slicing it gives another view.
+    It's a read only sequence, not a ``list`` (it used to be): adding it to
+    a list gives a new list and ``list(words)`` gives a copy to modify.
     """
 
-    def __init__(self, words):
-        super(WordList, self).__init__(self)
-        # Add the words to the list
-        self.extend(words)
+    def __init__(self, words, start=0, end=None):
+        # Clamped like a slice, spans of matches include the end of line
+        end = len(words) if end is None else min(end, len(words))
+        self._words = words
+        self._start = min(start, end)
+        self._end = end
 
     @property
     def tokens(self):
-        return " ".join([x.token for x in self])
+        return " ".join(self._column(u"token"))
 
     @property
     def lemmas(self):
-        return " ".join([x.lemma for x in self])
+        return " ".join(self._column(u"lemma"))
+
+    def _column(self, attr):
+        # Views lemmatize only the words of the span
+        if isinstance(self._words, TaggedSentence) and \
+                (attr != u"lemma" or self._words.lemmatized()):
+            return self._words.column(attr)[self._start:self._end]
+        return [getattr(x, attr) for x in self]
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[x] for x in xrange(start, stop, step)]
+            return WordList(self._words, self._start + start,
+                            self._start + max(start, stop))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(u"WordList index out of range")
+        return self._words[self._start + i]
+
+    def __iter__(self):
+        for i in xrange(self._start, self._end):
+            yield self._words[i]
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class Match(object):
     """
     Holds the matching of the regex.
+
+    The interpretations of the particles are stored in `cache`, keyed by
+    particle class and span, so matches over the same words can share it.
+    Each access gets its own copy of the interpretation.
     """
 
-    def __init__(self, match, words, i=None, j=None):
+    def __init__(self, match, words, i=None, j=None, cache=None):
         assert isinstance(i, type(j))  # Aprox: Both None or both int
         self._match = match
         self._words = words
@@ -55,21 +114,23 @@ class Match(object):
         self._j = j
         self._particles = {particle.name: particle for particle in match
                            if isinstance(particle, Particle)}
+        if cache is None:
+            cache = {}
+        self._cache = cache
 
     @property
     def words(self):
         i, j = self._match.span()  # Should be (0, n)
         if self._i is not None:
             i, j = self._i, self._j
-        return WordList(self._words[i:j])
+        return WordList(self._words, i, j)
 
     def __getattr__(self, attr):
         if attr in self._particles:
             particle = self._particles[attr]
             i, j = self._match[particle]
             self._check_valid_indexes(i, j, attr)
-            match = Match(self._match, self._words, i, j)
-            return particle.interpret(match)
+            return self._interpret(particle, i, j)
 
         try:
             i, j = self._match[attr]
@@ -77,7 +138,20 @@ class Match(object):
             message = "'{}' object has no attribute '{}'"
             raise AttributeError(message.format(self.__class__.__name__, attr))
         self._check_valid_indexes(i, j, attr)
-        return WordList(self._words[i:j])
+        return WordList(self._words, i, j)
+
+    def _interpret(self, particle, i, j):
+        key = (particle.__class__, i, j)
+        try:
+            result = self._cache[key]
+        except KeyError:
+            match = Match(self._match, self._words, i, j, self._cache)
+            result = particle.interpret(match)
+            if isinstance(result, (Expression, basestring)):
+                self._cache[key] = result
+        if isinstance(result, Expression):
+            return copy(result)
+        return result
 
     def _check_valid_indexes(self, i, j, attr):
         if self._i is None:
@@ -105,18 +179,30 @@ class QuestionTemplate(object):
         """
         raise NotImplementedError()
 
-    def get_interpretation(self, words):
-        rulename = self.__class__.__name__
-        logger.debug("Trying to match with regex: {}".format(rulename))
+    def get_interpretation(self, words, match=None, cache=None):
+        """
+        Returns the interpretation of `words` (and the user data) or
+        ``(None, None)`` if they don't match the regex or the semantic
+        is wrong.
+        If `match` is given it's taken as the ``refo`` match of the regex
+        over `words` and the regex is not run again.
+        `cache` is a dict to share the interpretations of the particles
+        with the other rules tried over the same `words`.
+        """
+
+        from quepy import matcher
 
-        match = refo.match(self.regex + Literal(_EOL), words + [_EOL])
+        rulename = self.__class__.__name__
+        if match is None:
+            logger.debug("Trying to match with regex: {}".format(rulename))
+            match = matcher.match(self.regex, words)
 
         if not match:
             logger.debug("No match")
             return None, None
 
         try:
-            match = Match(match, words)
+            match = Match(match, words, cache=cache)
             result = self.interpret(match)
         except BadSemantic as error:
             logger.debug(str(error))
@@ -166,6 +252,16 @@ class Token(Pos):
         return word.token == self.tag
 
 
+class PosPrefix(Pos):
+    """
+    Predicate to check if a word has a *POS* tag starting with some prefix.
+    For example ``PosPrefix("NN")`` checks for any kind of noun.
+    """
+
+    def _check(self, word):
+        return word.pos is not None and word.pos.startswith(self.tag)
+
+
 class Particle(Group):
     regex = None
 
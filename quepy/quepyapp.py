@@ -12,21 +12,30 @@ Implements the Quepy Application API
 """
 
 import logging
+from itertools import islice
 from importlib import import_module
 from types import ModuleType
 
 from quepy import settings
 from quepy import generation
 from quepy.parsing import QuestionTemplate
-from quepy.tagger import get_tagger, TaggingError
+from quepy.ruleindex import RuleIndex
+from quepy.matcher import RuleMatcher
+from quepy.ruleanalysis import analyze_rules
+from quepy.fingerprint import app_fingerprint
+from quepy.cache import LRUCache, SqliteStore, TieredCache, SingleFlight
+from quepy.tagger import get_tagger, get_batch_tagger, TaggingError, \
+    TaggedSentence
 from quepy.encodingpolicy import encoding_flexible_conversion
 
 logger = logging.getLogger("quepy.quepyapp")
 
 
-def install(app_name):
+def install(app_name, cache=None):
     """
-    Installs the application and gives an QuepyApp object
+    Installs the application and gives an QuepyApp object.
+    `cache` is an optional `quepy.cache.Cache` for the queries of the
+    application, if not given it's configured from the settings.
     """
 
     module_paths = {
@@ -42,7 +51,36 @@ def install(app_name):
             message = u"Error importing {0!r}: {1}"
             raise ImportError(message.format(module_name, error))
 
-    return QuepyApp(**modules)
+    return QuepyApp(cache=cache, **modules)
+
+
+def question_normalize(question):
+    """
+    Returns the key used to cache the queries of `question`.
+    """
+
+    return u" ".join(question.split())
+
+
+class AppSettings(object):
+    """
+    The settings of an application: the values of `quepy.settings`
+    overridden by the ones of the application's settings `module`.
+    Every application has its own, so many of them can be used in the same
+    process.
+    """
+
+    def __init__(self, module):
+        for source in [settings, module]:
+            for key in dir(source):
+                if key.upper() == key:
+                    setattr(self, key, getattr(source, key))
+
+        for key, value in vars(self).items():
+            if isinstance(value, str):
+                value = encoding_flexible_conversion(
+                    value, encoding=self.DEFAULT_ENCODING)
+                setattr(self, key, value)
 
 
 def question_sanitize(question):
@@ -56,9 +94,14 @@ class QuepyApp(object):
     Provides the quepy application API.
     """
 
-    def __init__(self, parsing, settings):
+    def __init__(self, parsing, settings, cache=None):
         """
         Creates the application based on `parsing`, `settings` modules.
+
+        If `cache` (a `quepy.cache.Cache`) is given the queries of every
+        question are stored there, so asking a known question again
+        doesn't need tagging, matching nor generating it again.
+        Otherwise the cache is created as configured in the settings.
         """
 
         assert isinstance(parsing, ModuleType)
@@ -67,10 +110,9 @@ class QuepyApp(object):
         self._parsing_module = parsing
         self._settings_module = settings
 
-        # Save the settings right after loading settings module
-        self._save_settings_values()
-
-        self.tagger = get_tagger()
+        self.settings = AppSettings(settings)
+        self.tagger = get_tagger(self.settings)
+        self.batch_tagger = get_batch_tagger(self.settings)
         self.language = getattr(self._settings_module, "LANGUAGE", None)
         if not self.language:
             raise ValueError("Missing configuration for language")
@@ -88,6 +130,21 @@ class QuepyApp(object):
                 continue
 
         self.rules.sort(key=lambda x: x.weight, reverse=True)
+        self._rule_index = RuleIndex(self.rules)
+        self._matcher = RuleMatcher(self.rules)
+
+        # Reporting the ambiguous regexes is left to `quepy analyze`
+        if logger.isEnabledFor(logging.DEBUG):
+            for finding in analyze_rules(self.rules):
+                logger.debug(unicode(finding))
+
+        self.fingerprint = app_fingerprint(self._parsing_module,
+                                           self._settings_module, self.rules)
+        if cache is None:
+            cache = self._make_cache()
+        self.cache = cache
+        self.single_flight = SingleFlight()
+        self._async_runner = None
 
     def get_query(self, question):
         """
@@ -117,46 +174,206 @@ class QuepyApp(object):
         - metadata given by the regex programmer (defaults to None)
 
         The queries returned corresponds to the regexes that match in
-        weight order.
+        weight order. Without a query cache they are generated as they are
+        iterated. With a cache, all of them are generated to be cached.
+        Either way threads asking the same question at the same time share
+        one translation, counted in `single_flight`.
+        """
+        question = self._decode(question)
+        key = question_normalize(question)
+        if self.cache is None:
+            return self.single_flight.share(key, self._iter_queries, question)
+
+        try:
+            return iter(self.cache[key])
+        except KeyError:
+            pass
+
+        queries = self.single_flight.do(key, self._translate, key, question)
+        return iter(queries)
+
+    def aget_query(self, question, loop=None):
+        """
+        Asynchronous version of `get_query`. Returns an asyncio future with
+        its result, translated in the executor configured in the settings.
+        """
+
+        from quepy.aio import asyncio, first_query
+
+        loop = loop or asyncio.get_event_loop()
+        future = self._submit(question_sanitize(question), loop)
+        return first_query(future, loop)
+
+    def aget_queries(self, question, loop=None):
+        """
+        Asynchronous version of `get_queries`. Returns an asynchronous
+        iterator (a `quepy.aio.AsyncQueries`) over the queries, translated
+        in the executor configured in the settings.
+        """
+
+        from quepy.aio import asyncio, AsyncQueries
+
+        loop = loop or asyncio.get_event_loop()
+        return AsyncQueries(self._submit(question, loop), loop)
+
+    def get_query_batch(self, questions):
+        """
+        Returns a list with the result of `get_query` for each one of
+        `questions`, in the same order.
+        Like `get_query`, without a query cache only the first query of
+        each question is generated.
+        """
+
+        questions = [question_sanitize(x) for x in questions]
+        result = []
+        for queries in self._translate_batch(questions, first=True):
+            if queries:
+                result.append(queries[0])
+            else:
+                result.append((None, None, None))
+        return result
+
+    def get_queries_batch(self, questions):
+        """
+        Returns a list with the queries of each one of `questions`, in the
+        same order, as lists of the triples given by `get_queries`.
+
+        Repeated questions are translated once and all the questions that
+        aren't cached are tagged together, so it's faster than calling
+        `get_queries` for each one.
+        """
+
+        return self._translate_batch(questions)
+
+    def _translate_batch(self, questions, first=False):
+        """
+        Returns the lists of queries of `questions` for the batch methods.
+        If `first` and there's no query cache to fill, only the first
+        query of each question is generated.
         """
-        question = encoding_flexible_conversion(question)
-        for expression, userdata in self._iter_compiled_forms(question):
-            target, query = generation.get_code(expression, self.language)
+
+        questions = [self._decode(x) for x in questions]
+        keys = [question_normalize(x) for x in questions]
+
+        results = {}
+        pending = []
+        for key, question in zip(keys, questions):
+            if key in results:
+                continue
+            results[key] = None
+            if self.cache is not None:
+                results[key] = self.cache.get(key)
+            if results[key] is None:
+                pending.append((key, question))
+
+        try:
+            tagged = self.batch_tagger([x for _, x in pending])
+        except TaggingError:
+            # Tag them one by one to find the failing ones
+            tagged = [None] * len(pending)
+
+        for (key, question), words in zip(pending, tagged):
+            queries = self._iter_queries(question, words)
+            if first and self.cache is None:
+                queries = islice(queries, 1)
+            queries = tuple(queries)
+            if self.cache is not None:
+                self.cache[key] = queries
+            results[key] = queries
+
+        return [list(results[key]) for key in keys]
+
+    def _translate(self, key, question):
+        """
+        Returns a tuple with the queries of `question` and caches it with
+        `key`.
+        """
+
+        queries = tuple(self._iter_queries(question))
+        if self.cache is not None:
+            self.cache[key] = queries
+        return queries
+
+    def _iter_queries(self, question, words=None):
+        """
+        Generates the queries of `question`, tagged as `words` if given.
+        """
+
+        for expression, userdata in self._iter_compiled_forms(question,
+                                                              words):
+            target, query = generation.get_code(expression, self.language,
+                                                self.settings)
             message = u"Interpretation {1}: {0}"
             logger.debug(message.format(str(expression),
                          expression.rule_used))
             logger.debug(u"Query generated: {0}".format(query))
             yield target, query, userdata
 
-    def _iter_compiled_forms(self, question):
+    def _iter_compiled_forms(self, question, words=None):
         """
         Returns all the compiled form of the question.
+        If the tagged `words` of the question are given it's not tagged again.
         """
 
-        try:
-            words = list(self.tagger(question))
-        except TaggingError:
-            logger.warning(u"Can't parse tagger's output for: '%s'",
-                           question)
-            return
+        if words is None:
+            try:
+                words = self.tagger(question)
+            except TaggingError:
+                logger.warning(u"Can't parse tagger's output for: '%s'",
+                               question)
+                return
+        if not isinstance(words, TaggedSentence):
+            words = list(words)
 
         logger.debug(u"Tagged question:\n" +
                      u"\n".join(u"\t{}".format(w for w in words)))
 
-        for rule in self.rules:
-            expression, userdata = rule.get_interpretation(words)
+        # Particle interpretations shared by all the rules
+        cache = {}
+        candidates = self._rule_index.candidates(words)
+        for rule, match in self._matcher.match(words, candidates):
+            expression, userdata = rule.get_interpretation(words, match,
+                                                           cache)
             if expression:
                 yield expression, userdata
 
-    def _save_settings_values(self):
+    def _submit(self, question, loop):
+        """
+        Returns an asyncio future with the queries of `question`.
+        """
+
+        if self._async_runner is None:
+            from quepy.aio import AsyncRunner
+            self._async_runner = AsyncRunner(self,
+                                             self.settings.ASYNC_EXECUTOR,
+                                             self.settings.ASYNC_MAX_WORKERS)
+        question = self._decode(question)
+        return self._async_runner.submit(question_normalize(question),
+                                         question, loop)
+
+    def _make_cache(self):
         """
-        Persists the settings values of the app to the settings module
-        so it can be accesible from another part of the software.
+        Returns the query cache configured in the settings or ``None``.
+        The entries on disk are namespaced by the fingerprint of the app,
+        so they are discarded when the rules change.
         """
 
-        for key in dir(self._settings_module):
-            if key.upper() == key:
-                value = getattr(self._settings_module, key)
-                if isinstance(value, str):
-                    value = encoding_flexible_conversion(value)
-                setattr(settings, key, value)
+        size = self.settings.QUERY_CACHE_SIZE
+        path = self.settings.QUERY_CACHE_PATH
+        if not size and path is None:
+            return None
+
+        memory = LRUCache(size or None)
+        if path is None:
+            return memory
+
+        namespace = u"queries:{0}".format(self.fingerprint)
+        cache = TieredCache(memory, SqliteStore(path, namespace))
+        if self.settings.QUERY_CACHE_WARMUP:
+            count = cache.warm(self.settings.QUERY_CACHE_WARMUP)
+            logger.debug(u"Loaded {0} cached questions".format(count))
+        return cache
+
+    def _decode(self, string):
+        return encoding_flexible_conversion(
+            string, encoding=self.settings.DEFAULT_ENCODING)
@@ -0,0 +1,256 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Static analysis of the regexes of an application.
+
+Some regex shapes are ambiguous: they can match the same words in many
+different ways. A backtracking matcher (like ``refo``) may try all of them
+before failing, which takes exponential time for nested repetitions such as
+``Plus(Plus(nouns))`` and polynomial time for adjacent repetitions that can
+consume the same words, such as ``Plus(nouns) + Plus(nouns)``.
+
+`quepy.matcher` never backtracks and rewrites the shapes that have a simpler
+equivalent (see `quepy.matcher.simplify_repetitions`), but ambiguous regexes
+still make more threads alive at once. This module finds those shapes, tells
+if they are rewritten and estimates their worst case.
+"""
+
+from math import factorial
+
+from refo import Predicate, Literal, Concatenation, Disjunction, Star, Plus, \
+    Question, Repetition
+
+from quepy.parsing import Particle, _EOL
+from quepy.matcher import Program, optimize, _word_set, _children
+
+# Amount of words used to estimate the worst cases.
+DEFAULT_LENGTH = 20
+
+NESTED = u"nested"
+ADJACENT = u"adjacent"
+
+
+class Finding(object):
+    """
+    An ambiguous shape in the regex of `rule`.
+    """
+
+    def __init__(self, rule, kind, pattern, paths, steps, rewritten):
+        self.rule = rule
+        self.kind = kind
+        self.pattern = pattern
+        # Ways of matching `length` words with a backtracking matcher
+        self.paths = paths
+        # Bound of the steps taken by `quepy.matcher` for the same words
+        self.steps = steps
+        self.rewritten = rewritten
+
+    def __str__(self):
+        if self.rewritten:
+            message = u"{0}: {1} repetitions rewritten in {2!r}"
+        else:
+            message = u"{0}: {1} repetitions in {2!r} may match in " \
+                      u"{3} ways (at most {4} matcher steps)"
+        return message.format(self.rule, self.kind, self.pattern,
+                              self.paths, self.steps)
+
+
+def analyze(regex, name=None, length=DEFAULT_LENGTH):
+    """
+    Returns the ambiguous shapes of `regex` as a list of `Finding`, giving
+    the estimates for questions of `length` words.
+    The shapes inside particles are reported under their class name.
+    """
+
+    if name is None:
+        name = repr(regex)
+    return list(_analyze(regex, name, length, set()))
+
+
+def analyze_rules(rules, length=DEFAULT_LENGTH):
+    """
+    Returns the ambiguous shapes of the regexes of `rules` (instances of
+    ``QuestionTemplate``). Every particle class is analyzed only once.
+    """
+
+    seen = set()
+    result = []
+    for rule in rules:
+        name = rule.__class__.__name__
+        result.extend(_analyze(rule.regex, name, length, seen))
+    return result
+
+
+def _analyze(regex, name, length, seen):
+    pending = [(regex, name, _steps(regex, length))]
+    while pending:
+        node, where, steps = pending.pop()
+        if isinstance(node, Particle):
+            particle = node.__class__
+            if particle in seen:
+                continue
+            seen.add(particle)
+            where = particle.__name__
+            steps = _steps(node.x, length)
+
+        for kind, paths in _check(node, length):
+            rewritten = not _check(optimize(node), length)
+            yield Finding(where, kind, node, paths, steps, rewritten)
+
+        pending.extend((x, where, steps) for x in reversed(_children(node)))
+
+
+def _steps(regex, length):
+    program = Program()
+    program.add(regex, 0)
+    return (length + 1) * len(program.ops)
+
+
+def _check(node, length):
+    """
+    Returns ``(kind, paths)`` for the ambiguous shapes rooted at `node`.
+    """
+
+    result = []
+    if _unbounded(node):
+        body = node.x
+        for inner in _iter_unbounded(body):
+            letters = _letters(inner.x)
+            if _overlap(letters, _first(body)) and \
+                    _overlap(letters, _last(body)):
+                result.append((NESTED, 2 ** (length - 1)))
+                break
+
+    if isinstance(node, Concatenation):
+        runs = [[]]
+        for x in node.xs:
+            run = runs[-1]
+            if not _unbounded(x):
+                if not _nullable(x) and run:
+                    runs.append([])
+                continue
+            if run and not _overlap(_letters(run[-1].x), _letters(x.x)):
+                runs.append([])
+            runs[-1].append(x)
+        for run in runs:
+            if len(run) > 1:
+                result.append((ADJACENT, _combinations(length, len(run))))
+    return result
+
+
+def _combinations(length, run):
+    """
+    Ways of splitting `length` words between `run` repetitions.
+    """
+
+    n = length + run - 1
+    k = run - 1
+    return factorial(n) // (factorial(k) * factorial(n - k))
+
+
+def _unbounded(node):
+    if isinstance(node, (Star, Plus)):
+        return True
+    return isinstance(node, Repetition) and node.mx is None
+
+
+def _iter_unbounded(pattern):
+    pending = [pattern]
+    while pending:
+        node = pending.pop()
+        if _unbounded(node):
+            yield node
+        pending.extend(_children(node))
+
+
+def _nullable(pattern):
+    if isinstance(pattern, Predicate):
+        return False
+    if isinstance(pattern, Concatenation):
+        return all(_nullable(x) for x in pattern.xs)
+    if isinstance(pattern, Disjunction):
+        return _nullable(pattern.a) or _nullable(pattern.b)
+    if isinstance(pattern, (Star, Question)):
+        return True
+    if isinstance(pattern, Repetition) and pattern.mn == 0:
+        return True
+    return _nullable(pattern.x)
+
+
+def _first(pattern, reverse=False):
+    """
+    Returns the predicates that can check the first word of a match of
+    `pattern` (or the last one, if `reverse` is True).
+    """
+
+    if isinstance(pattern, Predicate):
+        return [pattern]
+    if isinstance(pattern, Concatenation):
+        result = []
+        xs = reversed(pattern.xs) if reverse else pattern.xs
+        for x in xs:
+            result.extend(_first(x, reverse))
+            if not _nullable(x):
+                break
+        return result
+    result = []
+    for x in _children(pattern):
+        result.extend(_first(x, reverse))
+    return result
+
+
+def _last(pattern):
+    return _first(pattern, reverse=True)
+
+
+def _letters(pattern):
+    if isinstance(pattern, Predicate):
+        return [pattern]
+    result = []
+    for x in _children(pattern):
+        result.extend(_letters(x))
+    return result
+
+
+def _overlap(xs, ys):
+    return any(_predicates_overlap(x, y) for x in xs for y in ys)
+
+
+def _predicates_overlap(a, b):
+    """
+    Returns False only if no word can satisfy both predicates.
+    """
+
+    if type(a) is Literal and type(b) is Literal:
+        return a.x == b.x
+    if type(b) is Literal:
+        a, b = b, a
+    if type(a) is Literal:
+        return a.x != _EOL or _word_set(b) is None
+
+    x = _word_set(a)
+    y = _word_set(b)
+    if x is None or y is None or x[0] != y[0]:
+        return True
+    _, values_x, prefixes_x = x
+    _, values_y, prefixes_y = y
+    if values_x & values_y:
+        return True
+    for value in values_x:
+        if any(value.startswith(prefix) for prefix in prefixes_y):
+            return True
+    for value in values_y:
+        if any(value.startswith(prefix) for prefix in prefixes_x):
+            return True
+    for p in prefixes_x:
+        for q in prefixes_y:
+            if p.startswith(q) or q.startswith(p):
+                return True
+    return False
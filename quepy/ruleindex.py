@@ -0,0 +1,187 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Index of the word features required by the rules of an application.
+
+Every match of a ``QuestionTemplate`` regex needs some words to be present in
+the question, ie ``Lemma("list") + Lemma("movie")`` can't match a question
+that doesn't have both lemmas. This module extracts those requirements from
+the regexes and builds an inverted index with them, so the application only
+tries the rules that can possibly match a tagged question.
+
+Requirements are kept in disjunctive form: a set of *alternatives*, where
+each alternative is a set of features (``(attribute, value)`` pairs) that
+must all be present. A rule is a candidate if any of its alternatives is
+satisfied.
+"""
+
+from itertools import product
+
+from refo import Disjunction, Concatenation, Plus, Group, Repetition
+
+from quepy.tagger import TaggedSentence
+from quepy.parsing import Pos, Lemma, Token
+
+# Only exact instances of these predicates are trusted: subclasses may
+# redefine what they check.
+_FEATURE_ATTRS = {
+    Pos: u"pos",
+    Lemma: u"lemma",
+    Token: u"token",
+}
+_NOTHING = frozenset([frozenset()])
+# Past this amount of alternatives the requirements are collapsed to the
+# features shared by all of them.
+MAX_ALTERNATIVES = 32
+
+
+def predicate_feature(predicate):
+    """
+    Returns the feature (an ``(attribute, value)`` pair) that `predicate`
+    checks on a word or ``None`` if it's not a feature predicate.
+    """
+
+    attr = _FEATURE_ATTRS.get(type(predicate))
+    if attr is None:
+        return None
+    return attr, predicate.tag
+
+
+def word_features(word):
+    """
+    Returns the features present in the tagged `word`.
+    """
+
+    return [(attr, getattr(word, attr)) for attr in _FEATURE_ATTRS.values()]
+
+
+def required_features(regex):
+    """
+    Returns the features that every match of `regex` must contain, as a
+    frozenset of alternatives (each one a frozenset of features).
+    An empty alternative means that the regex requires nothing.
+    """
+
+    feature = predicate_feature(regex)
+    if feature is not None:
+        return frozenset([frozenset([feature])])
+    if isinstance(regex, Disjunction):
+        alternatives = required_features(regex.a) | \
+            required_features(regex.b)
+        return _simplify(alternatives)
+    if isinstance(regex, Concatenation):
+        result = _NOTHING
+        for x in regex.xs:
+            alternatives = required_features(x)
+            result = frozenset(a | b for a, b in product(result, alternatives))
+            result = _simplify(result)
+        return result
+    if isinstance(regex, (Plus, Group)):
+        return required_features(regex.x)
+    if isinstance(regex, Repetition) and regex.mn > 0:
+        return required_features(regex.x)
+    # `Star`, `Question`, empty repetitions, and any other predicate.
+    return _NOTHING
+
+
+def _simplify(alternatives):
+    """
+    Removes the alternatives implied by smaller ones and caps their amount.
+    """
+
+    if frozenset() in alternatives:
+        return _NOTHING
+    result = [x for x in alternatives
+              if not any(y < x for y in alternatives)]
+    if len(result) > MAX_ALTERNATIVES:
+        result = [frozenset.intersection(*result)]
+    return frozenset(result)
+
+
+class RuleIndex(object):
+    """
+    Inverted index from word features to the rules that require them.
+    """
+
+    def __init__(self, rules):
+        """
+        Builds the index for `rules`, which is expected to be sorted
+        in weight order.
+        """
+
+        self.rules = list(rules)
+        self._always = []
+        self._sizes = {}
+        self._index = {}
+        # The alternatives that require lemmas and their amount of other
+        # features
+        self._sizes_without_lemmas = {}
+
+        for i, rule in enumerate(self.rules):
+            for j, alternative in enumerate(required_features(rule.regex)):
+                if not alternative:
+                    self._always.append(i)
+                    continue
+                self._sizes[(i, j)] = len(alternative)
+                for feature in alternative:
+                    self._index.setdefault(feature, []).append((i, j))
+                size = len([x for x in alternative if x[0] != u"lemma"])
+                if size < len(alternative):
+                    self._sizes_without_lemmas[(i, j)] = size
+
+    def candidates(self, words):
+        """
+        Returns the rules that can possibly match `words`, in weight order.
+        If `words` is a `TaggedSentence` whose lemmas are found lazily, it's
+        lemmatized only if its other features don't rule out every rule
+        that requires lemmas.
+        """
+
+        present = set()
+        lazy = False
+        if isinstance(words, TaggedSentence):
+            lazy = not words.lemmatized()
+            for attr in _FEATURE_ATTRS.itervalues():
+                if not (lazy and attr == u"lemma"):
+                    present.update((attr, x) for x in words.column(attr))
+        else:
+            for word in words:
+                present.update(word_features(word))
+
+        hits = self._hits(present)
+        selected = self._selected(hits)
+        if lazy and self._needs_lemmas(hits, selected):
+            lemmas = set((u"lemma", x) for x in words.lemmas)
+            hits = self._hits(lemmas, hits)
+            selected = self._selected(hits)
+
+        return [self.rules[i] for i in sorted(selected)]
+
+    def _hits(self, features, hits=None):
+        # Amount of `features` present of every alternative, added to `hits`
+        hits = {} if hits is None else hits
+        for feature in features:
+            for key in self._index.get(feature, ()):
+                hits[key] = hits.get(key, 0) + 1
+        return hits
+
+    def _selected(self, hits):
+        selected = set(self._always)
+        for key, count in hits.iteritems():
+            if count == self._sizes[key]:
+                selected.add(key[0])
+        return selected
+
+    def _needs_lemmas(self, hits, selected):
+        # If some rule not `selected` can be by the lemmas
+        for key, size in self._sizes_without_lemmas.iteritems():
+            if key[0] not in selected and hits.get(key, 0) == size:
+                return True
+        return False
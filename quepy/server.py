@@ -0,0 +1,276 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+HTTP server for a quepy application.
+
+The server listens on one socket shared by a pool of pre-forked worker
+processes. Each worker installs the application and warms the tagger up
+before accepting connections. The endpoints are:
+
+- ``POST /query``: receives ``{"question": ...}`` and answers the result of
+  `QuepyApp.get_query` as ``{"target": ..., "query": ..., "userdata": ...}``.
+  With ``{"questions": [...]}`` it answers ``{"results": [...]}``, one for
+  each question.
+- ``POST /queries``: like ``/query`` with the results of
+  `QuepyApp.get_queries`, as ``{"queries": [...]}``.
+- ``GET /health``: answers 200 while the process is alive.
+- ``GET /ready``: answers 200 once the application is installed and 503
+  before. The pre-forked workers install it before accepting connections,
+  so only a `QuepyHTTPServer` created without an application answers 503;
+  the connections made while the workers start wait to be accepted.
+
+A question that fails to be translated is answered with a 500 error.
+
+Connections are kept alive (HTTP/1.1) and pipelined requests are answered
+in order.
+"""
+
+import os
+import json
+import signal
+import logging
+from multiprocessing import cpu_count
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from quepy.quepyapp import install
+from quepy.tagger import TaggingError
+from quepy.encodingpolicy import error_message
+
+logger = logging.getLogger("quepy.server")
+
+# Exit status of a worker that couldn't install the application
+_INSTALL_FAILED = 3
+_WARMUP_QUESTION = u"What is the tagger warm up for?"
+_MAX_BODY = 1024 * 1024
+
+
+class QuepyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of one connection, with keep-alive.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Seconds an idle connection is kept open
+    timeout = 60
+
+    def do_GET(self):
+        if self.path == u"/health":
+            self.send_json(200, {u"status": u"ok", u"pid": os.getpid()})
+        elif self.path == u"/ready":
+            if self.server.app is None:
+                self.send_json(503, {u"status": u"starting"})
+            else:
+                self.send_json(200, {u"status": u"ready",
+                                     u"pid": os.getpid(),
+                                     u"fingerprint":
+                                     self.server.app.fingerprint})
+        else:
+            self.send_json(404, {u"error": u"Not found"})
+
+    def do_POST(self):
+        if self.path not in (u"/query", u"/queries"):
+            self.discard_body()
+            self.send_json(404, {u"error": u"Not found"})
+            return
+        if self.server.app is None:
+            self.discard_body()
+            self.send_json(503, {u"error": u"Not ready"})
+            return
+
+        try:
+            request = self.read_json()
+        except ValueError, error:
+            self.send_json(400, {u"error": unicode(error)})
+            return
+
+        if isinstance(request.get(u"questions"), list):
+            questions = request[u"questions"]
+        elif isinstance(request.get(u"question"), basestring):
+            questions = [request[u"question"]]
+        else:
+            self.send_json(400, {u"error": u"Missing question"})
+            return
+        if not all(isinstance(x, basestring) for x in questions):
+            self.send_json(400, {u"error": u"Questions must be strings"})
+            return
+
+        app = self.server.app
+        try:
+            if self.path == u"/query":
+                results = [_query_result(x)
+                           for x in app.get_query_batch(questions)]
+            else:
+                results = [{u"queries": [_query_result(x) for x in queries]}
+                           for queries in app.get_queries_batch(questions)]
+        except Exception, error:
+            logger.exception(u"Error translating {0!r}".format(questions))
+            self.send_json(500, {u"error": error_message(error)})
+            return
+
+        if u"questions" in request:
+            self.send_json(200, {u"results": results})
+        else:
+            self.send_json(200, results[0])
+
+    def read_json(self):
+        """
+        Reads the body of the request and returns the JSON object in it.
+        Raises `ValueError` if it's not valid.
+        """
+
+        try:
+            length = int(self.headers.getheader("Content-Length", 0))
+        except ValueError:
+            raise ValueError(u"Invalid Content-Length")
+        if not 0 < length <= _MAX_BODY:
+            self.close_connection = 1
+            raise ValueError(u"Invalid Content-Length")
+        body = self.rfile.read(length)
+        try:
+            request = json.loads(body)
+        except ValueError:
+            raise ValueError(u"Invalid JSON")
+        if not isinstance(request, dict):
+            raise ValueError(u"Expected a JSON object")
+        return request
+
+    def discard_body(self):
+        try:
+            length = int(self.headers.getheader("Content-Length", 0))
+        except ValueError:
+            length = 0
+        if 0 < length <= _MAX_BODY:
+            self.rfile.read(length)
+        elif length:
+            self.close_connection = 1
+
+    def send_json(self, status, value):
+        """
+        Sends a response with `status` and `value` as JSON.
+        """
+
+        body = json.dumps(value, default=repr)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(u"%s - %s", self.client_address[0], format % args)
+
+
+class QuepyHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server for the quepy application `app`, that can be set after
+    creating the server; until then it's not ready.
+    Every connection is handled in its own thread.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, app=None, bind_and_activate=True):
+        HTTPServer.__init__(self, address, QuepyRequestHandler,
+                            bind_and_activate)
+        self.app = app
+
+
+def load_app(app_name):
+    """
+    Installs the application `app_name` and warms its tagger up, so the
+    first question isn't slower than the rest.
+    """
+
+    app = install(app_name)
+    try:
+        app.tagger(_WARMUP_QUESTION)
+    except TaggingError:
+        pass
+    return app
+
+
+def serve(app_name, host=u"localhost", port=8000, workers=None):
+    """
+    Serves the application `app_name` on `host`:`port` with `workers`
+    processes (one per CPU by default) until interrupted.
+    Workers that die are replaced, unless they couldn't install the
+    application.
+    """
+
+    server = QuepyHTTPServer((host, port))
+    workers = workers or cpu_count()
+    logger.info(u"Serving {0} on {1}:{2} with {3} workers".format(
+                app_name, host, server.server_address[1], workers))
+    if workers == 1:
+        server.app = load_app(app_name)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        return
+
+    def terminate(signum, frame):
+        raise SystemExit(0)
+    previous = signal.signal(signal.SIGTERM, terminate)
+
+    children = set()
+    try:
+        for _ in xrange(workers):
+            children.add(_fork_worker(server, app_name))
+        while children:
+            pid, status = os.wait()
+            children.discard(pid)
+            if os.WIFEXITED(status) and \
+                    os.WEXITSTATUS(status) == _INSTALL_FAILED:
+                message = u"Couldn't install {0!r} in the workers"
+                raise RuntimeError(message.format(app_name))
+            logger.warning(u"Worker {0} died, starting another".format(pid))
+            children.add(_fork_worker(server, app_name))
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        server.server_close()
+
+
+def _fork_worker(server, app_name):
+    pid = os.fork()
+    if pid:
+        return pid
+
+    status = 1
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            server.app = load_app(app_name)
+        except Exception:
+            logger.exception(u"Couldn't install {0!r}".format(app_name))
+            status = _INSTALL_FAILED
+            return
+        server.serve_forever()
+    except KeyboardInterrupt:
+        status = 0
+    except Exception:
+        logger.exception(u"Worker {0} failed".format(os.getpid()))
+    finally:
+        os._exit(status)
+
+
+def _query_result(result):
+    target, query, userdata = result
+    return {u"target": target, u"query": query, u"userdata": userdata}
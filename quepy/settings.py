@@ -17,6 +17,25 @@ LANGUAGE = "sparql"
 # NLTK config
 NLTK_DATA_PATH = []  # List of paths with NLTK data
 
+# Tagger config
+TAGGER = "nltk"  # Tagger backend: nltk, numpy or lookup
+LOOKUP_TAGGER_PATH = None  # Lexicon of the lookup tagger, quepy's by default
+TAGGER_CACHE_SIZE = 10000  # Questions kept tagged in memory, 0 to disable
+TAGGER_CACHE_PATH = None  # Path of a sqlite file to keep the tags on disk
+LEMMA_CACHE_SIZE = 50000  # Lemmas of words kept in memory, 0 to disable
+LEMMA_CACHE_PATH = None  # Lemmas made with "quepy lemmas --cache"
+LEMMA_TABLE_PATH = None  # Path of a table made with "quepy lemmas"
+TAGGER_MODEL_PATH = None  # Path of a model made with "quepy taggermodel"
+
+# Query cache config
+QUERY_CACHE_SIZE = 0  # Questions kept in memory, 0 to disable
+QUERY_CACHE_PATH = None  # Path of a sqlite file to keep the queries on disk
+QUERY_CACHE_WARMUP = 1000  # Popular questions loaded from disk on install
+
+# Asyncio API config
+ASYNC_EXECUTOR = "thread"  # Where questions are translated: thread or process
+ASYNC_MAX_WORKERS = 4  # Questions translated at the same time
+
 # Encoding config
 DEFAULT_ENCODING = "utf-8"
 
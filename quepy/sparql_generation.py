@@ -37,7 +37,7 @@ def adapt(x):
     return unicode(x)
 
 
-def expression_to_sparql(e, full=False):
+def expression_to_sparql(e, full=False, preamble=None):
     template = u"{preamble}\n" +\
                u"SELECT DISTINCT {select} WHERE {{\n" +\
                u"{expression}\n" +\
@@ -56,7 +56,9 @@ def expression_to_sparql(e, full=False):
                 y += 1
             xs.append(triple(adapt(node), relation, adapt(dest),
                       indentation=1))
-    sparql = template.format(preamble=settings.SPARQL_PREAMBLE,
+    if preamble is None:
+        preamble = settings.SPARQL_PREAMBLE
+    sparql = template.format(preamble=preamble,
                              select=select,
                              expression=u"\n".join(xs))
     return select, sparql
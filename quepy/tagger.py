@@ -8,14 +8,26 @@
 #          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
 
 import logging
+from importlib import import_module
 
 from quepy import settings
+from quepy.cache import LRUCache, SqliteStore
 from quepy.encodingpolicy import assert_valid_encoding
 
 logger = logging.getLogger("quepy.tagger")
 PENN_TAGSET = set(u"$ `` '' ( ) , -- . : CC CD DT EX FW IN JJ JJR JJS LS MD "
                   "NN NNP NNPS NNS PDT POS PRP PRP$ RB RBR RBS RP SYM TO UH "
                   "VB VBD VBG VBN VBP VBZ WDT WP WP$ WRB".split())
+_caches = {}
+# Factories of the tagger backends, given as dotted paths so the modules
+# (and their dependencies) are imported only when used
+_backends = {
+    u"nltk": u"quepy.nltktagger.make_batch_tagger",
+    u"lookup": u"quepy.lookuptagger.make_batch_tagger",
+    u"numpy": u"quepy.numpytagger.make_batch_tagger",
+}
+# Lemma of a TaggedSentence not found yet
+_PENDING = object()
 
 
 class TaggingError(Exception):
@@ -31,6 +43,7 @@ class Word(object):
     Contains *token*, *lemma*, *pos tag* and optionally a *probability* of
     that tag.
     """
+    __slots__ = ("token", "lemma", "pos", "prob")
     _encoding_attrs = u"token lemma pos".split()
     _attrs = _encoding_attrs + [u"prob"]
 
@@ -53,22 +66,336 @@ class Word(object):
         return unicode(self)
 
 
-def get_tagger():
+def _column_property(column):
+    def get(self):
+        return getattr(self._sentence, column)[self._i]
+
+    def set(self, value):
+        getattr(self._sentence, column)[self._i] = value
+    return property(get, set)
+
+
+def _get_lemma(self):
+    return self._sentence.lemma(self._i)
+
+
+def _set_lemma(self, value):
+    self._sentence._lemmas[self._i] = value
+
+
+class WordView(Word):
+    """
+    The `Word` at position `i` of a `TaggedSentence`. Its attributes are
+    read from, and written to, the columns of the sentence. The lemma is
+    found the first time it's read, if the sentence lemmatizes lazily.
+    Views of the same position of the same sentence are equal.
+    """
+    __slots__ = ("_sentence", "_i")
+
+    token = _column_property("tokens")
+    lemma = property(_get_lemma, _set_lemma)
+    pos = _column_property("tags")
+    prob = _column_property("probs")
+
+    def __init__(self, sentence, i):
+        object.__setattr__(self, "_sentence", sentence)
+        object.__setattr__(self, "_i", i)
+
+    def __eq__(self, other):
+        return isinstance(other, WordView) and \
+            self._sentence is other._sentence and self._i == other._i
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._sentence), self._i))
+
+
+class TaggedSentence(object):
+    """
+    The tagged words of a question, stored by column: lists of `tokens`,
+    `lemmas`, `tags` (the pos tags) and `probs`, one item for each word.
+    The columns given are used as they are, the ones not given are filled
+    with ``None``.
+
+    If `lemmatize` is given and `lemmas` isn't, the lemmas are found
+    lazily: the lemma of a word is ``lemmatize(token, pos)``, computed the
+    first time it's asked for (see `lemma`). Reading the `lemmas` column
+    computes all of them.
+
+    It's a sequence of `Word` objects, but they are views created when an
+    item is asked for (see `WordView`), so a question doesn't need an
+    object for each word. Slicing gives a new sentence.
+    It's not a ``list`` (it used to be): it can't be appended to, and
+    adding it to a list gives a new list. Use ``list(words)`` to get one.
+    """
+    __slots__ = ("tokens", "_lemmas", "tags", "probs", "_lemmatize")
+    _columns = {u"token": "tokens", u"lemma": "lemmas", u"pos": "tags",
+                u"prob": "probs"}
+
+    def __init__(self, tokens, lemmas=None, tags=None, probs=None,
+                 lemmatize=None):
+        empty = [None] * len(tokens)
+        self.tokens = tokens
+        self._lemmatize = None
+        if lemmas is None and lemmatize is not None:
+            lemmas = [_PENDING] * len(tokens)
+            self._lemmatize = lemmatize
+        self._lemmas = empty if lemmas is None else lemmas
+        self.tags = list(empty) if tags is None else tags
+        self.probs = list(empty) if probs is None else probs
+
+    @property
+    def lemmas(self):
+        if self._lemmatize is not None:
+            for i in xrange(len(self._lemmas)):
+                self.lemma(i)
+            self._lemmatize = None
+        return self._lemmas
+
+    def lemma(self, i):
+        """
+        Returns the lemma of the word `i`, lemmatizing it if needed.
+        """
+
+        # Read first, it's cleared once every lemma is known
+        lemmatize = self._lemmatize
+        lemma = self._lemmas[i]
+        if lemma is _PENDING:
+            lemma = lemmatize(self.tokens[i], self.tags[i])
+            self._lemmas[i] = lemma
+        return lemma
+
+    def lemmatized(self):
+        """
+        Returns ``False`` if some lemma may not have been found yet.
+        """
+
+        return self._lemmatize is None
+
+    @classmethod
+    def from_words(cls, words):
+        """
+        Returns a `TaggedSentence` with the attributes of `words`, or
+        `words` itself if it's already one.
+        """
+
+        if isinstance(words, TaggedSentence):
+            return words
+        return cls.from_fields([(x.token, x.lemma, x.pos, x.prob)
+                                for x in words])
+
+    @classmethod
+    def from_fields(cls, fields):
+        """
+        Returns a `TaggedSentence` with the words given as ``(token, lemma,
+        pos, prob)`` tuples.
+        """
+
+        if not fields:
+            return cls([])
+        return cls(*[list(x) for x in zip(*fields)])
+
+    def fields(self):
+        """
+        Returns the words as a tuple of ``(token, lemma, pos, prob)``.
+        """
+
+        return tuple(zip(self.tokens, self.lemmas, self.tags, self.probs))
+
+    def column(self, attr):
+        """
+        Returns the list with the attribute `attr` of `Word` (e.g.
+        ``"lemma"``) of every word.
+        """
+
+        return getattr(self, self._columns[attr])
+
+    def copy(self):
+        copy = TaggedSentence(list(self.tokens), list(self._lemmas),
+                              list(self.tags), list(self.probs))
+        copy._lemmatize = self._lemmatize
+        return copy
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            part = TaggedSentence(self.tokens[i], self._lemmas[i],
+                                  self.tags[i], self.probs[i])
+            part._lemmatize = self._lemmatize
+            return part
+        if i < 0:
+            i += len(self.tokens)
+        if not 0 <= i < len(self.tokens):
+            raise IndexError(u"TaggedSentence index out of range")
+        return WordView(self, i)
+
+    def __iter__(self):
+        for i in xrange(len(self.tokens)):
+            yield WordView(self, i)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class TaggerCache(object):
+    """
+    Memoizes the output of a tagger in memory and, optionally, in a sqlite
+    file in `path`.
+    `namespace` must identify the tagger and its data, so the tags stored
+    on disk by other versions of them are not used.
+    Every lookup builds a new `TaggedSentence`. The lemmas not found yet
+    are kept pending in memory, they are only found to store the words on
+    disk.
+    """
+
+    def __init__(self, namespace, max_entries=None, path=None):
+        self.namespace = namespace
+        self.memory = LRUCache(max_entries)
+        self.store = None
+        if path is not None:
+            self.store = SqliteStore(path, namespace)
+
+    def get(self, string):
+        """
+        Returns the words stored for `string` or ``None``.
+        """
+
+        try:
+            words = self.memory[string]
+        except KeyError:
+            if self.store is None:
+                return None
+            fields = self.store.get(string)
+            if fields is None:
+                return None
+            words = TaggedSentence.from_fields(fields)
+            self.memory[string] = words
+        return words.copy()
+
+    def put(self, string, words):
+        """
+        Stores the tagged `words` of `string`.
+        """
+
+        words = TaggedSentence.from_words(words).copy()
+        self.memory[string] = words
+        if self.store is not None:
+            self.store.put(string, words.fields())
+
+
+def get_tagger_cache(backend, version, app_settings=None):
+    """
+    Returns the `TaggerCache` configured in `app_settings` (or
+    `quepy.settings`) for the tagger `backend` at `version`, or ``None`` if
+    caching is disabled.
+    Caches are shared by all the taggers with the same configuration.
+    """
+
+    app_settings = app_settings or settings
+    size = app_settings.TAGGER_CACHE_SIZE
+    path = app_settings.TAGGER_CACHE_PATH
+    if not size and path is None:
+        return None
+    namespace = u"{0}:{1}".format(backend, version)
+    key = namespace, size, path
+    if key not in _caches:
+        _caches[key] = TaggerCache(namespace, size or None, path)
+    return _caches[key]
+
+
+def register_tagger(name, factory):
+    """
+    Registers the tagger backend `name`, that apps select with the
+    ``TAGGER`` setting.
+    `factory` is a function, or its dotted path, that receives the settings
+    of an app and returns a pair with a function that tags a list of
+    unicode strings (like the ones returned by `get_batch_tagger`) and a
+    string that identifies the version of the tagger and its data, used to
+    namespace its cache.
+    """
+
+    _backends[name] = factory
+
+
+def get_backend(name):
+    """
+    Returns the factory of the tagger backend `name`.
+    """
+
+    try:
+        factory = _backends[name]
+    except KeyError:
+        message = u"Unknown tagger {0!r}, the options are: {1}"
+        raise ValueError(message.format(name, u", ".join(sorted(_backends))))
+    if isinstance(factory, basestring):
+        module, _, function = factory.rpartition(u".")
+        factory = getattr(import_module(module), function)
+        _backends[name] = factory
+    return factory
+
+
+def get_tagger(app_settings=None):
     """
     Return a tagging function given some app settings.
-    `Settings` is the settings module of an app.
+    `app_settings` are the settings of an app, by default the ones of
+    `quepy.settings` are used.
     The returned value is a function that receives a unicode string and returns
-    a list of `Word` instances.
+    a `TaggedSentence`, a sequence of `Word` instances.
     """
-    from quepy.nltktagger import run_nltktagger
-    tagger_function = lambda x: run_nltktagger(x, settings.NLTK_DATA_PATH)
+    batch_tagger = get_batch_tagger(app_settings)
 
     def wrapper(string):
-        assert_valid_encoding(string)
-        words = tagger_function(string)
-        for word in words:
-            if word.pos not in PENN_TAGSET:
-                logger.warning("Tagger emmited a non-penn "
-                               "POS tag {!r}".format(word.pos))
-        return words
+        return batch_tagger([string])[0]
+    return wrapper
+
+
+def get_batch_tagger(app_settings=None):
+    """
+    Like `get_tagger` but the returned function receives a list of unicode
+    strings and returns a list with the words of each one, tagging them all
+    at once. The words of each string are a `TaggedSentence`.
+    The tagger is the backend named by the ``TAGGER`` setting.
+    """
+    app_settings = app_settings or settings
+    backend = app_settings.TAGGER
+    tagger_function, version = get_backend(backend)(app_settings)
+    cache = get_tagger_cache(backend, version, app_settings)
+
+    def wrapper(strings):
+        result = [None] * len(strings)
+        pending = {}
+        for i, string in enumerate(strings):
+            assert_valid_encoding(string)
+            if cache is not None:
+                result[i] = cache.get(string)
+            if result[i] is None:
+                pending.setdefault(string, []).append(i)
+        if not pending:
+            return result
+
+        pending_strings = list(pending)
+        tagged = tagger_function(pending_strings)
+        for string, words in zip(pending_strings, tagged):
+            words = TaggedSentence.from_words(words)
+            for pos in words.tags:
+                if pos not in PENN_TAGSET:
+                    logger.warning("Tagger emmited a non-penn "
+                                   "POS tag {!r}".format(pos))
+            if cache is not None:
+                cache.put(string, words)
+            indexes = pending[string]
+            result[indexes[0]] = words
+            for i in indexes[1:]:
+                result[i] = words.copy()
+        return result
     return wrapper
@@ -0,0 +1,242 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Averaged perceptron tagger model in a flat file, read with mmap.
+
+The file has a header with a magic string and the amount of classes, words
+of the tag dictionary and features, followed by:
+
+- The classes.
+- The words of the tag dictionary, sorted, and the class of each one.
+- The features, sorted, the offset of the weights of each one, the class
+  of every weight and the weights.
+
+The strings are encoded in utf-8 and stored after their offsets, so words
+and features are found with a binary search. The weights of a feature are
+kept in the order NLTK's model has them, so they are added up in the same
+order and give the same scores.
+Nothing is unpickled or copied in memory, processes that map the same model
+share its pages.
+"""
+
+import os
+import mmap
+import struct
+from array import array
+from collections import defaultdict
+
+MAGIC = "QUEPYTM1"
+_HEADER = struct.Struct("<8sIII")
+_OFFSET = struct.Struct("<I")
+
+
+class TaggerModel(object):
+    """
+    Model in the file `path`, written with `write_tagger_model`.
+    It has the interface of NLTK's ``AveragedPerceptron`` used to tag.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as model_file:
+            self._data = mmap.mmap(model_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        if len(self._data) < _HEADER.size:
+            raise ValueError(u"{0!r} is not a tagger model".format(path))
+        magic, n_classes, n_words, n_features = \
+            _HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError(u"{0!r} is not a tagger model".format(path))
+
+        classes = _Strings(self._data, _HEADER.size, n_classes)
+        self._labels = [classes[i] for i in xrange(n_classes)]
+        self.classes = list(self._labels)
+        self._words = _Strings(self._data, classes.end, n_words)
+        self._word_classes = self._words.end
+        self._features = _Strings(self._data, self._word_classes + 2 * n_words,
+                                  n_features)
+        self._weight_offsets = self._features.end
+        n_weights, = _OFFSET.unpack_from(
+            self._data, self._weight_offsets + _OFFSET.size * n_features)
+        self._weight_classes = self._weight_offsets + \
+            _OFFSET.size * (n_features + 1)
+        self._weights = self._weight_classes + 2 * n_weights
+        self.tagdict = _TagDict(self)
+        self.weights = _Weights(self)
+
+    def predict(self, features, return_conf=False):
+        """
+        Returns the best class for `features`, like the method of NLTK's
+        ``AveragedPerceptron``. It doesn't compute the confidence, so the
+        second value is always ``None``.
+        """
+
+        scores = defaultdict(float)
+        for feature, value in features.iteritems():
+            if value == 0:
+                continue
+            for label, weight in self.weights.get(feature, ()):
+                scores[label] += value * weight
+        best = max(self.classes, key=lambda label: (scores[label], label))
+        return best, None
+
+    def close(self):
+        self._data.close()
+
+    def _word_class(self, i):
+        label, = struct.unpack_from("<H", self._data,
+                                    self._word_classes + 2 * i)
+        return self._labels[label]
+
+    def _feature_weights(self, i):
+        start, end = struct.unpack_from(
+            "<II", self._data, self._weight_offsets + _OFFSET.size * i)
+        count = end - start
+        labels = struct.unpack_from("<{0}H".format(count), self._data,
+                                    self._weight_classes + 2 * start)
+        weights = struct.unpack_from("<{0}d".format(count), self._data,
+                                     self._weights + 8 * start)
+        return [(self._labels[x], y) for x, y in zip(labels, weights)]
+
+
+class _TagDict(object):
+    # The tag dictionary of a TaggerModel, like a read only dict
+
+    def __init__(self, model):
+        self._model = model
+
+    def __len__(self):
+        return len(self._model._words)
+
+    def get(self, word, default=None):
+        i = self._model._words.find(_encode(word))
+        if i < 0:
+            return default
+        return self._model._word_class(i)
+
+
+class _Weights(object):
+    # The weights of a TaggerModel, like a read only dict of lists of
+    # (class, weight)
+
+    def __init__(self, model):
+        self._model = model
+
+    def __len__(self):
+        return len(self._model._features)
+
+    def __contains__(self, feature):
+        return self._model._features.find(_encode(feature)) >= 0
+
+    def get(self, feature, default=None):
+        i = self._model._features.find(_encode(feature))
+        if i < 0:
+            return default
+        return self._model._feature_weights(i)
+
+    def iteritems(self):
+        features = self._model._features
+        for i in xrange(len(features)):
+            yield features[i].decode("utf-8"), \
+                dict(self._model._feature_weights(i))
+
+
+class _Strings(object):
+    # Sorted strings stored after their offsets at `position` of `data`
+
+    def __init__(self, data, position, count):
+        self._data = data
+        self._count = count
+        self._offsets = position
+        self._start = position + _OFFSET.size * (count + 1)
+        size, = _OFFSET.unpack_from(data, position + _OFFSET.size * count)
+        self.end = self._start + size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start, end = struct.unpack_from("<II", self._data,
+                                        self._offsets + _OFFSET.size * i)
+        return self._data[self._start + start:self._start + end]
+
+    def find(self, key):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self[middle]
+            if entry < key:
+                low = middle + 1
+            elif entry > key:
+                high = middle
+            else:
+                return middle
+        return -1
+
+
+def write_tagger_model(path, weights, tagdict, classes):
+    """
+    Writes the model with `weights`, `tagdict` and `classes` (the ones
+    pickled by NLTK's ``PerceptronTagger``) to the file `path`.
+    """
+
+    classes = sorted(classes)
+    columns = dict((_encode(label), i) for i, label in enumerate(classes))
+    words = sorted((_encode(word), columns[_encode(label)])
+                   for word, label in tagdict.iteritems())
+    features = sorted((_encode(feature), label_weights)
+                      for feature, label_weights in weights.iteritems())
+
+    offsets = array("I", [0])
+    weight_classes = array("H")
+    weight_values = array("d")
+    for _, label_weights in features:
+        # In the order of the dict, so they are added as NLTK does
+        for label, weight in label_weights.iteritems():
+            weight_classes.append(columns[_encode(label)])
+            weight_values.append(weight)
+        offsets.append(len(weight_values))
+
+    # Written beside the model and renamed, so readers never see it partial
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as model_file:
+        model_file.write(_HEADER.pack(MAGIC, len(classes), len(words),
+                                      len(features)))
+        _write_strings(model_file, [_encode(x) for x in classes])
+        _write_strings(model_file, [word for word, _ in words])
+        _write_array(model_file, array("H", [label for _, label in words]))
+        _write_strings(model_file, [feature for feature, _ in features])
+        _write_array(model_file, offsets)
+        _write_array(model_file, weight_classes)
+        _write_array(model_file, weight_values)
+    os.rename(tmp_path, path)
+
+
+def _write_strings(model_file, strings):
+    offsets = array("I", [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    _write_array(model_file, offsets)
+    for string in strings:
+        model_file.write(string)
+
+
+def _write_array(model_file, values):
+    # The file is little endian
+    if struct.pack("=H", 1) != struct.pack("<H", 1):
+        values = array(values.typecode, values)
+        values.byteswap()
+    model_file.write(values.tostring())
+
+
+def _encode(string):
+    if isinstance(string, unicode):
+        return string.encode("utf-8")
+    return string
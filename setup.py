@@ -31,6 +31,8 @@ setup(
         "Topic :: Utilities",
         ],
     packages=["quepy"],
+    package_data={"quepy": ["data/*.tsv"]},
     install_requires=["refo", "nltk", "SPARQLWrapper", "docopt"],
+    extras_require={"async": ["trollius", "futures"], "numpy": ["numpy"]},
     scripts=["scripts/quepy"]
 )
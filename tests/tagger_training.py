@@ -0,0 +1,50 @@
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+A small perceptron tagger and questions to test the taggers built from it.
+"""
+
+import random
+
+from nltk.tag.perceptron import PerceptronTagger
+
+TRAINING = [
+    u"Who/WP directed/VBD Pulp/NNP Fiction/NNP ?/.",
+    u"Which/WDT movies/NNS did/VBD Quentin/NNP Tarantino/NNP direct/VB ?/.",
+    u"List/VB movies/NNS starring/VBG Uma/NNP Thurman/NNP",
+    u"What/WP is/VBZ the/DT capital/NN of/IN Bolivia/NNP ?/.",
+    u"How/WRB old/JJ is/VBZ Bob/NNP Dylan/NNP ?/.",
+    u"Who/WP wrote/VBD the/DT book/NN ?/.",
+    u"the/DT book/NN is/VBZ red/JJ",
+    u"Who/WP are/VBP the/DT members/NNS of/IN Metallica/NNP ?/.",
+]
+QUESTIONS = [
+    u"Who directed Kill Bill ?",
+    u"Which books did George Orwell write ?",
+    u"What is the population of 1984 ?",
+    u"List albums of Pink Floyd",
+    u"How long is the well-known river ?",
+    u"How long is the well-known río ?",
+    u"What",
+    u"",
+]
+
+
+def train_perceptron():
+    """
+    Returns a `PerceptronTagger` trained with `TRAINING`, always the same.
+    """
+
+    random.seed(42)
+    sentences = [[tuple(x.rsplit(u"/", 1)) for x in line.split()]
+                 for line in TRAINING]
+    perceptron = PerceptronTagger(load=False)
+    perceptron.train(sentences, nr_iter=5)
+    return perceptron
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the asyncio API.
+"""
+
+import unittest
+from threading import Event
+
+import quepy
+from quepy.aio import asyncio, AsyncRunner, StopAsyncIteration
+
+
+class TestAsyncAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.app = quepy.install("testapp")
+        self.tagged = []
+        self.release = Event()
+        self.release.set()
+        tagger = self.app.tagger
+
+        def counting_tagger(question):
+            self.release.wait()
+            self.tagged.append(question)
+            return tagger(question)
+
+        self.app.tagger = counting_tagger
+
+    def tearDown(self):
+        self.release.set()
+        if self.app._async_runner is not None:
+            self.app._async_runner.shutdown()
+        self.loop.close()
+
+    def wait(self, *futures):
+        return self.loop.run_until_complete(asyncio.gather(*futures,
+                                                           loop=self.loop))
+
+    def test_get_query(self):
+        result, = self.wait(self.app.aget_query(u"user data", self.loop))
+        self.assertEqual(result, self.app.get_query(u"user data"))
+
+    def test_get_queries(self):
+        queries = self.app.aget_queries(u"something something", self.loop)
+        result = []
+        while True:
+            try:
+                result.extend(self.wait(queries.__anext__()))
+            except StopAsyncIteration:
+                break
+        self.assertEqual(result,
+                         list(self.app.get_queries(u"something something")))
+
+    def test_coalesced(self):
+        self.release.clear()
+        futures = [self.app.aget_query(x, self.loop)
+                   for x in [u"user data", u"user  data", u"What is this?"]]
+        self.release.set()
+        first, second, third = self.wait(*futures)
+        self.assertEqual(first, second)
+        self.assertEqual(sorted(self.tagged), [u"What is this?",
+                                               u"user data"])
+
+    def test_cancel(self):
+        self.app._async_runner = AsyncRunner(self.app, max_workers=1)
+        self.release.clear()
+        first = self.app.aget_query(u"user data", self.loop)
+        second = self.app.aget_query(u"What is this?", self.loop)
+        second.cancel()
+        # Let the loop run the cancellation callbacks
+        self.wait(asyncio.sleep(0, loop=self.loop))
+        self.release.set()
+        self.wait(first)
+        self.assertTrue(second.cancelled())
+        self.assertEqual(self.tagged, [u"user data"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the batch translation.
+"""
+
+import unittest
+
+import quepy
+from quepy.batch import translate, iter_results
+
+
+class TestTranslate(unittest.TestCase):
+    def setUp(self):
+        self.app = quepy.install("testapp")
+
+    def test_result(self):
+        result = translate(self.app, u"user data")
+        target, query, userdata = self.app.get_query(u"user data")
+        self.assertEqual(result[u"question"], u"user data")
+        self.assertEqual(result[u"rule_used"], u"UserData")
+        self.assertEqual(result[u"target"], target)
+        self.assertEqual(result[u"query"], query)
+        self.assertEqual(result[u"userdata"], userdata)
+        self.assertEqual(sorted(result[u"timings"]),
+                         [u"generation", u"matching", u"tagging", u"total"])
+        self.assertNotIn(u"error", result)
+
+    def test_blank(self):
+        result = translate(self.app, u"  ")
+        self.assertIsNone(result[u"rule_used"])
+        self.assertEqual(result[u"timings"], {})
+
+    def test_error(self):
+        def interpret(match):
+            raise ValueError(u"Broken rule")
+
+        for rule in self.app.rules:
+            rule.interpret = interpret
+        result = translate(self.app, u"user data")
+        self.assertEqual(result[u"error"], u"ValueError: Broken rule")
+        self.assertIsNone(result[u"query"])
+        self.assertIn(u"total", result[u"timings"])
+
+
+class TestIterResults(unittest.TestCase):
+    def setUp(self):
+        self.questions = [u"user data", u"What is this?",
+                          u"something something"] * 5
+
+    def check_results(self, results):
+        self.assertEqual([x[u"question"] for x in results], self.questions)
+        self.assertEqual(results[0][u"userdata"], u"<user data>")
+        self.assertEqual(results[1][u"userdata"], 42)
+
+    def test_single_process(self):
+        results = list(iter_results("testapp", iter(self.questions),
+                                    workers=1))
+        self.check_results(results)
+
+    def test_pool(self):
+        results = list(iter_results("testapp", iter(self.questions),
+                                    workers=2, chunk_size=2,
+                                    max_in_flight=1))
+        self.check_results(results)
+
+    def test_install_error(self):
+        results = iter_results("nonexistent_app", self.questions, workers=2)
+        self.assertRaises(ImportError, list, results)
+
+
+if __name__ == "__main__":
+    unittest.main()
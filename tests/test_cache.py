@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the bounded caches.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from threading import Thread, Event
+
+from quepy.cache import LRUCache, LFUCache, SqliteStore, TieredCache, \
+    SingleFlight, sizeof
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get(self):
+        cache = LRUCache()
+        cache[u"a"] = 1
+        self.assertEqual(cache[u"a"], 1)
+        self.assertRaises(KeyError, lambda: cache[u"b"])
+        self.assertEqual(cache.get(u"b", 2), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache[u"a"] = 1
+        cache[u"b"] = 2
+        cache[u"a"]
+        cache[u"c"] = 3
+        self.assertNotIn(u"b", cache)
+        self.assertIn(u"a", cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_bytes(self):
+        size = sizeof(u"a") + sizeof((u"x" * 100,))
+        cache = LRUCache(max_bytes=size * 2)
+        for key in u"abc":
+            cache[key] = (u"x" * 100,)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.bytes, size * 2)
+        # Values larger than the cache aren't stored
+        cache[u"d"] = (u"x" * 1000,)
+        self.assertNotIn(u"d", cache)
+
+    def test_replace_and_clear(self):
+        cache = LRUCache(max_entries=2)
+        cache[u"a"] = 1
+        cache[u"a"] = 2
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache[u"a"], 2)
+        cache.clear()
+        self.assertEqual(cache.stats(), {u"hits": 1, u"misses": 0,
+                                         u"evictions": 0, u"entries": 0,
+                                         u"bytes": 0})
+
+
+class TestLFUCache(unittest.TestCase):
+    def test_evicts_least_frequent(self):
+        cache = LFUCache(max_entries=2)
+        cache[u"a"] = 1
+        cache[u"b"] = 2
+        cache[u"a"]
+        cache[u"a"]
+        cache[u"b"]
+        cache[u"c"] = 3
+        self.assertEqual(sorted(cache._data), [u"a", u"c"])
+        # Among equally used entries the oldest goes first
+        cache[u"c"]
+        cache[u"d"] = 4
+        self.assertEqual(sorted(cache._data), [u"a", u"d"])
+        self.assertEqual(cache.evictions, 2)
+
+    def test_delete(self):
+        cache = LFUCache(max_entries=2)
+        cache[u"a"] = 1
+        cache[u"b"] = 2
+        cache[u"b"]
+        del cache[u"a"]
+        cache[u"c"] = 3
+        cache[u"d"] = 4
+        self.assertEqual(sorted(cache._data), [u"b", u"d"])
+
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, u"store.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_put_get(self):
+        store = SqliteStore(self.path, u"a")
+        self.assertIsNone(store.get(u"key"))
+        store.put(u"key", (u"value", 1, None))
+        store.put(u"key", (u"other", 2, None))
+        self.assertEqual(SqliteStore(self.path, u"a").get(u"key"),
+                         (u"other", 2, None))
+        self.assertEqual(store.keys(), [u"key"])
+
+    def test_namespaces(self):
+        SqliteStore(self.path, u"a").put(u"key", 1)
+        store = SqliteStore(self.path, u"b")
+        self.assertEqual(store.get(u"key", 2), 2)
+        self.assertEqual(store.keys(), [])
+
+
+class TestTieredCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, u"store.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_cache(self, max_entries=None):
+        return TieredCache(LRUCache(max_entries), SqliteStore(self.path, u"a"),
+                           flush_every=3)
+
+    def test_tiers(self):
+        cache = self.make_cache(max_entries=1)
+        cache[u"a"] = 1
+        cache[u"b"] = 2
+        self.assertNotIn(u"a", cache)
+        self.assertEqual(cache[u"a"], 1)
+        self.assertIn(u"a", cache)
+        self.assertRaises(KeyError, lambda: cache[u"c"])
+        stats = cache.stats()
+        self.assertEqual((stats[u"store_hits"], stats[u"store_misses"]),
+                         (1, 1))
+
+        cache = self.make_cache()
+        self.assertEqual(cache.get(u"b"), 2)
+
+    def test_unpicklable(self):
+        cache = self.make_cache()
+        cache[u"a"] = lambda: None
+        self.assertIn(u"a", cache)
+        self.assertIsNone(self.make_cache().get(u"a"))
+
+    def test_warm(self):
+        cache = self.make_cache()
+        for key in u"abc":
+            cache[key] = key.upper()
+        for key in u"cbcc":
+            cache[key]
+        cache.flush()
+
+        cache = self.make_cache()
+        self.assertEqual(cache.warm(2), 2)
+        self.assertEqual(sorted(cache.memory._data), [u"b", u"c"])
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = Event()
+        self.results = []
+
+    def start(self, function, n):
+        def run():
+            try:
+                self.results.append(self.flight.do(u"key", function))
+            except ValueError, error:
+                self.results.append(error)
+
+        threads = [Thread(target=run) for _ in xrange(n)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def wait_in_flight(self, calls):
+        while self.flight.calls < calls:
+            self.release.wait(0.01)
+
+    def test_shared(self):
+        def function():
+            self.release.wait()
+            return object()
+
+        threads = self.start(function, 5)
+        self.wait_in_flight(5)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(self.results)), 1)
+        self.assertEqual(self.flight.stats(), {u"calls": 5, u"executions": 1,
+                                               u"shared": 4, u"in_flight": 0})
+
+        # Nothing is kept once finished
+        self.assertIsNot(self.flight.do(u"key", function), self.results[0])
+
+    def test_exception(self):
+        error = ValueError()
+
+        def function():
+            self.release.wait()
+            raise error
+
+        threads = self.start(function, 3)
+        self.wait_in_flight(3)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.results, [error] * 3)
+
+    def test_share(self):
+        generated = []
+
+        def function():
+            for x in xrange(3):
+                self.release.wait()
+                generated.append(x)
+                yield x
+
+        def run():
+            self.results.append(list(self.flight.share(u"key", function)))
+
+        threads = [Thread(target=run) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        self.wait_in_flight(4)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(generated, [0, 1, 2])
+        self.assertEqual(self.results, [[0, 1, 2]] * 4)
+        self.assertEqual(self.flight.stats(), {u"calls": 4, u"executions": 1,
+                                               u"shared": 3, u"in_flight": 0})
+
+    def test_share_lazy(self):
+        self.release.set()
+        generated = []
+
+        def function():
+            for x in xrange(3):
+                generated.append(x)
+                yield x
+
+        first = self.flight.share(u"key", function)
+        self.assertEqual(next(first), 0)
+        second = self.flight.share(u"key", function)
+        self.assertEqual(list(second), [0, 1, 2])
+        self.assertEqual(next(first), 1)
+        del first
+        self.assertEqual(self.flight.stats()[u"in_flight"], 0)
+
+        self.assertEqual(next(self.flight.share(u"key", function)), 0)
+        self.assertEqual(generated, [0, 1, 2, 0])
+        self.assertEqual(self.flight.stats()[u"in_flight"], 0)
+
+    def test_share_exception(self):
+        error = ValueError()
+
+        def function():
+            yield 1
+            raise error
+
+        first = self.flight.share(u"key", function)
+        second = self.flight.share(u"key", function)
+        self.assertEqual(next(first), 1)
+        self.assertRaises(ValueError, list, first)
+        self.assertEqual(next(second), 1)
+        self.assertRaises(ValueError, next, second)
+        self.assertEqual(self.flight.stats()[u"in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,6 +13,7 @@ Tests for expressions.
 """
 
 import unittest
+from copy import copy
 from quepy.expression import Expression, isnode
 
 
@@ -94,6 +95,15 @@ class ExpressionTests(object):
         a = self.e + other
         self.assertFalse(a is other or self.e is other or a is self.e)
 
+    def test_copy(self):
+        a = copy(self.e)
+        self.assertEqual(a.nodes, self.e.nodes)
+        self.assertEqual(a.get_head(), self.e.get_head())
+        oldnodes = [list(x) for x in self.e.nodes]
+        a.add_data("foo", u"bar")
+        a.decapitate("blabla")
+        self.assertEqual(self.e.nodes, oldnodes)
+
     def test_plus_is_conmutative(self):
         other = Expression()
         other.decapitate("blabla")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the rule set fingerprint.
+"""
+
+import sys
+import unittest
+from types import ModuleType
+from refo import Plus, Question
+
+from quepy.dsl import HasKeyword
+from quepy.parsing import QuestionTemplate, Particle, Lemma, Pos
+from quepy.fingerprint import app_fingerprint, serialize_regex
+
+
+class Thing(Particle):
+    regex = Plus(Pos(u"NN"))
+
+    def interpret(self, match):
+        return HasKeyword(match.words.tokens)
+
+
+class WhatIs(QuestionTemplate):
+    regex = Lemma(u"what") + Lemma(u"be") + Thing() + Question(Pos(u"."))
+
+    def interpret(self, match):
+        return match.thing
+
+
+def make_settings(**values):
+    settings = ModuleType("settings")
+    settings.LANGUAGE = u"sparql"
+    for key, value in values.iteritems():
+        setattr(settings, key, value)
+    return settings
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.parsing = ModuleType("testapp")
+        self.settings = make_settings()
+
+    def fingerprint(self, rules, settings=None):
+        return app_fingerprint(self.parsing, settings or self.settings, rules)
+
+    def test_stable(self):
+        self.assertEqual(self.fingerprint([WhatIs()]),
+                         self.fingerprint([WhatIs()]))
+        self.assertEqual(serialize_regex(WhatIs.regex),
+                         serialize_regex(WhatIs().regex))
+
+    def test_rules(self):
+        class WhatIsHeavy(WhatIs):
+            weight = 2
+
+        class WhatIsNot(WhatIs):
+            def interpret(self, match):
+                return None
+
+        class WhoIs(WhatIs):
+            regex = Lemma(u"who") + Lemma(u"be") + Thing()
+
+        fingerprints = set(self.fingerprint(rules) for rules in
+                           [[], [WhatIs()], [WhatIs(), WhoIs()],
+                            [WhatIsHeavy()], [WhatIsNot()], [WhoIs()]])
+        self.assertEqual(len(fingerprints), 6)
+
+    def test_regex_values(self):
+        self.assertNotEqual(serialize_regex(Lemma(u"what")),
+                            serialize_regex(Lemma(u"who")))
+        self.assertNotEqual(serialize_regex(Lemma(u"what")),
+                            serialize_regex(Pos(u"what")))
+        self.assertNotEqual(serialize_regex(Plus(Pos(u"NN"))),
+                            serialize_regex(Plus(Pos(u"NN"), greedy=False)))
+
+    def test_dsl_constants(self):
+        before = self.fingerprint([WhatIs()])
+        relation = HasKeyword.relation
+        try:
+            HasKeyword.relation = u"rdfs:label"
+            self.assertNotEqual(self.fingerprint([WhatIs()]), before)
+        finally:
+            HasKeyword.relation = relation
+        self.assertEqual(self.fingerprint([WhatIs()]), before)
+
+    def test_helper_functions(self):
+        helpers = ModuleType("testapp.helpers")
+        sys.modules["testapp.helpers"] = helpers
+        try:
+            exec "def keyword(match): return match.words.tokens" in \
+                vars(helpers)
+            before = self.fingerprint([WhatIs()])
+            self.assertEqual(self.fingerprint([WhatIs()]), before)
+            exec "def keyword(match): return match.words.lemmas" in \
+                vars(helpers)
+            self.assertNotEqual(self.fingerprint([WhatIs()]), before)
+        finally:
+            del sys.modules["testapp.helpers"]
+
+    def test_settings(self):
+        settings = make_settings(SPARQL_PREAMBLE=u"PREFIX a: <b>")
+        self.assertNotEqual(self.fingerprint([WhatIs()], settings),
+                            self.fingerprint([WhatIs()]))
+
+    def test_runtime_settings(self):
+        settings = make_settings(QUERY_CACHE_SIZE=10, ASYNC_MAX_WORKERS=8,
+                                 LEMMA_CACHE_PATH=u"lemmas.json")
+        self.assertEqual(self.fingerprint([WhatIs()], settings),
+                         self.fingerprint([WhatIs()]))
+
+    def test_unstable_settings(self):
+        first = make_settings(SPARQL_PREAMBLE=u"", EXTRA=[object()])
+        second = make_settings(SPARQL_PREAMBLE=u"", EXTRA=[object()])
+        self.assertEqual(self.fingerprint([WhatIs()], first),
+                         self.fingerprint([WhatIs()], second))
+        first.EXTRA = {u"b": 1, u"a": (2, make_settings)}
+        second.EXTRA = {u"a": (2, make_settings), u"b": 1}
+        self.assertEqual(self.fingerprint([WhatIs()], first),
+                         self.fingerprint([WhatIs()], second))
+
+
+if __name__ == "__main__":
+    unittest.main()
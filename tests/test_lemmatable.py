@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the lemma table.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from quepy.lemmatable import LemmaTable, write_lemma_table
+
+
+class TestLemmaTable(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, u"lemmas")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get(self):
+        entries = [(u"dogs", u"n", u"dog"), (u"Dogs", u"n", u"dogs"),
+                   (u"ran", u"v", u"run"), (u"ran", None, u"run"),
+                   (u"años", u"n", u"año"), (u"a\0b", u"n", u"x")]
+        self.assertEqual(write_lemma_table(self.path, entries), 5)
+
+        table = LemmaTable(self.path)
+        self.assertEqual(len(table), 5)
+        for token, mtag, lemma in entries[:-1]:
+            self.assertEqual(table.get(token, mtag), lemma)
+            self.assertIsInstance(table.get(token, mtag), unicode)
+        self.assertIsNone(table.get(u"dogs", u"v"))
+        self.assertIsNone(table.get(u"cats", u"n"))
+        self.assertIsNone(table.get(u"a\0b", u"n"))
+        table.close()
+
+    def test_empty(self):
+        write_lemma_table(self.path, [])
+        self.assertIsNone(LemmaTable(self.path).get(u"dogs", u"n"))
+
+    def test_not_a_table(self):
+        with open(self.path, "w") as table_file:
+            table_file.write("something else")
+        self.assertRaises(ValueError, LemmaTable, self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the lookup tagger.
+"""
+
+import os
+import sys
+import codecs
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import quepy
+from quepy.tagger import Word
+from quepy.lookuptagger import LookupTagger, get_lookup_tagger, \
+    write_lexicon
+
+
+class TestLookupTagger(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, u"lexicon.tsv")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, text):
+        with codecs.open(self.path, "w", encoding="utf-8") as lexicon_file:
+            lexicon_file.write(text)
+
+    def tags(self, tagger, string):
+        return [unicode(x) for x in tagger.tag(string)]
+
+    def test_default_lexicon(self):
+        tagger = get_lookup_tagger()
+        self.assertIs(get_lookup_tagger(), tagger)
+        self.assertEqual(self.tags(tagger, u"Who directed Pulp Fiction?"),
+                         [u"Who|who|WP|None", u"directed|direct|VBN|None",
+                          u"Pulp|pulp|NNP|None", u"Fiction|fiction|NNP|None",
+                          u"?|?|.|None"])
+
+    def test_rules(self):
+        self.write(u"# Comment\n"
+                   u"Is\tVBZ\tbe\n"
+                   u"\n"
+                   u"*s\tNNS\t\n"
+                   u"*ies\tNNS\ty\n"
+                   u"*ing\tVBG\t=\n")
+        tagger = LookupTagger(self.path)
+        self.assertEqual(self.tags(tagger, u"Is it cities walking dogs 42 #"),
+                         [u"Is|be|VBZ|None", u"it|it|NN|None",
+                          u"cities|city|NNS|None",
+                          u"walking|walking|VBG|None", u"dogs|dog|NNS|None",
+                          u"42|42|CD|None", u"#|#|SYM|None"])
+        # Too short for the rules
+        self.assertEqual(self.tags(tagger, u"is"), [u"is|is|NN|None"])
+        words = tagger.tag(u"El Niño")
+        self.assertEqual([(x.token, x.lemma, x.pos) for x in words],
+                         [(u"El", u"el", u"NNP"), (u"Niño", u"niño", u"NNP")])
+
+    def test_invalid(self):
+        self.write(u"dogs\tNNS\n")
+        self.assertRaises(ValueError, LookupTagger, self.path)
+
+    def test_version(self):
+        self.write(u"dogs\tNNS\tdog\n")
+        version = LookupTagger(self.path).version
+        self.assertEqual(LookupTagger(self.path).version, version)
+        self.write(u"dogs\tNNS\tdogs\n")
+        self.assertNotEqual(LookupTagger(self.path).version, version)
+
+    def test_write_lexicon(self):
+        sentences = [[Word(u"Who", u"who", u"WP"), Word(u"run", u"run", u"VB")],
+                     [Word(u"run", u"run", u"NN"), Word(u"run", u"run", u"NN")]]
+        self.assertEqual(write_lexicon(self.path, sentences), 2)
+
+        tagger = LookupTagger(self.path)
+        self.assertEqual(tagger.lexicon, {u"Who": (u"WP", u"who"),
+                                          u"run": (u"NN", u"run")})
+        self.assertEqual(tagger.rules, LookupTagger().rules)
+
+    def test_without_nltk(self):
+        code = "import sys, quepy.lookuptagger; print 'nltk' in sys.modules"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(
+            quepy.__file__)))
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd=root)
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the rule matcher.
+"""
+
+import random
+import unittest
+
+import refo
+from refo import Star, Plus, Question, Group, Any, Literal, Predicate
+
+from quepy.tagger import Word, TaggedSentence
+from quepy.parsing import QuestionTemplate, Particle, Lemma, Pos, PosPrefix, \
+    _EOL
+from quepy.matcher import RuleMatcher, Program, SymbolTable, WordSet, \
+    UNKNOWN, collapse_disjunctions, simplify_repetitions, match
+
+_LEMMAS = u"a b c".split()
+_TAGS = u"NN NNS VB".split()
+
+
+def random_leaf():
+    x = random.random()
+    if x < 0.1:
+        return Any()
+    if x < 0.2:
+        return PosPrefix(u"NN")
+    if x < 0.4:
+        return Pos(random.choice(_TAGS))
+    return Lemma(random.choice(_LEMMAS))
+
+
+def random_pattern(depth=3):
+    if depth == 0 or random.random() < 0.2:
+        return random_leaf()
+    kind = random.randint(0, 6)
+    x = random_pattern(depth - 1)
+    greedy = random.random() < 0.7
+    if kind == 0:
+        return x + random_pattern(depth - 1)
+    if kind == 1:
+        return x | random_pattern(depth - 1)
+    if kind == 2:
+        return Star(x, greedy=greedy)
+    if kind == 3:
+        return Plus(x, greedy=greedy)
+    if kind == 4:
+        return Question(x, greedy=greedy)
+    if kind == 5:
+        return x * (random.randint(0, 1), random.randint(1, 3))
+    return Group(x, random.randint(0, 3))
+
+
+def random_words():
+    lemmas = random.sample(_LEMMAS * 3, random.randint(0, 6))
+    return [Word(x, x, random.choice(_TAGS)) for x in lemmas]
+
+
+def lazy_sentence(words, calls):
+    # The words as a TaggedSentence that lemmatizes lazily
+    lemmas = dict((x.token, x.lemma) for x in words)
+
+    def lemmatize(token, pos):
+        calls.append(token)
+        return lemmas[token]
+
+    return TaggedSentence([x.token for x in words],
+                          tags=[x.pos for x in words], lemmatize=lemmatize)
+
+
+def make_rule(pattern):
+    class Rule(QuestionTemplate):
+        regex = pattern
+
+    return Rule()
+
+
+def refo_state(pattern, words):
+    match = refo.match(pattern + Literal(_EOL), words + [_EOL])
+    if match is None:
+        return None
+    return match.state
+
+
+class TestMatch(unittest.TestCase):
+    def test_against_refo(self):
+        random.seed(7)
+        for _ in xrange(1000):
+            pattern = random_pattern()
+            words = random_words()
+            result = match(pattern, words)
+            expected = refo_state(pattern, words)
+            if expected is None:
+                self.assertIsNone(result)
+            else:
+                self.assertEqual(result.state, expected)
+
+    def test_long_question(self):
+        nouns = Plus(Pos(u"NN") | Pos(u"NNP"))
+        pattern = Plus(nouns) + Plus(nouns) + Question(Pos(u"."))
+        words = [Word(u"x", u"x", u"NN") for _ in xrange(200)]
+        self.assertEqual(match(pattern, words).span(), (0, 201))
+        words.append(Word(u"x", u"x", u"DT"))
+        self.assertIsNone(match(pattern, words))
+
+
+class TestRuleMatcher(unittest.TestCase):
+    def test_against_refo(self):
+        random.seed(42)
+        for _ in xrange(300):
+            rules = [make_rule(random_pattern()) for _ in xrange(3)]
+            matcher = RuleMatcher(rules)
+            for _ in xrange(10):
+                words = random_words()
+                result = dict((rule, match.state) for rule, match
+                              in matcher.match(words))
+                for rule in rules:
+                    expected = refo_state(rule.regex, words)
+                    self.assertEqual(result.get(rule), expected,
+                                     "{!r} over {!r}".format(rule.regex,
+                                                             words))
+
+    def test_lazy_lemmas_against_refo(self):
+        random.seed(11)
+        for _ in xrange(300):
+            rules = [make_rule(random_pattern()) for _ in xrange(3)]
+            matcher = RuleMatcher(rules)
+            for _ in xrange(10):
+                words = random_words()
+                sentence = lazy_sentence(words, [])
+                result = dict((rule, match.state) for rule, match
+                              in matcher.match(sentence))
+                for rule in rules:
+                    self.assertEqual(result.get(rule),
+                                     refo_state(rule.regex, words))
+
+    def test_rule_order(self):
+        rules = [make_rule(Star(Any())) for _ in xrange(5)]
+        matcher = RuleMatcher(rules)
+        words = [Word(u"a", u"a")]
+        self.assertEqual([rule for rule, _ in matcher.match(words)], rules)
+        subset = rules[3:0:-1]
+        self.assertEqual([rule for rule, _ in matcher.match(words, subset)],
+                         subset)
+
+    def test_particles(self):
+        class Thing(Particle):
+            regex = Plus(Pos(u"NN"))
+
+        rule = make_rule(Lemma(u"what") + Lemma(u"be") + Thing())
+        words = [Word(u"What", u"what", u"WP"), Word(u"is", u"be", u"VBZ"),
+                 Word(u"a", u"a", u"DT")]
+        self.assertEqual(RuleMatcher([rule]).match(words), [])
+
+        words[-1] = Word(u"car", u"car", u"NN")
+        [(_, match)] = RuleMatcher([rule]).match(words)
+        particle = [x for x in match if isinstance(x, Thing)][0]
+        self.assertEqual(match[particle], (2, 3))
+        self.assertEqual(match.span(), (0, 4))
+
+
+class TestCollapseDisjunctions(unittest.TestCase):
+    def test_same_attribute(self):
+        pattern = Pos(u"NN") | Pos(u"NNS") | PosPrefix(u"VB")
+        result = collapse_disjunctions(pattern)
+        self.assertIsInstance(result, WordSet)
+        self.assertEqual(result.attr, u"pos")
+        self.assertEqual(result.values, frozenset([u"NN", u"NNS"]))
+        self.assertEqual(result.prefixes, (u"VB",))
+
+    def test_mixed_attributes(self):
+        other = Predicate(lambda x: True)
+        pattern = Pos(u"NN") | Lemma(u"a") | other | Pos(u"NNS") | \
+            Lemma(u"b")
+        result = collapse_disjunctions(pattern)
+        alternatives = [result.a.a, result.a.b, result.b]
+        self.assertEqual([type(x) for x in alternatives],
+                         [WordSet, WordSet, Predicate])
+        self.assertEqual(alternatives[0].values, frozenset([u"NN", u"NNS"]))
+        self.assertEqual(alternatives[1].values, frozenset([u"a", u"b"]))
+        self.assertIs(alternatives[2], other)
+
+    def test_nested(self):
+        class Thing(Particle):
+            regex = Plus(Lemma(u"a") | Lemma(u"b"))
+
+        thing = Thing()
+        pattern = Lemma(u"c") + Star(Question(thing) + Lemma(u"d"))
+        result = collapse_disjunctions(pattern)
+        group = result.xs[1].x.xs[0].x
+        self.assertIs(group.key, thing)
+        self.assertIsInstance(group.x.x, WordSet)
+        # Untouched parts are reused and the original is not modified
+        self.assertIs(result.xs[0], pattern.xs[0])
+        self.assertIsInstance(thing.x.x, type(Lemma(u"a") | Lemma(u"b")))
+
+    def test_not_collapsed(self):
+        pattern = Lemma(u"a") | (Lemma(u"b") + Lemma(u"c"))
+        self.assertIs(collapse_disjunctions(pattern), pattern)
+
+
+def random_repetition(x):
+    kind = random.choice([Star, Plus, Question])
+    return kind(x, greedy=random.random() < 0.7)
+
+
+class TestSimplifyRepetitions(unittest.TestCase):
+    def test_nested(self):
+        x = Lemma(u"a")
+        self.assertIsInstance(simplify_repetitions(Star(Plus(x))), Star)
+        self.assertIsInstance(simplify_repetitions(Plus(Question(x))), Star)
+        self.assertIsInstance(simplify_repetitions(Plus(Plus(x))), Plus)
+        result = simplify_repetitions(Star(Star(Star(x))))
+        self.assertIs(result.x, x)
+
+    def test_adjacent(self):
+        nouns = Pos(u"NN") | Pos(u"NNS")
+        result = simplify_repetitions(Plus(nouns) + Star(Pos(u"NN") |
+                                                         Pos(u"NNS")))
+        self.assertIsInstance(result, Plus)
+        result = simplify_repetitions(Lemma(u"a") + Star(nouns) +
+                                      Star(nouns) + Lemma(u"b"))
+        self.assertEqual(len(result.xs), 3)
+
+    def test_not_simplified(self):
+        patterns = [
+            Star(Plus(Group(Lemma(u"a"), 0))),
+            Star(Plus(Lemma(u"a"), greedy=False)),
+            Plus(Lemma(u"a")) + Plus(Lemma(u"b")),
+            Star(Lemma(u"a") + Plus(Lemma(u"b"))),
+        ]
+        for pattern in patterns:
+            self.assertIs(simplify_repetitions(pattern), pattern)
+
+    def test_against_refo(self):
+        random.seed(3)
+        for _ in xrange(1000):
+            x = random_pattern(1)
+            if random.random() < 0.5:
+                pattern = random_repetition(random_repetition(x))
+            else:
+                pattern = random_repetition(x) + random_repetition(x)
+            pattern = Group(random_pattern(1), 0) + pattern + \
+                Group(random_pattern(1), 1)
+            words = random_words()
+            result = match(simplify_repetitions(pattern), words)
+            expected = refo_state(pattern, words)
+            if expected is None:
+                self.assertIsNone(result)
+            else:
+                self.assertEqual(result.state, expected,
+                                 "{!r} over {!r}".format(pattern, words))
+
+
+class TestSymbolTable(unittest.TestCase):
+    def test_encode(self):
+        symbols = SymbolTable()
+        a = symbols.add(u"a")
+        b = symbols.add(u"b")
+        self.assertEqual(symbols.add(u"a"), a)
+        self.assertNotEqual(a, b)
+        self.assertNotIn(UNKNOWN, [a, b])
+        self.assertEqual(len(symbols), 3)
+        self.assertEqual(list(symbols.encode([u"b", u"c", None, u"a"])),
+                         [b, UNKNOWN, UNKNOWN, a])
+
+
+class TestPredicateTable(unittest.TestCase):
+    def test_hash_consing(self):
+        program = Program()
+        program.add(Lemma(u"list") + Pos(u"NN"), 0)
+        program.add(Lemma(u"list") + Star(Any()) + Lemma(u"list"), 1)
+        program.add(Any() + Literal(None) + Literal(None), 2)
+        # lemma list, pos NN, Any, Literal(None)
+        self.assertEqual(len(program.predicates), 4)
+
+    def test_rows(self):
+        program = Program()
+        program.add(Lemma(u"a") + Pos(u"NN") + Any() + Literal(None), 0)
+        words = [Word(u"a", u"a", u"NN"), Word(u"b", u"b", u"NN"),
+                 Word(u"A", u"a", u"DT")]
+        table = program.table(words)
+        self.assertEqual(table.rows, [0b0101, 0b0011, 0b1111, 0b1000])
+
+    def test_codes(self):
+        program = Program()
+        program.add(Lemma(u"a") + Lemma(u"b") + Pos(u"a"), 0)
+        words = [Word(u"a", u"a", u"NN"), Word(u"b", u"b", u"a")]
+        table = program.table(words)
+        a, b = program.symbols.encode([u"a", u"b"])
+        self.assertEqual(list(table.codes[u"lemma"]), [a, b])
+        self.assertEqual(list(table.codes[u"pos"]), [UNKNOWN, a])
+        self.assertNotIn(u"token", table.codes)
+        self.assertEqual(table.rows, [0b001, 0b010, 0b010])
+
+    def test_lazy_rows(self):
+        calls = []
+
+        def predicate(word):
+            calls.append(word)
+            return word is not None and word.token == u"b"
+
+        program = Program()
+        program.add(Lemma(u"a") + Predicate(predicate), 0)
+        words = [Word(u"b", u"b"), Word(u"b", u"b")]
+        table = program.table(words)
+        self.assertEqual(table.rows[1], None)
+        self.assertEqual(match(Lemma(u"a") + Predicate(predicate), words),
+                         None)
+        self.assertEqual(calls, [])
+        self.assertEqual(table.row(1), 0b011)
+        self.assertEqual(len(calls), 3)
+
+    def test_lazy_lemmas(self):
+        calls = []
+        pattern = Pos(u"NN") + Lemma(u"a")
+        words = [Word(u"x", u"x", u"DT"), Word(u"A", u"a", u"NN")]
+        self.assertIsNone(match(pattern, lazy_sentence(words, calls)))
+        self.assertEqual(calls, [])
+
+        words = [Word(u"x", u"x", u"NN"), Word(u"A", u"a", u"NN"),
+                 Word(u"y", u"y", u"NN")]
+        sentence = lazy_sentence(words, calls)
+        self.assertIsNone(match(pattern, sentence))
+        self.assertEqual(calls, [u"A"])
+        self.assertEqual(match(pattern, sentence[:2]).span(), (0, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,19 +12,114 @@
 Tests for nltktagger.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
+from threading import Thread
+
+import nltk
 from quepy import nltktagger
-from quepy.tagger import Word
+from quepy.tagger import Word, TaggedSentence
 
 
 class TestNLTKTagger(unittest.TestCase):
     def test_word_output(self):
         output = nltktagger.run_nltktagger(u"this is a test case «¢ðßæŋħħ")
 
-        self.assertIsInstance(output, list)
+        self.assertIsInstance(output, TaggedSentence)
         for word in output:
             self.assertIsInstance(word, Word)
 
+    def test_batch(self):
+        strings = [u"Who is Tom Cruise?", u"", u"List movies by Tom Cruise"]
+        output = nltktagger.run_nltktagger_batch(strings)
+        self.assertEqual(len(output), 3)
+        for string, words in zip(strings, output):
+            expected = nltktagger.run_nltktagger(string)
+            self.assertEqual([unicode(x) for x in words],
+                             [unicode(x) for x in expected])
+
+    def test_lazy_lemmas(self):
+        tagger = nltktagger.Tagger(lemma_cache_size=100)
+        words = tagger.tag(u"Who are the actors?")
+        self.assertFalse(words.lemmatized())
+        self.assertEqual(tagger.lemma_stats()[u"misses"], 0)
+        self.assertEqual(words[3].lemma, u"actor")
+        self.assertEqual(tagger.lemma_stats()[u"misses"], 1)
+        self.assertEqual(words.lemmas,
+                         [x.lemma for x in nltktagger.Tagger().tag(
+                          u"Who are the actors?")])
+
     def tests_wrong_input(self):
         self.assertRaises(ValueError, nltktagger.run_nltktagger,
                           "this is not unicode")
+
+    def test_shared_tagger(self):
+        tagger = nltktagger.get_nltk_tagger()
+        self.assertIs(tagger, nltktagger.get_nltk_tagger([]))
+
+        path = list(nltk.data.path)
+        strings = [u"Who is Tom Cruise?", u"List movies by Tom Cruise",
+                   u"What is the capital of Spain?"] * 10
+        expected = [[unicode(x) for x in tagger.tag(string)]
+                    for string in strings]
+        results = [None] * len(strings)
+
+        def tag(i):
+            results[i] = [unicode(x) for x in tagger.tag(strings[i])]
+
+        threads = [Thread(target=tag, args=(i,))
+                   for i in xrange(len(strings))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, expected)
+        self.assertEqual(nltk.data.path, path)
+
+    def test_lemma_cache(self):
+        tagger = nltktagger.Tagger(lemma_cache_size=100)
+        first = [unicode(x) for x in tagger.tag(u"Who are the actors?")]
+        second = [unicode(x) for x in tagger.tag(u"Who are the actors?")]
+        self.assertEqual(first, second)
+        self.assertEqual(first, [unicode(x) for x in nltktagger.Tagger().tag(
+                                 u"Who are the actors?")])
+        stats = tagger.lemma_stats()
+        self.assertEqual((stats[u"hits"], stats[u"misses"]), (5, 5))
+        self.assertEqual(stats[u"hit_rate"], 0.5)
+
+    def test_lemma_dump(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, u"lemmas.json")
+            tagger = nltktagger.Tagger(lemma_cache_size=100)
+            expected = [unicode(x) for x in tagger.tag(u"Who are the actors?")]
+            tagger.dump_lemmas(path)
+
+            tagger = nltktagger.Tagger(lemma_cache_size=100)
+            self.assertEqual(tagger.load_lemmas(path), 5)
+            tagger._load_wordnet = None  # Must not be needed
+            self.assertEqual([unicode(x) for x in
+                              tagger.tag(u"Who are the actors?")], expected)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_lemma_table(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, u"lemmas")
+            words = [u"Who", u"are", u"the", u"actors", u"?", u"ran"]
+            nltktagger.Tagger().build_lemma_table(path, words)
+
+            tagger = nltktagger.Tagger(lemma_table_path=path)
+            expected = nltktagger.Tagger()
+            for word in words:
+                for mtag in [None, u"n", u"v", u"a", u"r"]:
+                    self.assertEqual(tagger.lemma_table.get(word, mtag),
+                                     expected.lemmatize(word, mtag))
+            # From the exception lists
+            self.assertEqual(tagger.lemma_table.get(u"geese", u"n"),
+                             expected.lemmatize(u"geese", u"n"))
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the NumPy tagger.
+"""
+
+import unittest
+
+from tagger_training import QUESTIONS, train_perceptron
+
+try:
+    from quepy.numpytagger import PerceptronMatrix
+except ImportError:
+    PerceptronMatrix = None
+
+
+@unittest.skipIf(PerceptronMatrix is None, u"NumPy isn't installed")
+class TestPerceptronMatrix(unittest.TestCase):
+    def setUp(self):
+        self.perceptron = train_perceptron()
+        self.sentences = [x.split() for x in QUESTIONS]
+
+    def assertSameTags(self, perceptron):
+        matrix = PerceptronMatrix(perceptron)
+        self.assertEqual(matrix.tag(self.sentences),
+                         [perceptron.tag(x) for x in self.sentences])
+
+    def test_same_tags(self):
+        self.assertSameTags(self.perceptron)
+
+    def test_without_tagdict(self):
+        self.perceptron.tagdict = {}
+        self.assertSameTags(self.perceptron)
+
+    def test_ties(self):
+        # Every class gets the same score, NLTK picks the last alphabetically
+        for weights in self.perceptron.model.weights.values():
+            for label in weights:
+                weights[label] = 0.5
+        self.perceptron.tagdict = {}
+        self.assertSameTags(self.perceptron)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,8 +13,10 @@ Tests for Regex module.
 """
 
 import unittest
-from quepy.parsing import QuestionTemplate, Particle, Lemma
-from quepy.tagger import Word
+from refo import Plus, Question
+from quepy.parsing import QuestionTemplate, Particle, Lemma, Pos, WordList
+from quepy.expression import Expression
+from quepy.tagger import Word, TaggedSentence
 
 
 class Mockrule(object):
@@ -86,6 +88,36 @@ class TestQuestionTemplate(unittest.TestCase):
         match, _ = SomeRegex().get_interpretation(words)
         self.assertEqual(words, match.words)
 
+    def test_match_tagged_sentence(self):
+        class SomeRegex(QuestionTemplate):
+            regex = Lemma(u"be") + Plus(Pos(u"NNP"))
+
+            def interpret(self, match):
+                return match
+
+        words = TaggedSentence.from_words([Word(u"is", u"be", u"VBZ"),
+                                           Word(u"Tom", u"tom", u"NNP"),
+                                           Word(u"Cruise", u"cruise", u"NNP")])
+        match, _ = SomeRegex().get_interpretation(words)
+        self.assertEqual(match.words, list(words))
+        self.assertEqual(match.words.tokens, u"is Tom Cruise")
+        self.assertEqual(match.words[1:].lemmas, u"tom cruise")
+
+
+class TestWordList(unittest.TestCase):
+    def test_view(self):
+        words = [Word(x, x.lower()) for x in u"Who is Tom Cruise".split()]
+        view = WordList(words, 1, 10)
+        self.assertEqual(len(view), 3)
+        self.assertEqual(view, words[1:])
+        self.assertIs(view[0], words[1])
+        self.assertEqual(view[1:].tokens, u"Tom Cruise")
+        self.assertEqual(view[-1:].lemmas, u"cruise")
+        self.assertEqual(view[::2], [words[1], words[3]])
+        self.assertEqual(len(view[2:1]), 0)
+        self.assertRaises(IndexError, lambda: view[3])
+        self.assertEqual(words[:1] + view, words)
+
 
 class TestParticle(unittest.TestCase):
     def setUp(self):
@@ -124,5 +156,68 @@ class TestParticle(unittest.TestCase):
         self.assertRaises(AttributeError, lambda: match.personasset.another)
 
 
+class TestParticleCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = calls = []
+
+        class Thing(Particle):
+            regex = Plus(Pos(u"NN"))
+
+            def interpret(self, match):
+                calls.append(match.words.tokens)
+                expression = Expression()
+                expression.add_data(u"name", match.words.tokens)
+                return expression
+
+        class WhatIs(QuestionTemplate):
+            regex = Lemma(u"what") + Lemma(u"be") + Thing() + \
+                Question(Pos(u"."))
+
+            def interpret(self, match):
+                return match.thing
+
+        class WhatIsIt(QuestionTemplate):
+            regex = Lemma(u"what") + Lemma(u"be") + Thing() + Pos(u".")
+
+            def interpret(self, match):
+                expression = match.thing
+                expression.decapitate(u"is")
+                return expression
+
+        self.whatis = WhatIs()
+        self.whatisit = WhatIsIt()
+        self.words = [Word(u"What", u"what", u"WP"),
+                      Word(u"is", u"be", u"VBZ"),
+                      Word(u"a", u"a", u"NN"), Word(u"car", u"car", u"NN"),
+                      Word(u"?", u"?", u".")]
+
+    def test_shared_between_rules(self):
+        cache = {}
+        a, _ = self.whatisit.get_interpretation(self.words, cache=cache)
+        b, _ = self.whatis.get_interpretation(self.words, cache=cache)
+        self.assertEqual(self.calls, [u"a car"])
+        # Modifying an interpretation doesn't change the cached one
+        self.assertEqual(len(a), 2)
+        self.assertEqual(len(b), 1)
+
+    def test_repeated_access(self):
+        class Twice(QuestionTemplate):
+            regex = self.whatis.regex
+
+            def interpret(self, match):
+                return match.thing + match.thing
+
+        expression, _ = Twice().get_interpretation(self.words)
+        self.assertEqual(self.calls, [u"a car"])
+        self.assertEqual(list(expression.iter_edges(expression.head)),
+                         [(u"name", u"a car"), (u"name", u"a car")])
+
+    def test_different_spans(self):
+        cache = {}
+        self.whatis.get_interpretation(self.words, cache=cache)
+        self.whatis.get_interpretation(self.words[:3], cache=cache)
+        self.assertEqual(self.calls, [u"a car", u"a"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -12,9 +12,18 @@
 Tests for QuepyApp.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
+from types import ModuleType
+from importlib import import_module
+from threading import Thread, Event
 
 import quepy
+from quepy import settings
+from quepy.quepyapp import QuepyApp
+from quepy.cache import LRUCache
 
 
 class TestQuepyApp(unittest.TestCase):
@@ -22,6 +31,17 @@ class TestQuepyApp(unittest.TestCase):
     def setUp(self):
         self.app = quepy.install("testapp")
 
+    def test_get_query_stops_at_first(self):
+        rule = [x for x in self.app.rules
+                if type(x).__name__ == "LowMatchAny"][0]
+
+        def interpret(match):
+            raise AssertionError("Lower weight rule interpreted")
+
+        rule.interpret = interpret
+        target, query, userdata = self.app.get_query(u"user data")
+        self.assertEqual(userdata, "<user data>")
+
     def test_get_query_types(self):
         question = "What is this?"
         target, query, userdata = self.app.get_query(question)
@@ -40,8 +60,171 @@ class TestQuepyApp(unittest.TestCase):
         self.assertEqual(userdata, 42)
 
     def test_config_is_saved(self):
-        from quepy import settings
-        self.assertIn("testapp", settings.SPARQL_PREAMBLE)
+        self.assertIn("testapp", self.app.settings.SPARQL_PREAMBLE)
+        self.assertIsInstance(self.app.settings.SPARQL_PREAMBLE, unicode)
+        self.assertEqual(self.app.settings.DEFAULT_ENCODING,
+                         settings.DEFAULT_ENCODING)
+
+    def test_config_is_isolated(self):
+        other_settings = ModuleType("settings")
+        other_settings.LANGUAGE = "sparql"
+        other_settings.SPARQL_PREAMBLE = u"PREFIX other: <other#>"
+        other = QuepyApp(import_module("testapp"), other_settings)
+
+        self.assertNotIn("testapp", settings.SPARQL_PREAMBLE)
+        _, query, _ = self.app.get_query(u"user data")
+        self.assertIn("testapp", query)
+        _, query, _ = other.get_query(u"user data")
+        self.assertIn("other", query)
+        self.assertNotIn("testapp", query)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.app = quepy.install("testapp")
+        self.tagged = []
+        batch_tagger = self.app.batch_tagger
+
+        def counting_tagger(questions):
+            self.tagged.append(questions)
+            return batch_tagger(questions)
+
+        self.app.batch_tagger = counting_tagger
+        self.questions = [u"user data", u"What is this?", u"user  data",
+                          u"something something", u"user data"]
+
+    def test_same_as_get_queries(self):
+        result = self.app.get_queries_batch(self.questions)
+        self.assertEqual(result, [list(self.app.get_queries(x))
+                                  for x in self.questions])
+        self.assertEqual(self.app.get_query_batch(self.questions),
+                         [self.app.get_query(x) for x in self.questions])
+
+    def test_tagged_once(self):
+        self.app.get_queries_batch(self.questions)
+        self.assertEqual(self.tagged, [[u"user data", u"What is this?",
+                                        u"something something"]])
+
+    def test_get_query_batch_stops_at_first(self):
+        rule = [x for x in self.app.rules
+                if type(x).__name__ == "LowMatchAny"][0]
+
+        def interpret(match):
+            raise AssertionError("Lower weight rule interpreted")
+
+        rule.interpret = interpret
+        result = self.app.get_query_batch([u"user data", u"What is this?"])
+        self.assertEqual(result[0][2], "<user data>")
+
+    def test_cache(self):
+        self.app.cache = LRUCache()
+        self.app.get_queries_batch(self.questions[:2])
+        self.app.get_queries_batch(self.questions)
+        self.assertEqual(self.tagged[-1], [u"something something"])
+        self.assertEqual(self.app.cache.hits, 2)
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = quepy.install("testapp", cache=LRUCache(max_entries=10))
+        self.tagged = []
+        tagger = self.app.tagger
+
+        def counting_tagger(question):
+            self.tagged.append(question)
+            return tagger(question)
+
+        self.app.tagger = counting_tagger
+
+    def test_hit_skips_tagging(self):
+        first = list(self.app.get_queries(u"What is this?"))
+        second = list(self.app.get_queries(u"  What is   this? "))
+        self.assertEqual(first, second)
+        self.assertEqual(self.tagged, [u"What is this?"])
+        self.assertEqual((self.app.cache.hits, self.app.cache.misses), (1, 1))
+
+    def test_get_query(self):
+        first = self.app.get_query(u"user data")
+        self.assertEqual(self.app.get_query(u"user data"), first)
+        self.assertEqual(first[2], "<user data>")
+        self.assertEqual(len(self.tagged), 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    cached = True
+
+    def setUp(self):
+        cache = LRUCache(max_entries=10) if self.cached else None
+        self.app = quepy.install("testapp", cache=cache)
+        self.assertEqual(self.app.cache is not None, self.cached)
+        self.tagged = []
+        self.release = Event()
+        tagger = self.app.tagger
+
+        def blocking_tagger(question):
+            self.release.wait()
+            self.tagged.append(question)
+            return tagger(question)
+
+        self.app.tagger = blocking_tagger
+
+    def test_concurrent_questions(self):
+        results = []
+        questions = [u"user data", u" user data", u"What is this?"] * 3
+        threads = [Thread(target=lambda x: results.append(
+                          list(self.app.get_queries(x))), args=(x,))
+                   for x in questions]
+        for thread in threads:
+            thread.start()
+        while self.app.single_flight.calls < len(questions):
+            self.release.wait(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(x.strip() for x in self.tagged),
+                         [u"What is this?", u"user data"])
+        self.assertEqual(len(results), len(questions))
+        self.assertEqual(self.app.single_flight.executions, 2)
+        self.assertEqual(self.app.single_flight.shared, 7)
+
+
+class TestSingleFlightUncached(TestSingleFlight):
+    cached = False
+
+
+class TestPersistentQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.settings = settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_PATH
+        settings.QUERY_CACHE_SIZE = 10
+        settings.QUERY_CACHE_PATH = os.path.join(self.tmpdir, u"q.sqlite")
+
+    def tearDown(self):
+        settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_PATH = self.settings
+        shutil.rmtree(self.tmpdir)
+
+    def test_restart(self):
+        app = quepy.install("testapp")
+        query = app.get_query(u"user data")
+        app.cache.flush()
+
+        app = quepy.install("testapp")
+        self.assertIn(u"user data", app.cache)
+        app.tagger = None  # Not needed
+        self.assertEqual(app.get_query(u"user data"), query)
+
+    def test_rules_changed(self):
+        app = quepy.install("testapp")
+        app.get_query(u"user data")
+        app.cache.flush()
+
+        app = quepy.install("testapp")
+        app.fingerprint = u"other"
+        self.assertIsNone(app._make_cache().get(u"user data"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the static analysis of regexes.
+"""
+
+import unittest
+from refo import Star, Plus, Question, Any
+
+from quepy.parsing import QuestionTemplate, Particle, Lemma, Pos, PosPrefix
+from quepy.ruleanalysis import analyze, analyze_rules, NESTED, ADJACENT
+
+nouns = Pos(u"NN") | Pos(u"NNS")
+
+
+class Thing(Particle):
+    regex = Plus(Question(Pos(u"DT")) + Plus(nouns))
+
+
+class TestAnalyze(unittest.TestCase):
+    def test_unambiguous(self):
+        regexes = [
+            Lemma(u"what") + Lemma(u"be") + Plus(nouns),
+            Plus(nouns) + Pos(u"IN") + Plus(nouns),
+            Plus(Pos(u"NN")) + Plus(Pos(u"VB")),
+            Star(Lemma(u"a") + Lemma(u"b")),
+        ]
+        for regex in regexes:
+            self.assertEqual(analyze(regex), [], repr(regex))
+
+    def test_nested_rewritten(self):
+        [finding] = analyze(Star(Plus(nouns)), u"rule", length=10)
+        self.assertEqual(finding.rule, u"rule")
+        self.assertEqual(finding.kind, NESTED)
+        self.assertEqual(finding.paths, 2 ** 9)
+        self.assertTrue(finding.rewritten)
+
+    def test_nested(self):
+        [finding] = analyze(Plus(Question(Pos(u"DT")) + Plus(nouns)))
+        self.assertEqual(finding.kind, NESTED)
+        self.assertFalse(finding.rewritten)
+
+    def test_adjacent(self):
+        regex = Plus(nouns) + Star(Any()) + Plus(PosPrefix(u"NN"))
+        [finding] = analyze(regex, length=10)
+        self.assertEqual(finding.kind, ADJACENT)
+        self.assertEqual(finding.paths, 66)  # 3 repetitions over 10 words
+        self.assertFalse(finding.rewritten)
+        self.assertGreater(finding.steps, 10)
+
+        [finding] = analyze(Plus(nouns) + Plus(nouns))
+        self.assertTrue(finding.rewritten)
+
+    def test_particles(self):
+        class Rule1(QuestionTemplate):
+            regex = Lemma(u"who") + Thing()
+
+        class Rule2(QuestionTemplate):
+            regex = Lemma(u"what") + Thing()
+
+        findings = analyze_rules([Rule1(), Rule2()])
+        self.assertEqual([x.rule for x in findings], [u"Thing"])
+
+
+if __name__ == "__main__":
+    unittest.main()
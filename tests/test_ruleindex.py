@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the rule index.
+"""
+
+import unittest
+from refo import Star, Plus, Question, Any, Predicate
+
+from quepy.tagger import Word, TaggedSentence
+from quepy.parsing import QuestionTemplate, Particle, Lemma, Lemmas, Pos, \
+    Token
+from quepy.ruleindex import required_features, RuleIndex
+
+
+def features(*alternatives):
+    return frozenset(frozenset(x) for x in alternatives)
+
+
+class Thing(Particle):
+    regex = Plus(Pos(u"NN") | Pos(u"NNP"))
+
+
+class TestRequiredFeatures(unittest.TestCase):
+    def test_predicates(self):
+        self.assertEqual(required_features(Lemma(u"list")),
+                         features([(u"lemma", u"list")]))
+        self.assertEqual(required_features(Token(u"list")),
+                         features([(u"token", u"list")]))
+        self.assertEqual(required_features(Pos(u"NN")),
+                         features([(u"pos", u"NN")]))
+        self.assertEqual(required_features(Any()), features([]))
+        self.assertEqual(required_features(Predicate(lambda x: True)),
+                         features([]))
+
+    def test_concatenation(self):
+        regex = Lemmas(u"what be") + Pos(u"DT")
+        expected = features([(u"lemma", u"what"), (u"lemma", u"be"),
+                             (u"pos", u"DT")])
+        self.assertEqual(required_features(regex), expected)
+
+    def test_optional(self):
+        regex = Question(Lemma(u"list")) + Star(Lemma(u"a")) + Lemma(u"b")
+        self.assertEqual(required_features(regex),
+                         features([(u"lemma", u"b")]))
+
+    def test_disjunction(self):
+        regex = Lemma(u"list") + (Lemma(u"movie") | Lemma(u"film"))
+        expected = features([(u"lemma", u"list"), (u"lemma", u"movie")],
+                            [(u"lemma", u"list"), (u"lemma", u"film")])
+        self.assertEqual(required_features(regex), expected)
+
+    def test_disjunction_with_empty_branch(self):
+        regex = Lemma(u"list") | Star(Any())
+        self.assertEqual(required_features(regex), features([]))
+
+    def test_particle(self):
+        regex = Lemma(u"who") + Thing()
+        expected = features([(u"lemma", u"who"), (u"pos", u"NN")],
+                            [(u"lemma", u"who"), (u"pos", u"NNP")])
+        self.assertEqual(required_features(regex), expected)
+
+    def test_pos_subclass_is_not_trusted(self):
+        class Weird(Pos):
+            def _check(self, word):
+                return True
+
+        self.assertEqual(required_features(Weird(u"NN")), features([]))
+
+
+class TestRuleIndex(unittest.TestCase):
+    def setUp(self):
+        class ListRule(QuestionTemplate):
+            weight = 3
+            regex = Lemma(u"list") + (Lemma(u"movie") | Lemma(u"film"))
+
+        class WhoRule(QuestionTemplate):
+            weight = 2
+            regex = Lemma(u"who") + Lemma(u"be") + Thing()
+
+        class AnyRule(QuestionTemplate):
+            weight = 1
+
+        self.list_rule = ListRule()
+        self.who_rule = WhoRule()
+        self.any_rule = AnyRule()
+        self.index = RuleIndex([self.list_rule, self.who_rule, self.any_rule])
+
+    def test_candidates(self):
+        words = [Word(u"List", u"list", u"NN"),
+                 Word(u"films", u"film", u"NNS")]
+        self.assertEqual(self.index.candidates(words),
+                         [self.list_rule, self.any_rule])
+
+        words = [Word(u"Who", u"who", u"WP"), Word(u"is", u"be", u"VBZ"),
+                 Word(u"Tom", u"tom", u"NNP")]
+        self.assertEqual(self.index.candidates(words),
+                         [self.who_rule, self.any_rule])
+
+    def test_partial_requirements(self):
+        words = [Word(u"Who", u"who", u"WP"), Word(u"is", u"be", u"VBZ"),
+                 Word(u"it", u"it", u"PRP")]
+        self.assertEqual(self.index.candidates(words), [self.any_rule])
+
+    def test_lazy_lemmas(self):
+        calls = []
+
+        def lemmatize(token, pos):
+            calls.append(token)
+            return token.lower()
+
+        words = TaggedSentence([u"Who", u"is", u"it"],
+                               tags=[u"WP", u"VBZ", u"PRP"],
+                               lemmatize=lemmatize)
+        # Who rule is ruled out by the pos tags
+        index = RuleIndex([self.who_rule, self.any_rule])
+        self.assertEqual(index.candidates(words), [self.any_rule])
+        self.assertEqual(calls, [])
+        # List rule only requires lemmas
+        self.assertEqual(self.index.candidates(words), [self.any_rule])
+        self.assertEqual(calls, [u"Who", u"is", u"it"])
+
+    def test_no_words(self):
+        self.assertEqual(self.index.candidates([]), [self.any_rule])
+
+
+if __name__ == "__main__":
+    unittest.main()
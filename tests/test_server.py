@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the HTTP server.
+"""
+
+import json
+import socket
+import httplib
+import unittest
+from threading import Thread
+
+import quepy
+from quepy.server import QuepyHTTPServer
+
+
+class ServerTestCase(unittest.TestCase):
+    app = None
+
+    def setUp(self):
+        self.server = QuepyHTTPServer((u"localhost", 0), self.app)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+        self.connection = httplib.HTTPConnection(u"localhost", self.port)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def request(self, method, path, value=None):
+        body = None if value is None else json.dumps(value)
+        self.connection.request(method, path, body)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+
+class TestNotReady(ServerTestCase):
+    def test_health(self):
+        status, value = self.request("GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(value[u"status"], u"ok")
+
+    def test_ready(self):
+        status, _ = self.request("GET", "/ready")
+        self.assertEqual(status, 503)
+        status, _ = self.request("POST", "/query", {u"question": u"x"})
+        self.assertEqual(status, 503)
+
+    def test_not_found(self):
+        status, _ = self.request("GET", "/nothing")
+        self.assertEqual(status, 404)
+        # The connection is still usable
+        status, _ = self.request("GET", "/health")
+        self.assertEqual(status, 200)
+
+
+class TestServer(ServerTestCase):
+    def setUp(self):
+        self.app = quepy.install("testapp")
+        super(TestServer, self).setUp()
+
+    def test_ready(self):
+        status, value = self.request("GET", "/ready")
+        self.assertEqual(status, 200)
+        self.assertEqual(value[u"fingerprint"], self.app.fingerprint)
+
+    def test_query(self):
+        status, value = self.request("POST", "/query",
+                                     {u"question": u"user data"})
+        self.assertEqual(status, 200)
+        target, query, userdata = self.app.get_query(u"user data")
+        self.assertEqual(value, {u"target": target, u"query": query,
+                                 u"userdata": userdata})
+
+    def test_queries(self):
+        questions = [u"user data", u"something something"]
+        status, value = self.request("POST", "/queries",
+                                     {u"questions": questions})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(value[u"results"]), 2)
+        userdata = [x[u"userdata"] for x in value[u"results"][1][u"queries"]]
+        self.assertEqual(userdata, [42, None])
+
+    def test_bad_requests(self):
+        self.connection.request("POST", "/query", "not json")
+        response = self.connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+        status, _ = self.request("POST", "/query", {u"questions": [1]})
+        self.assertEqual(status, 400)
+        status, _ = self.request("POST", "/query", {u"other": u"user data"})
+        self.assertEqual(status, 400)
+
+    def test_failing_rule(self):
+        def interpret(match):
+            raise ValueError(u"Broken rule")
+
+        for rule in self.app.rules:
+            rule.interpret = interpret
+        status, value = self.request("POST", "/query",
+                                     {u"question": u"user data"})
+        self.assertEqual(status, 500)
+        self.assertEqual(value, {u"error": u"Broken rule"})
+        # The connection is still usable
+        status, _ = self.request("GET", "/health")
+        self.assertEqual(status, 200)
+
+    def test_query_stops_at_first(self):
+        rule = [x for x in self.app.rules
+                if type(x).__name__ == "LowMatchAny"][0]
+
+        def interpret(match):
+            raise AssertionError("Lower weight rule interpreted")
+
+        rule.interpret = interpret
+        status, value = self.request("POST", "/query",
+                                     {u"question": u"user data"})
+        self.assertEqual(status, 200)
+        self.assertEqual(value[u"userdata"], u"<user data>")
+        status, value = self.request("POST", "/query",
+                                     {u"questions": [u"user data"]})
+        self.assertEqual(status, 200)
+        self.assertEqual(value[u"results"][0][u"userdata"], u"<user data>")
+
+    def test_pipelining(self):
+        body = json.dumps({u"question": u"user data"})
+        request = ("POST /query HTTP/1.1\r\nHost: localhost\r\n"
+                   "Content-Length: {0}\r\n\r\n{1}").format(len(body), body)
+        health = "GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        client = socket.create_connection((u"localhost", self.port))
+        client.sendall(request + health + request)
+
+        statuses = []
+        for _ in xrange(3):
+            response = httplib.HTTPResponse(client)
+            response.begin()
+            statuses.append((response.status,
+                             u"userdata" in json.loads(response.read())))
+        client.close()
+        self.assertEqual(statuses, [(200, True), (200, False), (200, True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
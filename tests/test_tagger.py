@@ -12,8 +12,13 @@
 Tests for tagger.
 """
 
+import os
+import shutil
+import tempfile
+import types
 import unittest
-from quepy import tagger
+from quepy import tagger, settings
+from quepy.quepyapp import AppSettings
 
 
 class TestTagger(unittest.TestCase):
@@ -56,6 +61,13 @@ class TestTagger(unittest.TestCase):
         self.assertIsInstance(word.pos, unicode)
         self.assertEqual(word.pos, u"øĸŋøħþ€ĸłþ€øæ«»¢")
 
+    def test_word_slots(self):
+        word = tagger.Word(u"a")
+        self.assertFalse(hasattr(word, "__dict__"))
+        self.assertEqual(unicode(word), u"a|None|None|None")
+        view = tagger.TaggedSentence([u"a"])[0]
+        self.assertFalse(hasattr(view, "__dict__"))
+
     def test_word_wrong_attrib_set(self):
         word = tagger.Word(u"æßđħłłþłłł@æµß")
 
@@ -65,3 +77,180 @@ class TestTagger(unittest.TestCase):
         self.assertRaises(ValueError, setattr, word, "lemma", "ŧłþłßæ#¶ŋħ~#~@")
         # Pos not unicode
         self.assertRaises(ValueError, setattr, word, "pos", "øĸŋøħþ€ĸłþ€øæ«»¢")
+
+
+class TestTaggedSentence(unittest.TestCase):
+    def setUp(self):
+        self.words = [tagger.Word(u"Who", u"who", u"WP"),
+                      tagger.Word(u"are", u"be", u"VBP", 0.5)]
+        self.sentence = tagger.TaggedSentence.from_words(self.words)
+
+    def test_columns(self):
+        self.assertEqual(self.sentence.tokens, [u"Who", u"are"])
+        self.assertEqual(self.sentence.lemmas, [u"who", u"be"])
+        self.assertEqual(self.sentence.tags, [u"WP", u"VBP"])
+        self.assertEqual(self.sentence.probs, [None, 0.5])
+        self.assertIs(self.sentence.column(u"lemma"), self.sentence.lemmas)
+        self.assertEqual(tagger.TaggedSentence([u"a"]).tags, [None])
+
+    def test_word_views(self):
+        self.assertEqual(len(self.sentence), 2)
+        self.assertEqual([unicode(x) for x in self.sentence],
+                         [unicode(x) for x in self.words])
+        word = self.sentence[-1]
+        self.assertIsInstance(word, tagger.Word)
+        self.assertEqual(word, self.sentence[1])
+        self.assertNotEqual(word, self.sentence[0])
+        self.assertRaises(IndexError, lambda: self.sentence[2])
+
+        word.lemma = u"is"
+        self.assertEqual(self.sentence.lemmas, [u"who", u"is"])
+        self.assertRaises(ValueError, setattr, word, "pos", "VBZ")
+
+    def test_slice_and_copy(self):
+        self.assertEqual(self.sentence + [None],
+                         [self.sentence[0], self.sentence[1], None])
+        self.assertEqual([unicode(x) for x in [None] + self.sentence[1:]],
+                         [u"None", unicode(self.words[1])])
+
+        part = self.sentence[1:]
+        self.assertIsInstance(part, tagger.TaggedSentence)
+        self.assertEqual(part.tokens, [u"are"])
+
+        copy = self.sentence.copy()
+        copy[0].lemma = u"what"
+        self.assertEqual(self.sentence.lemmas, [u"who", u"be"])
+        self.assertEqual(self.sentence.fields(),
+                         ((u"Who", u"who", u"WP", None),
+                          (u"are", u"be", u"VBP", 0.5)))
+        self.assertEqual(len(tagger.TaggedSentence.from_fields([])), 0)
+
+    def test_lazy_lemmas(self):
+        calls = []
+
+        def lemmatize(token, pos):
+            calls.append(token)
+            return token.lower()
+
+        sentence = tagger.TaggedSentence([u"Who", u"are", u"They"],
+                                         tags=[u"WP", u"VBP", u"PRP"],
+                                         lemmatize=lemmatize)
+        self.assertFalse(sentence.lemmatized())
+        self.assertEqual(sentence[1].pos, u"VBP")
+        self.assertEqual(calls, [])
+        self.assertEqual(sentence[1].lemma, u"are")
+        self.assertEqual(sentence[1].lemma, u"are")
+        self.assertEqual(calls, [u"are"])
+
+        sentence[2].lemma = u"they"
+        copy = sentence[:1].copy()
+        self.assertFalse(copy.lemmatized())
+        self.assertEqual(sentence.lemmas, [u"who", u"are", u"they"])
+        self.assertTrue(sentence.lemmatized())
+        self.assertEqual(calls, [u"are", u"Who"])
+        self.assertEqual(copy.lemmas, [u"who"])
+        self.assertEqual(calls, [u"are", u"Who", u"Who"])
+
+
+class TestTaggerCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, u"tags.sqlite")
+        self.words = [tagger.Word(u"Who", u"who", u"WP"),
+                      tagger.Word(u"are", u"be", u"VBP", 0.5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertSameWords(self, words, expected):
+        self.assertEqual([unicode(x) for x in words],
+                         [unicode(x) for x in expected])
+
+    def test_memory(self):
+        cache = tagger.TaggerCache(u"test:1", max_entries=1)
+        self.assertIsNone(cache.get(u"Who are"))
+        cache.put(u"Who are", self.words)
+        words = cache.get(u"Who are")
+        self.assertSameWords(words, self.words)
+        # Every lookup gives new words
+        words[0].lemma = u"what"
+        self.assertSameWords(cache.get(u"Who are"), self.words)
+        cache.put(u"other", [])
+        self.assertIsNone(cache.get(u"Who are"))
+
+    def test_lazy_lemmas(self):
+        cache = tagger.TaggerCache(u"test:1")
+        words = tagger.TaggedSentence([u"Who"], tags=[u"WP"],
+                                      lemmatize=lambda token, pos: u"who")
+        cache.put(u"Who", words)
+        self.assertFalse(words.lemmatized())
+        self.assertFalse(cache.get(u"Who").lemmatized())
+        self.assertEqual(cache.get(u"Who").lemmas, [u"who"])
+
+        cache = tagger.TaggerCache(u"test:1", path=self.path)
+        cache.put(u"Who", words)
+        cache = tagger.TaggerCache(u"test:1", path=self.path)
+        self.assertEqual(cache.get(u"Who").lemmas, [u"who"])
+
+    def test_store(self):
+        cache = tagger.TaggerCache(u"test:1", path=self.path)
+        cache.put(u"Who are", self.words)
+
+        cache = tagger.TaggerCache(u"test:1", path=self.path)
+        self.assertSameWords(cache.get(u"Who are"), self.words)
+        self.assertIsInstance(cache.get(u"Who are")[0].token, unicode)
+        # Other versions don't see the stored tags
+        cache = tagger.TaggerCache(u"test:2", path=self.path)
+        self.assertIsNone(cache.get(u"Who are"))
+
+    def test_shared(self):
+        size = settings.TAGGER_CACHE_SIZE
+        try:
+            settings.TAGGER_CACHE_SIZE = 5
+            cache = tagger.get_tagger_cache(u"test", u"1")
+            self.assertIs(tagger.get_tagger_cache(u"test", u"1"), cache)
+            self.assertIsNot(tagger.get_tagger_cache(u"test", u"2"), cache)
+            self.assertEqual(cache.namespace, u"test:1")
+            settings.TAGGER_CACHE_SIZE = 0
+            self.assertIsNone(tagger.get_tagger_cache(u"test", u"1"))
+        finally:
+            settings.TAGGER_CACHE_SIZE = size
+
+
+class TestTaggerBackends(unittest.TestCase):
+    def setUp(self):
+        self.tagged = []
+
+        def factory(app_settings):
+            def tag_batch(strings):
+                self.tagged.extend(strings)
+                return [[tagger.Word(x, x.lower(), u"NN") for x in y.split()]
+                        for y in strings]
+            return tag_batch, u"1"
+
+        tagger.register_tagger(u"test", factory)
+        module = types.ModuleType("test_settings")
+        module.TAGGER = "test"
+        self.app_settings = AppSettings(module)
+
+    def tearDown(self):
+        del tagger._backends[u"test"]
+
+    def test_selected_by_settings(self):
+        tag = tagger.get_tagger(self.app_settings)
+        words = tag(u"Who are")
+        self.assertEqual([unicode(x) for x in words],
+                         [u"Who|who|NN|None", u"are|are|NN|None"])
+        # Tagged once, then it's in the cache of the backend
+        tag(u"Who are")
+        self.assertEqual(self.tagged, [u"Who are"])
+
+    def test_dotted_path(self):
+        tagger.register_tagger(u"test",
+                               u"quepy.lookuptagger.make_batch_tagger")
+        tag = tagger.get_tagger(self.app_settings)
+        self.assertEqual([x.pos for x in tag(u"Who are")], [u"WP", u"VBP"])
+
+    def test_unknown(self):
+        self.app_settings.TAGGER = u"missing"
+        self.assertRaises(ValueError, tagger.get_tagger, self.app_settings)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) 2012, Machinalis S.R.L.
+# This file is part of quepy and is distributed under the Modified BSD License.
+# You should have received a copy of license in the LICENSE file.
+#
+# Authors: Rafael Carrascosa <rcarrascosa@machinalis.com>
+#          Gonzalo Garcia Berrotaran <ggarcia@machinalis.com>
+
+"""
+Tests for the memory mapped tagger model.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tagger_training import QUESTIONS, train_perceptron
+
+from quepy.nltktagger import Tagger
+from quepy.taggermodel import TaggerModel, write_tagger_model
+
+
+class TestTaggerModel(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, u"model")
+        self.perceptron = train_perceptron()
+        self.perceptron.tagdict[u"río"] = u"NN"
+        write_tagger_model(self.path, self.perceptron.model.weights,
+                           self.perceptron.tagdict, self.perceptron.classes)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_model(self):
+        model = TaggerModel(self.path)
+        self.assertEqual(model.classes, sorted(self.perceptron.classes))
+        self.assertEqual(len(model.tagdict), len(self.perceptron.tagdict))
+        for word, tag in self.perceptron.tagdict.items():
+            self.assertEqual(model.tagdict.get(word), tag)
+        self.assertIsNone(model.tagdict.get(u"missing"))
+
+        weights = self.perceptron.model.weights
+        self.assertEqual(len(model.weights), len(weights))
+        for feature, label_weights in weights.items():
+            self.assertIn(feature, model.weights)
+            self.assertEqual(model.weights.get(feature),
+                             label_weights.items())
+        self.assertEqual(dict(model.weights.iteritems()), weights)
+        self.assertNotIn(u"missing", model.weights)
+        model.close()
+
+    def test_same_tags(self):
+        tagger = Tagger(tagger_model_path=self.path)
+        perceptron = tagger._load_perceptron()
+        self.assertIsInstance(perceptron.model, TaggerModel)
+        for question in QUESTIONS:
+            tokens = question.split()
+            self.assertEqual(perceptron.tag(tokens),
+                             self.perceptron.tag(tokens))
+
+    def test_invalid(self):
+        with open(self.path, "wb") as model_file:
+            model_file.write("QUEPYLT1" + "\0" * 16)
+        self.assertRaises(ValueError, TaggerModel, self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()